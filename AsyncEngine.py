@@ -0,0 +1,510 @@
+from .AsyncWebDriver import HubClient, HubTimeout, AsyncSession, WebDriverError
+from .TestBuilder import TestResults, buildEnvironment, chromeArguments, firefoxPreferences, httpPreflight, deadlineResults
+from .HttpCheck import httpChecker
+from concurrent.futures import ThreadPoolExecutor
+from .PageProbe import PROBE_SCRIPT, TIMING_SCRIPT, sanitize_string
+from .PageClassifier import classifySnapshot, pageClassifier
+from .TestConfig import TestSettings
+from .Resolver import resolver
+from .NodeInfo import NodeInfoService, parseUserAgent
+from .ScreenshotStore import screenshotStore
+from .HealthCheck import parseHealthCheck, healthCheckLimit
+from .Instrumentation import instrumentSession
+from .Trace import TraceBuffer
+from .SessionPool import isolationMode
+from .SingleSignOn import authDomains, batchingEnabled, ssoHost
+from .NetworkLog import NetworkLogCollector
+from .TestPlan import compilePlan, PlanError
+from .Scheduler import scheduler
+from .ResultSinks import resultSink
+from urllib.parse import urlsplit
+import asyncio, json, math, time
+
+def browserCapabilities(browser):
+    sitelist = TestSettings.get("BrowserSettings", "sitelist")
+    if browser in ["Chrome","ChromeIncognito"]:
+        return {
+            "browserName": "chrome",
+            "goog:chromeOptions": {"args": chromeArguments(browser, sitelist)},
+            "goog:loggingPrefs": {"performance": "ALL"}
+        }
+    return {
+        "browserName": "firefox",
+        # PREVENTS FAILING ON SELF-SIGNED CERTIFICATES
+        "acceptInsecureCerts": True,
+        "moz:firefoxOptions": {"prefs": firefoxPreferences(sitelist)}
+    }
+
+# A command can take as long as the longest page load, the hub gets [AsyncEngine] hub_margin seconds on top of that
+def hubTimeout():
+    timeout = TestSettings.getfloat('Waits', 'page_load_timeout', fallback=30)
+    if scheduler().adaptive: timeout = max(timeout, scheduler().max_step_timeout)
+    return timeout + TestSettings.getfloat('AsyncEngine', 'hub_margin', fallback=10)
+
+# Await a background DNS lookup without blocking the event loop
+async def resolved(future, default=None):
+    try:
+        return await asyncio.wait_for(asyncio.wrap_future(future), resolver().timeout)
+    except asyncio.TimeoutError:
+        return default
+
+class AsyncApplicationTest():
+    # Runs one app's steps on an AsyncSession, producing the same results as TestGenerator
+    def __init__(self, session, test):
+        self.session = session
+        self.test = test
+        self.current_element = False
+        self.trace = TraceBuffer()
+        self.step = None
+        self.app = {}
+        self.budget = None
+        self.isolation = "reset"
+        self.isolated = None
+        self.hub_timeout = False
+        self.network = None
+        # The step's adaptive timeout, looked up off the event loop before the step runs
+        self.step_timeout = 0
+
+    def passed(self, info):
+        self.test.TestFinish()
+        info['status'] = "Passed"
+        self.test.TestResults(info)
+        return True
+
+    def failed(self, info, error, status="Failed"):
+        self.test.TestFinish()
+        info['status'] = status
+        info['error'] = error
+        self.trace.error(error)
+        self.test.TestResults(info)
+        return False
+
+    # Polls like Waits.pollUntil, the script strategy has no in-browser watch here and backs off instead
+    async def poll(self, condition, timeout):
+        strategy = (self.step.wait_strategy if self.step != None else None) or TestSettings.get('Waits', 'strategy', fallback='script')
+        poll_min = TestSettings.getfloat('Waits', 'poll_min', fallback=0.05)
+        poll_max = TestSettings.getfloat('Waits', 'poll_max', fallback=0.5)
+        interval = poll_max if strategy == "fixed" else poll_min
+        end = time.time() + timeout
+        while True:
+            result = await condition()
+            remaining = end - time.time()
+            if result or remaining <= 0: return result
+            await asyncio.sleep(min(interval, remaining))
+            interval = min(interval * 1.5, poll_max)
+
+    # Same timeouts as TestSuite.wait_options, adaptive ones follow the step's history and all are capped by the budget
+    def timeout(self, setting, default, adaptive=False):
+        if self.step != None and self.step.wait_timeout != None: timeout = self.step.wait_timeout
+        else:
+            timeout = TestSettings.getfloat('Waits', setting, fallback=default)
+            if adaptive: timeout = max(timeout, self.step_timeout)
+        return self.budget.timeout(timeout) if self.budget != None else timeout
+
+    async def page_load_timeout(self):
+        timeout = max(TestSettings.getfloat('Waits', 'page_load_timeout', fallback=30), self.step_timeout)
+        if self.budget != None: timeout = self.budget.timeout(timeout)
+        timeout = int(math.ceil(timeout))
+        if getattr(self.session, 'page_load_timeout', None) != timeout:
+            await self.session.set_timeouts(page_load=timeout)
+            self.session.page_load_timeout = timeout
+        return timeout
+
+    async def get_element(self, name, value, timeout=None):
+        timeout = timeout if timeout != None else self.timeout('element_timeout', 10, adaptive=True)
+        async def locate():
+            try:
+                return await self.session.find_element(name, value)
+            except WebDriverError as e:
+                if e.error != "no such element": raise
+                return False
+        element = await self.poll(locate, timeout)
+        if not element: raise asyncio.TimeoutError()
+        return element
+
+    async def wait_for_page_title(self):
+        return await self.poll(self.session.title, self.timeout('title_timeout', 2)) or False
+
+    # Same as SingleSignOn.microsoftSignIn on the async session
+    async def microsoft_sign_in(self, return_url):
+        timeout = TestSettings.getfloat('SSO', 'timeout', fallback=10)
+        email = await self.get_element('xpath', '//*/input[@type="email"]', timeout)
+        await self.session.send_keys(email, TestSettings.get('UserInfo', 'email'))
+        await self.session.click(await self.get_element('xpath', '//*/input[@type="submit"]', timeout))
+        async def returned():
+            return return_url in await self.session.current_url()
+        if not await self.poll(returned, timeout): raise asyncio.TimeoutError()
+
+    async def go_to_url(self, **info):
+        self.current_element = False
+        self.test.TestStart()
+        snapshot = None
+        try:
+            page_load_timeout = await self.page_load_timeout()
+            await self.session.get(info["url"])
+            try:
+                await self.wait_for_page_title()
+                snapshot = await self.session.execute_script(PROBE_SCRIPT)
+                # Detect a sign in prompt like TestSuite.go_to_url
+                sso_host = ssoHost(snapshot.get('url', ''))
+                if sso_host != None:
+                    authDomains().remember(self.app, sso_host)
+                    auth_start = time.time()
+                    try:
+                        if sso_host == "login.microsoftonline.com": await self.microsoft_sign_in(info["url"])
+                    except (WebDriverError, asyncio.TimeoutError):
+                        self.trace.append('Failed to login to SSO page')
+                    info['auth_duration'] = round(time.time() - auth_start, 3)
+                    snapshot = await self.session.execute_script(PROBE_SCRIPT)
+            except WebDriverError as e:
+                if e.error != "unexpected alert open": raise
+                # Dismiss the alert and report the page text as an access error if there is no title
+                self.trace.append("Alert present, preventing title")
+                await self.session.dismiss_alert()
+                await self.wait_for_page_title()
+                snapshot = await self.session.execute_script(PROBE_SCRIPT)
+                if not snapshot.get('title'): snapshot['access_error'] = sanitize_string(snapshot.get('body') or '')
+        except WebDriverError as e:
+            if e.error == "timeout":
+                return self.failed(info, 'Timeout: Page did not load within {0} seconds'.format(page_load_timeout))
+            error = sanitize_string(e.message)
+            # In some cases, dismissing a login prompt results in a WebDriver error
+            if "user prompt dialog" in error:
+                self.failed(info, error, "Warning")
+                return True
+            return self.failed(info, error)
+        self.test.TestFinish()
+        info['url_loaded'] = snapshot.get('url')
+        if snapshot.get('timing'): info['timing'] = snapshot['timing']
+        info['status'], error = classifySnapshot(snapshot)
+        if error != None: info['error'] = error
+        self.test.TestResults(info)
+        return info['status'] in ["Passed", "Warning"]
+
+    async def check_title(self, **info):
+        self.test.TestStart()
+        async def matches():
+            title = await self.session.title()
+            return title if info["title_expected"].lower() in title.lower() else False
+        info["title_loaded"] = await self.poll(matches, self.timeout('specific_title_timeout', 5, adaptive=True)) or await self.session.title()
+        if info["assert"] == "equals": passed = info["title_loaded"].lower() == info["title_expected"].lower()
+        else: passed = self.step.pattern.search(info["title_loaded"].lower()) != None
+        if passed: return self.passed(info)
+        return self.failed(info, 'Unexpected title: "{0}" instead of "{1}"'.format(info["title_loaded"], info["title_expected"]))
+
+    async def find_element(self, **info):
+        self.test.TestStart()
+        try:
+            self.current_element = await self.get_element(*self.step.locator)
+            return self.passed(info)
+        except asyncio.TimeoutError:
+            return self.failed(info, "Timeout waiting for element with {0}=\"{1}\".".format(info["element_name"], info["element_value"]))
+
+    async def click_element(self, **info):
+        self.test.TestStart()
+        try:
+            self.current_element = await self.get_element(*self.step.locator)
+            await self.session.click(self.current_element)
+            self.test.TestFinish()
+            try:
+                info['timing'] = await self.session.execute_script(TIMING_SCRIPT)
+            except WebDriverError:
+                info['timing'] = None
+            info['status'] = "Passed"
+            self.test.TestResults(info)
+            return True
+        except asyncio.TimeoutError:
+            return self.failed(info, "Timeout waiting for element with {0}=\"{1}\".".format(info["element_name"], info["element_value"]))
+
+    async def find_text_in_element(self, **info):
+        self.test.TestStart()
+        try:
+            if not self.current_element:
+                self.current_element = await self.get_element('xpath', '//*')
+        except asyncio.TimeoutError:
+            return self.failed(info, "Timeout waiting for body text using xpath")
+        text = await self.session.element_text(self.current_element)
+        if info["assert"] == "equals":
+            if text.lower() == info["expected_text"].lower(): return self.passed(info)
+            return self.failed(info, 'Unexpected text: "{0}" instead of "{1}"'.format(text, info["expected_text"]))
+        if self.step.pattern.search(text.lower()): return self.passed(info)
+        return self.failed(info, 'Unexpected text: "{0}" not found in "{1}"'.format(info["expected_text"], text))
+
+    async def enter_text(self, **info):
+        self.test.TestStart()
+        try:
+            await self.session.click(self.current_element)
+            await self.session.send_keys(self.current_element, info['text'])
+            if await self.session.element_property(self.current_element, 'value') == info['text']: return self.passed(info)
+        except WebDriverError:
+            pass
+        return self.failed(info, "Text entry was not successful")
+
+    async def switch_to(self, **info):
+        self.test.TestStart()
+        try:
+            if info.get("element_name") == "Frame":
+                await self.session.switch_to_frame(None)
+                await self.session.switch_to_frame(await self.get_element(*self.step.locator))
+            return self.passed(info)
+        except (WebDriverError, asyncio.TimeoutError):
+            return self.failed(info, "Unable to locate element: {0}=\"{1}\"".format(info["element_name"], info["element_value"]))
+
+    async def wait_for_it(self, **info):
+        self.test.TestStart()
+        seconds = int(info.get("seconds"))
+        allowed = self.budget.wait(seconds) if self.budget != None else seconds
+        if allowed < seconds: info['shortened_to'] = round(allowed, 2)
+        await asyncio.sleep(allowed)
+        return self.passed(info)
+
+    async def get_current_element_attribute(self, **info):
+        self.test.TestStart()
+        try:
+            info[info.get("attribute")] = await self.session.element_attribute(self.current_element, info.get("attribute"))
+            return self.passed(info)
+        except WebDriverError:
+            return self.failed(info, "Unable to get \"{0}\" attribute of current element".format(info["attribute"]))
+
+    async def health_check(self, **info):
+        self.test.TestStart()
+        element = await self.session.find_element('xpath', '//*')
+        healthcheck = parseHealthCheck(await self.session.element_text(element))
+        if not isinstance(healthcheck, dict):
+            return self.failed(info, "The health check did not return a valid JSON object")
+        result = self.step.check.evaluate(healthcheck, limit=healthCheckLimit())
+        if result.healthy: return self.passed(info)
+        info['failures'] = result.failures
+        return self.failed(info, result.error)
+
+    async def health_check_v2(self, **info):
+        return await self.health_check(**info)
+
+    # A hub without Selenium's log endpoint gives no network events instead of failing the step
+    async def performance_log(self):
+        try:
+            return await self.session.get_log('performance')
+        except WebDriverError:
+            return []
+
+    # Like TestSuite.isolate, the reset is reported with the app that left the state behind
+    async def isolate(self, acquire_duration):
+        report = {'mode': self.isolation}
+        if self.isolation == "fresh":
+            report['launch'] = round(acquire_duration, 3)
+            return report
+        if self.hub_timeout:
+            self.isolated = False
+            report['error'] = "Session discarded after a hub timeout"
+            return report
+        start = time.time()
+        try:
+            await self.session.reset(self.isolation)
+            self.isolated = True
+        except Exception:
+            self.isolated = False
+            report['error'] = "Session reset failed"
+        report['duration'] = round(time.time() - start, 3)
+        return report
+
+    async def run(self, app, plan, screenshot_always=False, acquire_duration=0):
+        self.app = app
+        self.isolation = isolationMode(app)
+        self.trace = TraceBuffer(app.get('DEBUG', False))
+        # The scheduler reads the history, which may be a SQLite file
+        loop = asyncio.get_running_loop()
+        self.budget = await loop.run_in_executor(None, scheduler().budget, app)
+        # Chrome performance logs are read once before and once after each Open and Click step
+        self.network = NetworkLogCollector(self.session) if app.get('BROWSER') in ["Chrome","ChromeIncognito"] else None
+        recorder = getattr(self.session, 'recorder', None)
+        if recorder != None: recorder.start_app()
+        for step in plan:
+            if step.enabled and self.budget.exhausted():
+                self.budget.skipped += 1
+                self.test.TestSkipped("Time budget exceeded")
+            elif step.enabled:
+                self.step = step
+                try:
+                    self.step_timeout = await loop.run_in_executor(None, scheduler().step_timeout, app, step, 0) if scheduler().adaptive else 0
+                    network = self.network != None and step.command in ["Open", "Click"]
+                    if network:
+                        await self.performance_log()
+                        self.network.clear()
+                    tests_run = len(self.test.results['tests'])
+                    if recorder != None: recorder.start_step(step)
+                    passed = await getattr(self, step.handler)(**step.info)
+                    result = self.test.results['tests'][-1] if len(self.test.results['tests']) > tests_run else None
+                    # Attach the network summary of the step to its result
+                    if network:
+                        self.network.add(await self.performance_log())
+                        if result != None: result['network'] = self.network.summary()
+                    if recorder != None:
+                        webdriver = recorder.finish_step(step, result)
+                        if result != None: result['webdriver'] = webdriver
+                    if not passed: break
+                except KeyError:
+                    # Malformed steps stop the test like in TestSuite
+                    break
+                except HubTimeout as e:
+                    # Not the app's fault, and the session is left in an unknown state
+                    self.hub_timeout = True
+                    if not hasattr(self.test, 'transaction_start'): self.test.TestStart()
+                    self.failed(dict(step.info), str(e), "Debug")
+                    break
+                except Exception as e:
+                    if not hasattr(self.test, 'transaction_start'): self.test.TestStart()
+                    self.failed(dict(step.info), "Unhandled Exception: {0}".format(e), "Debug")
+                    break
+            else:
+                self.test.TestSkipped()
+        if not math.isinf(self.budget.limit): self.test.BudgetResults(self.budget)
+
+        if (screenshot_always or self.test.results['results'].get('status') == "Failed") and not app.get('DEBUG', False) and not self.hub_timeout:
+            store = screenshotStore()
+            try:
+                screenshot = await self.session.screenshot()
+                # Re-encoding is CPU work, keep it off the event loop
+                if store: screenshot = await loop.run_in_executor(None, store.store_base64, screenshot)
+            except Exception:
+                screenshot = "Screenshot capture failed"
+            if screenshot_always: self.test.results['screenshot'] = screenshot
+            else: self.test.results['results']['screenshot'] = screenshot
+            if self.network != None:
+                self.network.add(await self.performance_log())
+                self.test.results['results']['logs'] = list(self.network.events)
+
+        self.test.results['results']['isolation'] = await self.isolate(acquire_duration)
+        if recorder != None: recorder.finish_app(app, self.test.results)
+        self.trace.attach(self.test.results)
+        if app.get('DEBUG', False): print(*self.trace.lines(), sep="\n")
+        # WriteResults picks up the DNS lookup once it is done, and writes to the sinks off the event loop
+        await resolved(self.test.lookup)
+        await loop.run_in_executor(None, self.test.WriteResults)
+        return self.test.results
+
+class AsyncTestEngine():
+    def __init__(self, concurrency=None, connections=None, screenshot_always=False, hub=None):
+        # Number of transactions in flight and keep-alive connections to the hub
+        self.concurrency = concurrency if concurrency else TestSettings.getint('AsyncEngine', 'concurrency', fallback=50)
+        self.connections = connections if connections else TestSettings.getint('AsyncEngine', 'connections', fallback=0) or self.concurrency
+        self.screenshot_always = screenshot_always
+        self.hub = hub if hub else "{0}://{1}:{2}/wd/hub".format(TestSettings.get('SeleniumHub', 'protocol'), TestSettings.get('SeleniumHub', 'host'), TestSettings.get('SeleniumHub', 'port'))
+        hub = urlsplit(self.hub)
+        self.nodes = NodeInfoService(hub.scheme, hub.hostname, hub.port or (443 if hub.scheme == "https" else 80))
+        # Recycle idle sessions like SessionPool, 0 disables the limit
+        self.max_uses = TestSettings.getint('SessionPool', 'max_uses', fallback=0)
+        self.max_age = TestSettings.getint('SessionPool', 'max_age', fallback=0)
+        self.health_check = TestSettings.getboolean('SessionPool', 'health_check', fallback=True)
+        self.idle = {}
+        self.sessions = []
+        self.http_executor = None
+        # Apps batched behind one sign in share a session for the whole batch, only TestRunner runs them that way
+        if batchingEnabled(): raise ValueError("[SSO] batch is not supported by the async engine, use TestRunner")
+        resultSink()
+        pageClassifier()
+
+    async def environment(self, session):
+        ua = parseUserAgent(await session.execute_script("return navigator.userAgent"))
+        ip, host = await asyncio.get_running_loop().run_in_executor(None, self.nodes.node, session.session_id)
+        return buildEnvironment(ua, host, ip)
+
+    # Like SessionPool.alive, a session that stopped answering is replaced instead of failing the next app
+    async def usable(self, session):
+        if self.max_uses and session.uses >= self.max_uses: return False
+        if self.max_age and time.time() - session.created >= self.max_age: return False
+        if not self.health_check: return True
+        try:
+            await session.current_url()
+            return True
+        except Exception:
+            return False
+
+    async def acquire(self, browser, fresh=False):
+        while self.idle.get(browser) and not fresh:
+            session = self.idle[browser].pop()
+            if await self.usable(session):
+                session.uses += 1
+                return session
+            await self.quit(session)
+        session = await AsyncSession.create(self.client, browser, browserCapabilities(browser))
+        session.uses += 1
+        instrumentSession(session)
+        self.sessions.append(session)
+        session.page_load_timeout = int(TestSettings.getfloat('Waits', 'page_load_timeout', fallback=30))
+        await session.set_timeouts(page_load=session.page_load_timeout)
+        session.details = await self.environment(session)
+        return session
+
+    # Fresh sessions and sessions that couldn't be reset are closed, the others go back to the idle list
+    async def release(self, session, test=None):
+        if test != None and (test.isolation == "fresh" or test.isolated == False): return await self.quit(session)
+        try:
+            if test == None or test.isolated != True: await session.reset(test.isolation if test != None else "reset")
+            self.idle.setdefault(session.browser, []).append(session)
+        except Exception:
+            await self.quit(session)
+
+    async def quit(self, session):
+        if session in self.sessions: self.sessions.remove(session)
+        try:
+            await session.quit()
+        except Exception:
+            pass
+
+    async def failed_results(self, app, error):
+        test = TestResults({}, app)
+        test.results['results']['status'] = "Failed"
+        test.results['results']['error'] = error
+        await asyncio.get_running_loop().run_in_executor(None, test.WriteResults)
+        return test.results
+
+    async def run_app(self, app):
+        # Bad records are rejected before they take a session
+        try:
+            plan = compilePlan(app)
+        except PlanError as e:
+            return await self.failed_results(app, "Invalid test plan: {0}".format(e))
+        # Health check apps that pass over plain HTTP never take a session
+        if self.http_executor != None:
+            try:
+                test = await asyncio.get_running_loop().run_in_executor(self.http_executor, httpPreflight, app, plan)
+            except Exception:
+                test = None
+            if test != None: return test.results
+        async with self.slots:
+            if scheduler().overdue():
+                test = deadlineResults(app)
+                await asyncio.get_running_loop().run_in_executor(None, test.WriteResults)
+                return test.results
+            start = time.time()
+            try:
+                session = await self.acquire(app.get('BROWSER'), fresh=isolationMode(app) == "fresh")
+            except Exception as e:
+                return await self.failed_results(app, "Unable to run test: {0}".format(e))
+            application = None
+            try:
+                application = AsyncApplicationTest(session, TestResults(session.details, app))
+                return await application.run(app, plan, self.screenshot_always, time.time() - start)
+            finally:
+                await self.release(session, application)
+
+    # Run all apps and return their results in the same order as the apps list
+    async def run(self, apps):
+        self.client = HubClient(self.hub, self.connections, hubTimeout())
+        self.slots = asyncio.Semaphore(self.concurrency)
+        checker = httpChecker()
+        self.http_executor = ThreadPoolExecutor(max_workers=checker.workers) if checker != None else None
+        scheduler().start_run()
+        # Slow and flaky apps start first, results still come back in the caller's order
+        order = await asyncio.get_running_loop().run_in_executor(None, scheduler().order, apps)
+        try:
+            results = await asyncio.gather(*[self.run_app(apps[index]) for index in order])
+            return [result for index, result in sorted(zip(order, results), key=lambda pair: pair[0])]
+        finally:
+            await asyncio.gather(*[self.quit(session) for session in list(self.sessions)])
+            self.idle = {}
+            await self.client.close()
+            if self.http_executor != None: self.http_executor.shutdown()
+
+def runTestsAsync(apps, concurrency=None, screenshot_always=False):
+    return asyncio.run(AsyncTestEngine(concurrency, screenshot_always=screenshot_always).run(apps))
@@ -0,0 +1,235 @@
+from urllib.parse import urlsplit
+from .SessionPool import CLEAR_STORAGE_SCRIPT
+import asyncio, json, ssl, time
+
+# W3C WebDriver element reference key
+ELEMENT_KEY = "element-6066-11e4-a52e-4f735466cecf"
+
+# Locator names used in KVStore test definitions mapped to W3C locator strategies
+def w3cLocator(name, value):
+    if name == "id": return "css selector", '[id="{0}"]'.format(value)
+    if name == "name": return "css selector", '[name="{0}"]'.format(value)
+    if name == "class_name": return "css selector", ".{0}".format(value)
+    return {
+        "xpath": "xpath",
+        "link_text": "link text",
+        "partial_link_text": "partial link text",
+        "tag_name": "tag name",
+        "css_selector": "css selector"
+    }.get(name, name), value
+
+class WebDriverError(Exception):
+    def __init__(self, error, message="", status=500):
+        super().__init__("{0}: {1}".format(error, message))
+        self.error = error
+        self.message = message
+        self.status = status
+
+# The hub closed a keep-alive connection before sending any of the response, the request can safely go again
+class StaleConnection(ConnectionError):
+    pass
+
+# The hub sent no answer in time, not a WebDriver timeout, the command may still be running on the node
+class HubTimeout(Exception):
+    pass
+
+class HubClient():
+    # Minimal HTTP/1.1 JSON client with a pool of keep-alive connections to the hub
+    def __init__(self, url, connections=20, timeout=60):
+        parts = urlsplit(url)
+        self.scheme = parts.scheme or "http"
+        self.host = parts.hostname
+        self.port = parts.port or (443 if self.scheme == "https" else 80)
+        # WebDriver commands are sent below the hub path, e.g. /wd/hub
+        self.prefix = parts.path.rstrip('/')
+        self.timeout = timeout
+        self.idle = []
+        self.slots = asyncio.Semaphore(connections)
+        self.counters = {'requests': 0, 'connections': 0}
+
+    async def connect(self):
+        self.counters['connections'] += 1
+        context = ssl.create_default_context() if self.scheme == "https" else None
+        return await asyncio.open_connection(self.host, self.port, ssl=context)
+
+    def close_connection(self, connection):
+        try:
+            connection[1].close()
+        except Exception:
+            pass
+
+    async def read_response(self, reader):
+        try:
+            status_line = await reader.readline()
+        except ConnectionResetError as e:
+            raise StaleConnection("Connection reset by hub") from e
+        if not status_line: raise StaleConnection("Connection closed by hub")
+        status = int(status_line.split()[1])
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""): break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        if 'content-length' in headers:
+            body = await reader.readexactly(int(headers['content-length']))
+        elif headers.get('transfer-encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int((await reader.readline()).split(b';')[0], 16)
+                if size == 0:
+                    await reader.readline()
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readline()
+            body = b"".join(chunks)
+        else:
+            body = await reader.read()
+            headers['connection'] = 'close'
+        return status, headers, body
+
+    async def request(self, method, path, payload=None):
+        body = json.dumps(payload).encode('utf-8') if payload != None else b""
+        head = "{0} {1} HTTP/1.1\r\nHost: {2}:{3}\r\nConnection: keep-alive\r\nAccept: application/json\r\n".format(method, path, self.host, self.port)
+        if payload != None: head += "Content-Type: application/json;charset=UTF-8\r\n"
+        head += "Content-Length: {0}\r\n\r\n".format(len(body))
+        async with self.slots:
+            self.counters['requests'] += 1
+            # A reused connection may have been closed by the hub, retry once on a fresh one
+            # Only when nothing of the response was read, a timeout or a response cut short may mean the hub ran the command
+            for attempt in range(2):
+                reused = len(self.idle) > 0
+                connection = self.idle.pop() if reused else await self.connect()
+                try:
+                    try:
+                        connection[1].write(head.encode('latin-1') + body)
+                        await connection[1].drain()
+                    except (BrokenPipeError, ConnectionResetError) as e:
+                        raise StaleConnection("Connection closed by hub") from e
+                    try:
+                        status, headers, data = await asyncio.wait_for(self.read_response(connection[0]), self.timeout)
+                    except asyncio.TimeoutError as e:
+                        raise HubTimeout("No answer from the hub within {0} seconds".format(self.timeout)) from e
+                except StaleConnection:
+                    self.close_connection(connection)
+                    if reused and attempt == 0: continue
+                    raise
+                except BaseException:
+                    self.close_connection(connection)
+                    raise
+                if headers.get('connection', '').lower() == 'close': self.close_connection(connection)
+                else: self.idle.append(connection)
+                break
+        value = json.loads(data.decode('utf-8')).get('value') if data else None
+        if status >= 400:
+            error = value if isinstance(value, dict) else {}
+            raise WebDriverError(error.get('error', 'unknown error'), error.get('message', ''), status)
+        return value
+
+    async def close(self):
+        while self.idle:
+            self.close_connection(self.idle.pop())
+
+class AsyncSession():
+    def __init__(self, client, session_id, browser, capabilities=None):
+        self.client = client
+        self.session_id = session_id
+        self.browser = browser
+        self.capabilities = capabilities or {}
+        # For recycling like SessionPool, uses counts the apps the session was acquired for
+        self.created = time.time()
+        self.uses = 0
+
+    @classmethod
+    async def create(cls, client, browser, capabilities):
+        value = await client.request("POST", client.prefix + "/session", {"capabilities": {"alwaysMatch": capabilities}})
+        return cls(client, value['sessionId'], browser, value.get('capabilities'))
+
+    def command(self, method, path, payload=None):
+        return self.client.request(method, "{0}/session/{1}{2}".format(self.client.prefix, self.session_id, path), payload)
+
+    async def quit(self):
+        await self.client.request("DELETE", "{0}/session/{1}".format(self.client.prefix, self.session_id))
+
+    async def set_timeouts(self, page_load=None, script=None, implicit=None):
+        timeouts = {}
+        if page_load != None: timeouts['pageLoad'] = int(page_load * 1000)
+        if script != None: timeouts['script'] = int(script * 1000)
+        if implicit != None: timeouts['implicit'] = int(implicit * 1000)
+        await self.command("POST", "/timeouts", timeouts)
+
+    async def get(self, url):
+        await self.command("POST", "/url", {"url": url})
+
+    async def current_url(self):
+        return await self.command("GET", "/url")
+
+    async def title(self):
+        return await self.command("GET", "/title")
+
+    async def page_source(self):
+        return await self.command("GET", "/source")
+
+    async def execute_script(self, script, *args):
+        return await self.command("POST", "/execute/sync", {"script": script, "args": list(args)})
+
+    async def find_element(self, name, value, parent=None):
+        using, value = w3cLocator(name, value)
+        path = "/element/{0}/element".format(parent) if parent else "/element"
+        element = await self.command("POST", path, {"using": using, "value": value})
+        return element[ELEMENT_KEY]
+
+    async def element_text(self, element):
+        return await self.command("GET", "/element/{0}/text".format(element))
+
+    async def element_attribute(self, element, name):
+        return await self.command("GET", "/element/{0}/attribute/{1}".format(element, name))
+
+    async def element_property(self, element, name):
+        return await self.command("GET", "/element/{0}/property/{1}".format(element, name))
+
+    async def click(self, element):
+        await self.command("POST", "/element/{0}/click".format(element), {})
+
+    async def send_keys(self, element, text):
+        await self.command("POST", "/element/{0}/value".format(element), {"text": text})
+
+    async def switch_to_frame(self, element=None):
+        await self.command("POST", "/frame", {"id": {ELEMENT_KEY: element} if element else None})
+
+    async def dismiss_alert(self):
+        await self.command("POST", "/alert/dismiss", {})
+
+    # Selenium's log endpoint, e.g. Chrome's performance log, which is cleared by reading it
+    async def get_log(self, log_type):
+        return await self.command("POST", "/se/log", {"type": log_type})
+
+    async def screenshot(self):
+        return await self.command("GET", "/screenshot")
+
+    async def delete_all_cookies(self):
+        await self.command("DELETE", "/cookie")
+
+    async def window_handles(self):
+        return await self.command("GET", "/window/handles")
+
+    async def switch_to_window(self, handle):
+        await self.command("POST", "/window", {"handle": handle})
+
+    async def close_window(self):
+        await self.command("DELETE", "/window")
+
+    # Same as SessionPool.resetSession, clean the session for the next app while still on the last app's page
+    # Without CDP, sso and reset clean the same: web storage and the cookies of the page that is open
+    async def reset(self, mode="reset"):
+        if mode in ["reset", "sso"]:
+            handles = await self.window_handles()
+            if len(handles) > 1:
+                for handle in handles[1:]:
+                    await self.switch_to_window(handle)
+                    await self.close_window()
+                await self.switch_to_window(handles[0])
+            await self.switch_to_frame()
+            await self.execute_script(CLEAR_STORAGE_SCRIPT)
+            await self.delete_all_cookies()
+        await self.get('about:blank')
@@ -0,0 +1,221 @@
+from .HealthCheck import evaluateHealthCheck, evaluateHealthCheckV2, healthCheckRule, parseHealthCheck
+from .PageProbe import sanitize_string
+from .PageClassifier import PageClassifier, CORPUS
+from .FakeDriver import FakeDriver, fakeEnvironment, performanceLog
+from .TestConfig import loadSettings, settings
+import json, os, re, subprocess, sys, time, tracemalloc
+
+# Best of repeat runs in milliseconds
+def timeit(function, repeat=5):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best == None else min(best, elapsed)
+    return round(best, 3)
+
+# A pretty printed health check with the given number of dependencies, the first one failing when failing is set
+def healthCheckPayload(dependencies, layout, failing=False):
+    if layout == "Health":
+        healthcheck = {"dependencies": [{"name": "dependency{0}".format(i), "isHealthy": not (failing and i == 0), "description": "Dependency \"{0}\" checked".format(i)} for i in range(dependencies)]}
+    else:
+        healthcheck = {
+            "isHealthy": not failing,
+            "entries": {"dependency{0}".format(i): {"isHealthy": not (failing and i == 0), "duration": "00:00:00.0100000", "data": {}} for i in range(dependencies)}
+        }
+    return json.dumps(healthcheck, indent=2)
+
+# Legacy sanitize and evaluate against the compiled rule, with and without collecting every failure
+def benchmarkHealthCheck(sizes=(10, 1000, 20000), repeat=5):
+    rows = []
+    for layout in ["Health", "HealthCheck"]:
+        legacy = evaluateHealthCheck if layout == "Health" else evaluateHealthCheckV2
+        rule = healthCheckRule(layout, {})
+        for size in sizes:
+            for failing in [False, True]:
+                text = healthCheckPayload(size, layout, failing)
+                rows.append({
+                    "layout": layout,
+                    "dependencies": size,
+                    "failing": failing,
+                    "legacy_ms": timeit(lambda: legacy(json.loads(sanitize_string(text))), repeat),
+                    "collect_ms": timeit(lambda: rule.evaluate(parseHealthCheck(text)), repeat),
+                    "short_circuit_ms": timeit(lambda: rule.evaluate(parseHealthCheck(text), collect=False), repeat)
+                })
+    return rows
+
+BENCHMARK_URL = "http://127.0.0.1/benchmark"
+
+# Scripted pages for the framework benchmark, every scenario starts at BENCHMARK_URL
+def benchmarkPages(scenario):
+    page = {
+        "title": "Benchmark App",
+        "text": "Welcome to the benchmark app",
+        "elements": {
+            ("id", "content"): {"text": "Welcome to the benchmark app"},
+            ("id", "next"): {"text": "Next", "href": BENCHMARK_URL}
+        },
+        "timing": {"dns": 0, "connect": 0, "tls": 0, "ttfb": 5, "dom_content_loaded": 10, "load": 20, "resource_count": 25, "resource_bytes": 51200},
+        "logs": performanceLog(25)
+    }
+    if scenario == "alert": page["alert"] = "Sign in"
+    elif scenario == "neterror": page = {"title": "", "text": "This site can't be reached", "neterror": "This site can't be reached"}
+    elif scenario == "timeout": page = {"title": "", "text": "", "timeout": True}
+    elif scenario == "slow_title": page["title_delay"] = 0.05
+    return {BENCHMARK_URL: page}
+
+# Open followed by Find, FindText, Verify title and Click steps until the plan has size steps
+def benchmarkPlan(size):
+    steps = [
+        {"command": "Find", "element_name": "id", "element_value": "content", "enabled": 1},
+        {"command": "FindText", "assert": "contains", "expected_text": "welcome", "enabled": 1},
+        {"command": "Verify title", "assert": "contains", "title_expected": "benchmark", "enabled": 1},
+        {"command": "Click", "element_name": "id", "element_value": "next", "enabled": 1}
+    ]
+    return [{"command": "Open", "url": BENCHMARK_URL, "enabled": 1}] + [dict(steps[i % len(steps)]) for i in range(size - 1)]
+
+# No result sinks, screenshot store or history file while the framework benchmark runs
+BENCHMARK_SETTINGS = {'WEB_TRANSACTIONS_RESULTS__SINKS': '', 'WEB_TRANSACTIONS_SCREENSHOTS__PATH': '', 'WEB_TRANSACTIONS_HISTORY__PATH': ''}
+
+# Runs TestGenerator built tests through TestRunner against FakeDriver sessions
+# Time not spent in the fake browser (latency, page loads and scripted delays) is this package's overhead
+def benchmarkFramework(sizes=(1, 5, 20), scenarios=("steps", "alert", "neterror", "timeout", "slow_title"), apps=5, latency=0, browser="Chrome"):
+    from . import TestRunner
+    from .SessionPool import SessionPool
+    # The settings file and environment apply again once the benchmark is done
+    path = settings().path
+    loadSettings(path, dict(os.environ, **BENCHMARK_SETTINGS))
+    try:
+        # One unmeasured app first, so imports and first-use caches don't count towards the first row
+        TestRunner(workers=1, pool=SessionPool(lambda name: FakeDriver(benchmarkPages("steps"), 0, name), fakeEnvironment)).run([{"ITEM_ID": "warmup", "URL": BENCHMARK_URL, "BROWSER": browser, "TESTS": benchmarkPlan(max(sizes))}])
+        rows = []
+        for scenario in scenarios:
+            for size in sizes if scenario in ["steps", "slow_title"] else sizes[:1]:
+                pages = benchmarkPages(scenario)
+                drivers = []
+                def launch(name):
+                    drivers.append(FakeDriver(pages, latency, name))
+                    return drivers[-1]
+                plans = [{"ITEM_ID": "benchmark{0}".format(i), "URL": BENCHMARK_URL, "BROWSER": browser, "TESTS": benchmarkPlan(size)} for i in range(apps)]
+                tracemalloc.start()
+                start = time.perf_counter()
+                results = TestRunner(workers=1, pool=SessionPool(launch, fakeEnvironment)).run(plans)
+                wall = time.perf_counter() - start
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                round_trips = sum(driver.round_trips for driver in drivers)
+                overhead = wall - sum(driver.simulated for driver in drivers)
+                commands = {}
+                for driver in drivers:
+                    for command, count in driver.commands.items():
+                        commands[command] = commands.get(command, 0) + count
+                rows.append({
+                    "scenario": scenario,
+                    "steps": size,
+                    "apps": apps,
+                    "status": sorted(set(r['results'].get('status') for r in results)),
+                    "wall_ms": round(wall * 1000, 3),
+                    "overhead_ms_per_app": round(overhead * 1000 / apps, 3),
+                    "overhead_ms_per_command": round(overhead * 1000 / max(round_trips, 1), 3),
+                    "round_trips_per_step": round(round_trips / float(apps * size), 2),
+                    "peak_kb": round(peak / 1024.0, 1),
+                    "commands": commands
+                })
+        return rows
+    finally:
+        loadSettings(path)
+
+IMPORT_SCRIPT = """
+import sys, time
+start = time.perf_counter()
+import {0}
+print(time.perf_counter() - start, 'selenium.webdriver.remote.webdriver' in sys.modules)
+"""
+
+# Cold start of a fresh interpreter importing each module, as a scripted input would
+def benchmarkImport(modules=("", ".TestPlan", ".ResultSinks", ".TestBuilder", ".TestRunner"), repeat=5):
+    package = __package__
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([os.path.dirname(os.path.dirname(os.path.abspath(__file__)))] + sys.path))
+    rows = []
+    for module in modules:
+        times = []
+        for _ in range(repeat):
+            output = subprocess.check_output([sys.executable, "-c", IMPORT_SCRIPT.format(package + module)], env=env, universal_newlines=True).split()
+            times.append(float(output[0]) * 1000)
+        rows.append({"module": package + module, "import_ms": round(min(times), 3), "selenium_webdriver": output[1] == "True"})
+    return rows
+
+# The if chain classifySnapshot ran before PageClassifier, as the baseline
+def legacyClassifySnapshot(snapshot):
+    page_title = snapshot.get('title') or False
+    url = snapshot.get('url') or ''
+    toast = snapshot.get('toast')
+    neterror = snapshot.get('neterror')
+    access_error = snapshot.get('access_error')
+
+    if not page_title and snapshot.get('blank_source'):
+        access_error = "Not authorized"
+    if access_error:
+        return 'Warning', access_error
+
+    if toast:
+        toast = sanitize_string(toast)
+        if re.search(r'(?:\D|^)40[1,3](?:\D|$)|unauthorized|denied', toast.lower()):
+            return 'Warning', toast
+        return 'Failed', toast
+
+    if re.search(r'apology|outage', url):
+        heading = snapshot.get('heading')
+        if heading != None and re.search(r'^Planned', heading):
+            return 'Warning', heading
+        return 'Failed', page_title
+
+    if page_title and (re.search(r'(?:\D|^)[45]\d{2}(?:\D|$)', page_title) or re.search(r'problem|failed|service\sunavailable|not\savailable|error|denied', page_title)):
+        if re.search(r'40[13]\D', page_title) or 'denied' in page_title:
+            return 'Warning', page_title
+        return 'Failed', page_title
+
+    if neterror:
+        return 'Failed', sanitize_string(neterror)
+
+    if not page_title:
+        body = snapshot.get('body')
+        error = sanitize_string(body) if body != None else "failed to get page text"
+        try:
+            error = json.loads(error)
+        except:
+            pass
+        if len(error) == 0:
+            error = "Blank Page Loaded"
+        # Valid JSON indicates a Health Check, a large page likely loaded before the title was caught
+        if isinstance(error, dict) or len(error) >= 1000:
+            return 'Passed', None
+        if not isinstance(error, str):
+            return 'Debug', 'An unknown error occured: {0}'.format(error)
+        if re.search(r'(?:\D|^)40[1,3](?:\D|$)|unauthorized|denied', error.lower()):
+            return 'Warning', error
+        if re.search(r'(?:\D|^)[45]\d{2}(?:\D|$)|error|^blank', error.lower()):
+            return 'Failed', error
+    return 'Passed', None
+
+# Both classifiers over the corpus, mismatches count snapshots where the rules don't give the expected status and error
+def benchmarkClassifier(copies=200, repeat=5):
+    classifier = PageClassifier(rules=[], disabled=[])
+    snapshots = [snapshot for snapshot, expected in CORPUS] * copies
+    mismatches = [classifier.explain(snapshot) or 'passed' for snapshot, expected in CORPUS if classifier.classify(snapshot) != expected]
+    return [{
+        "snapshots": len(snapshots),
+        "mismatches": mismatches,
+        "legacy_mismatches": len([snapshot for snapshot, expected in CORPUS if legacyClassifySnapshot(snapshot) != expected]),
+        "legacy_ms": timeit(lambda: [legacyClassifySnapshot(snapshot) for snapshot in snapshots], repeat),
+        "rules_ms": timeit(lambda: [classifier.classify(snapshot) for snapshot in snapshots], repeat)
+    }]
+
+BENCHMARKS = {'healthcheck': benchmarkHealthCheck, 'framework': benchmarkFramework, 'import': benchmarkImport, 'classifier': benchmarkClassifier}
+
+# python -m <package>.Benchmarks [name ...], one JSON line per measurement
+if __name__ == '__main__':
+    for name in sys.argv[1:] or sorted(BENCHMARKS):
+        for row in BENCHMARKS[name]():
+            print(json.dumps(dict(row, benchmark=name)))
@@ -0,0 +1,200 @@
+from .KVStoreLoader import KVStoreLoader, recordHash, recordToApp
+from .SingleSignOn import batchKey, batchingEnabled
+from .TestConfig import TestSettings
+import heapq, itertools, random, signal, threading, time
+
+# Identifies an app across reloads, the KVStore record key when there is one
+def appKey(app):
+    return app.get('_key') or "{0}:{1}".format(app.get('ITEM_ID'), app.get('BROWSER'))
+
+# Apps from the [KVStore] collection, synced incrementally on every reload
+def kvstoreApps(loader=None):
+    loader = loader if loader != None else KVStoreLoader()
+    def load():
+        loader.sync()
+        return loader.apps()
+    return load
+
+class Daemon():
+    # Keeps browser sessions warm and runs each app on its own interval until stopped
+    # Due apps wait in a heap ordered by due time, workers take the earliest one as soon as it's due and put it back for its next run
+    def __init__(self, load=None, workers=None, interval=None, jitter=None, reload_interval=None, runner=None, screenshot_always=False):
+        from . import TestRunner
+        # load() returns the current app definitions, the [KVStore] collection by default
+        self.load = load if load != None else kvstoreApps()
+        self.runner = runner if runner != None else TestRunner(workers, screenshot_always)
+        self.workers = workers if workers else self.runner.workers
+        # Seconds between runs of an app without its own interval field
+        self.interval = interval if interval else TestSettings.getfloat('Daemon', 'interval', fallback=300)
+        self.interval_field = TestSettings.get('Daemon', 'interval_field', fallback='INTERVAL')
+        self.min_interval = TestSettings.getfloat('Daemon', 'min_interval', fallback=30)
+        # Up to this fraction of the interval is added to each run, so apps with the same interval don't start together
+        self.jitter = jitter if jitter != None else TestSettings.getfloat('Daemon', 'jitter', fallback=0.1)
+        self.reload_interval = reload_interval if reload_interval else TestSettings.getfloat('Daemon', 'reload_interval', fallback=60)
+        self.shutdown_timeout = TestSettings.getfloat('Daemon', 'shutdown_timeout', fallback=120)
+        # With [SSO] batch set, apps behind the same sign in that are due within this many seconds run together in one session
+        self.batch_window = TestSettings.getfloat('Daemon', 'batch_window', fallback=30)
+        self.apps = {}
+        self.hashes = {}
+        # (due, sequence, key), an entry whose sequence isn't the app's current one was replaced and is skipped
+        self.heap = []
+        self.current = {}
+        self.base = {}
+        self.running = set()
+        self.sequence = itertools.count()
+        self.condition = threading.Condition()
+        self.stopping = threading.Event()
+        self.threads = []
+        self.counters = {'runs': 0, 'late': 0, 'failed': 0, 'reloads': 0, 'reload_failed': 0, 'added': 0, 'changed': 0, 'removed': 0}
+
+    def stats(self):
+        with self.condition:
+            stats = dict(self.counters)
+            stats['apps'] = len(self.apps)
+            stats['running'] = len(self.running)
+            stats['next_due'] = round(self.heap[0][0] - time.time(), 3) if self.heap else None
+        return stats
+
+    def app_interval(self, app):
+        try:
+            interval = float(app.get(self.interval_field) or self.interval)
+        except (TypeError, ValueError):
+            interval = self.interval
+        return max(interval, self.min_interval)
+
+    # Put an app back in the heap, due at its base time plus jitter, with the caller holding the condition
+    def schedule(self, key, base):
+        interval = self.app_interval(self.apps[key])
+        self.base[key] = base
+        sequence = next(self.sequence)
+        self.current[key] = sequence
+        heapq.heappush(self.heap, (base + random.uniform(0, interval * self.jitter), sequence, key))
+        self.condition.notify()
+
+    # Pick up added, changed and removed apps, a new app or a changed interval is scheduled from now
+    def reload(self):
+        try:
+            apps = dict((appKey(app), recordToApp(app)) for app in self.load())
+        except Exception:
+            with self.condition:
+                self.counters['reload_failed'] += 1
+            return False
+        hashes = dict((key, recordHash(app)) for key, app in apps.items())
+        now = time.time()
+        with self.condition:
+            for key in [key for key in self.apps if key not in apps]:
+                del self.apps[key]
+                self.current.pop(key, None)
+                self.base.pop(key, None)
+                self.counters['removed'] += 1
+            for key, app in apps.items():
+                if key not in self.apps:
+                    self.apps[key] = app
+                    self.schedule(key, now)
+                    self.counters['added'] += 1
+                elif hashes[key] != self.hashes.get(key):
+                    interval_changed = self.app_interval(app) != self.app_interval(self.apps[key])
+                    self.apps[key] = app
+                    if interval_changed and key not in self.running: self.schedule(key, now)
+                    self.counters['changed'] += 1
+            self.hashes = hashes
+            self.counters['reloads'] += 1
+        return True
+
+    # Due apps behind the same sign in as the app, taken off the heap with the caller holding the condition
+    def batch_for(self, key, now):
+        group = batchKey(self.apps[key]) if batchingEnabled() else None
+        if group == None: return []
+        batch = []
+        for due, sequence, other in sorted(self.heap):
+            if due > now + self.batch_window: break
+            if self.current.get(other) != sequence or batchKey(self.apps[other]) != group: continue
+            self.current.pop(other)
+            batch.append((due, other, self.apps[other]))
+        return batch
+
+    # The next due apps, waiting for them, None once stopping
+    def next_apps(self):
+        with self.condition:
+            while not self.stopping.is_set():
+                while self.heap and self.current.get(self.heap[0][2]) != self.heap[0][1]:
+                    heapq.heappop(self.heap)
+                now = time.time()
+                if self.heap and self.heap[0][0] <= now:
+                    due, sequence, key = heapq.heappop(self.heap)
+                    self.current.pop(key, None)
+                    entries = [(due, key, self.apps[key])] + self.batch_for(key, now)
+                    for entry in entries:
+                        self.running.add(entry[1])
+                    return entries
+                self.condition.wait(self.heap[0][0] - time.time() if self.heap else None)
+            return None
+
+    # Whether each app failed, apps that still need a browser after the HTTP check share a session when there are several
+    def run_apps(self, apps):
+        results = [None] * len(apps)
+        try:
+            results = [self.runner.preflight(app) for app in apps]
+            browser = [index for index, result in enumerate(results) if result == None]
+            batch = self.runner.run_batch([apps[index] for index in browser]) if len(browser) > 1 else [self.runner.run_app(apps[index]) for index in browser]
+            for index, result in zip(browser, batch):
+                results[index] = result
+        except Exception:
+            pass
+        return [result == None or result['results'].get('status') == "Failed" for result in results]
+
+    def work(self):
+        while True:
+            entries = self.next_apps()
+            if entries == None: return
+            start = time.time()
+            failures = self.run_apps([app for due, key, app in entries])
+            with self.condition:
+                for (due, key, app), failed in zip(entries, failures):
+                    self.running.discard(key)
+                    self.counters['runs'] += 1
+                    if failed: self.counters['failed'] += 1
+                    if start - due > self.app_interval(app): self.counters['late'] += 1
+                    # Keep the app's cadence, unless it ran so long that its next run is already overdue
+                    if key in self.apps and key not in self.current:
+                        base = self.base.get(key, due) + self.app_interval(self.apps[key])
+                        self.schedule(key, max(base, time.time()))
+
+    def start(self):
+        self.reload()
+        with self.condition:
+            apps = list(self.apps.values())
+        self.runner.prewarm(apps)
+        for _ in range(self.workers):
+            thread = threading.Thread(target=self.work, daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    # Finish the apps that are running, then close the sessions
+    def stop(self, *args):
+        self.stopping.set()
+        with self.condition:
+            self.condition.notify_all()
+
+    def join(self):
+        deadline = time.time() + self.shutdown_timeout
+        for thread in self.threads:
+            thread.join(max(deadline - time.time(), 0))
+        self.runner.close()
+
+    # Run until SIGTERM or SIGINT, reloading the app definitions every reload_interval seconds
+    def run_forever(self):
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGTERM, self.stop)
+            signal.signal(signal.SIGINT, self.stop)
+        self.start()
+        while not self.stopping.wait(self.reload_interval):
+            self.reload()
+        self.join()
+
+def runDaemon(load=None, workers=None, screenshot_always=False):
+    Daemon(load, workers, screenshot_always=screenshot_always).run_forever()
+
+# python -m <package>.Daemon runs the [KVStore] collection's apps until stopped
+if __name__ == '__main__':
+    runDaemon()
@@ -0,0 +1,255 @@
+from selenium.common.exceptions import TimeoutException
+from selenium.common.exceptions import NoSuchElementException
+from selenium.common.exceptions import NoAlertPresentException
+from selenium.common.exceptions import UnexpectedAlertPresentException
+from selenium.common.exceptions import WebDriverException
+from .StubWebDriver import STUB_USER_AGENT, STUB_SCREENSHOT
+from .Waits import LOCATORS, TITLE_CONDITION, TITLE_CONTAINS_CONDITION, ELEMENT_CONDITION
+from collections import Counter
+import base64, itertools, json, time
+
+# An in-process stand-in for a Selenium Remote WebDriver, for running TestSuite without a browser or hub
+# Pages use the StubWebDriver layout plus a few scripted behaviours:
+# {
+#     "https://app.example.com": {
+#         "title": "Example App",
+#         "text": "Welcome",
+#         "elements": {("id", "login"): {"text": "Log in", "attributes": {}, "href": "https://app.example.com/login", "delay": 0.2}},
+#         "load": 0.5,            # seconds the page takes to load
+#         "title_delay": 0.1,     # seconds after the load before the title is set
+#         "timeout": True,        # the page load times out
+#         "alert": "Sign in",     # an alert is open after the load
+#         "windows": 1,           # popups opened by the page
+#         "neterror": "...",      # Chrome or Firefox error page text
+#         "toast": "...", "heading": "...", "timing": {...},
+#         "logs": [...]           # Chrome performance log entries returned after the load
+#     }
+# }
+BLANK_PAGE = {"title": "", "text": ""}
+# Element locators by the Selenium By value, elements are keyed by the names used in test plans
+BY_NAMES = dict((by, name) for name, by in LOCATORS.items())
+
+class FakeElement():
+    def __init__(self, driver, spec):
+        self.driver = driver
+        self.spec = spec
+        self.id = "element-{0}".format(next(driver.ids))
+
+    @property
+    def text(self):
+        return self.driver.execute('getElementText', {'id': self.id})['value']
+
+    def click(self):
+        self.driver.execute('clickElement', {'id': self.id})
+        if self.spec.get('href'): self.driver.load(self.spec['href'])
+
+    def send_keys(self, *value):
+        self.driver.execute('sendKeysToElement', {'id': self.id, 'text': ''.join(value)})
+        attributes = self.spec.setdefault('attributes', {})
+        attributes['value'] = attributes.get('value', '') + ''.join(value)
+
+    def get_attribute(self, name):
+        return self.driver.execute('getElementAttribute', {'id': self.id, 'name': name})['value']
+
+    def is_displayed(self):
+        return self.driver.execute('isElementDisplayed', {'id': self.id})['value']
+
+    def is_enabled(self):
+        return self.driver.execute('isElementEnabled', {'id': self.id})['value']
+
+class FakeSwitchTo():
+    def __init__(self, driver):
+        self.driver = driver
+
+    def frame(self, frame):
+        self.driver.execute('switchToFrame', {'id': getattr(frame, 'id', frame)})
+
+    def default_content(self):
+        self.driver.execute('switchToFrame', {'id': None})
+
+    def window(self, handle):
+        self.driver.execute('switchToWindow', {'handle': handle})
+        self.driver.window = handle
+
+class FakeDriver():
+    # latency is added to every round trip, counters record them per command and simulated the seconds spent waiting on the "browser"
+    ids = itertools.count(1)
+
+    def __init__(self, pages=None, latency=0, browser="Chrome"):
+        self.pages = pages or {}
+        self.latency = latency
+        self.browser = browser
+        self.session_id = "fake-{0}".format(next(self.ids))
+        self.commands = Counter()
+        self.simulated = 0.0
+        self.url = "about:blank"
+        self.loaded = time.time()
+        self.alert = None
+        self.logs = []
+        self.elements = {}
+        self.timeouts = {}
+        # Pages can open popups with "windows": n, the first handle is the main window
+        self.windows = ["window-1"]
+        self.window = "window-1"
+        self.switch_to = FakeSwitchTo(self)
+
+    @property
+    def page(self):
+        return self.pages.get(self.url, BLANK_PAGE)
+
+    @property
+    def round_trips(self):
+        return sum(self.commands.values())
+
+    def sleep(self, seconds):
+        if seconds <= 0: return
+        self.simulated += seconds
+        time.sleep(seconds)
+
+    # Every call the package makes goes through here, like RemoteWebDriver.execute
+    def execute(self, command, params=None):
+        self.commands[command] += 1
+        self.sleep(self.latency)
+        if command in ["w3cDismissAlert", "dismissAlert", "w3cAcceptAlert", "acceptAlert"]:
+            if self.alert == None: raise NoAlertPresentException()
+            self.alert = None
+        elif self.alert != None and command not in ["quit", "getAlertText"]:
+            raise UnexpectedAlertPresentException(alert_text=self.alert)
+        return {'value': self.respond(command, params or {})}
+
+    def respond(self, command, params):
+        if command in ["getElementText", "getElementAttribute", "isElementDisplayed", "isElementEnabled"]:
+            spec = self.elements.get(params['id'], {})
+            if command == "getElementText": return spec.get('text', '')
+            if command == "getElementAttribute": return spec.get('attributes', {}).get(params['name'])
+            return True
+        if command == "getTitle": return self.title_now()
+        if command == "getCurrentUrl": return self.url
+        if command == "getPageSource": return "<html><head></head><body>{0}</body></html>".format(self.page.get('text', ''))
+        if command == "screenshot": return STUB_SCREENSHOT
+        if command == "w3cGetWindowHandles": return self.windows
+        return None
+
+    # Loads a page, the page's load time is simulated and a timeout raises like the browser would
+    def load(self, url):
+        page = self.pages.get(url, BLANK_PAGE)
+        self.url = page.get('redirect', url)
+        page = self.page
+        self.elements = {}
+        self.sleep(min(page.get('load', 0), self.timeouts.get('pageLoad', float('inf'))))
+        self.loaded = time.time()
+        self.logs = list(page.get('logs', []))
+        self.alert = page.get('alert')
+        self.windows = self.windows[:1] + ["window-{0}".format(i + 2) for i in range(page.get('windows', 0))]
+        if page.get('timeout'): raise TimeoutException("Timed out receiving message from renderer")
+        if page.get('unreachable'): raise WebDriverException("unknown error: net::ERR_NAME_NOT_RESOLVED")
+
+    def title_now(self):
+        return self.page.get('title', '') if time.time() - self.loaded >= self.page.get('title_delay', 0) else ''
+
+    def element(self, name, value):
+        spec = self.page.get('elements', {}).get((name, value))
+        if spec == None and value == "//*": spec = {"text": self.page.get('text', '')}
+        if spec == None or time.time() - self.loaded < spec.get('delay', 0): return None
+        element = FakeElement(self, spec)
+        self.elements[element.id] = spec
+        return element
+
+    def get(self, url):
+        self.execute('get', {'url': url})
+        self.load(url)
+
+    @property
+    def title(self):
+        return self.execute('getTitle')['value']
+
+    @property
+    def current_url(self):
+        return self.execute('getCurrentUrl')['value']
+
+    @property
+    def page_source(self):
+        return self.execute('getPageSource')['value']
+
+    def find_element(self, by, value):
+        self.execute('findElement', {'using': by, 'value': value})
+        element = self.element(BY_NAMES.get(by, by), value)
+        if element == None: raise NoSuchElementException("Unable to locate element: {0}".format(value))
+        return element
+
+    def execute_script(self, script, *args):
+        self.execute('executeScript', {'script': script, 'args': args})
+        page = self.page
+        if "navigator.userAgent" in script: return STUB_USER_AGENT if self.browser.startswith("Chrome") else "Mozilla/5.0 (X11; Linux x86_64; rv:90.0) Gecko/20100101 Firefox/90.0"
+        if "page probe" in script:
+            return {"title": self.title_now(), "url": self.url, "toast": page.get('toast'), "neterror": page.get('neterror'), "body": page.get('text', ''),
+                "heading": page.get('heading'), "blank_source": False, "timing": page.get('timing')}
+        if "performance.getEntriesByType" in script: return page.get('timing')
+        return page.get('script')
+
+    # Runs the Waits conditions, resolving when the scripted title or element appears or at the script's own deadline
+    def execute_async_script(self, script, *args):
+        self.execute('executeAsyncScript', {'script': script, 'args': args})
+        if TITLE_CONTAINS_CONDITION in script: check = lambda: self.title_now() if args[0][0] in self.title_now().lower() else None
+        elif TITLE_CONDITION in script: check = lambda: self.title_now() or None
+        elif ELEMENT_CONDITION in script: check = lambda: self.element(args[0][0], args[0][1])
+        else: return self.page.get('script')
+        deadline = time.time() + (args[1] / 1000.0 if len(args) > 1 else self.timeouts.get('script', 30))
+        while True:
+            value = check()
+            if value or time.time() >= deadline: return value or None
+            self.sleep(min(0.01, deadline - time.time()))
+
+    def set_script_timeout(self, timeout):
+        self.execute('setTimeouts', {'script': timeout})
+        self.timeouts['script'] = timeout
+
+    def set_page_load_timeout(self, timeout):
+        self.execute('setTimeouts', {'pageLoad': timeout})
+        self.timeouts['pageLoad'] = timeout
+
+    @property
+    def window_handles(self):
+        return list(self.execute('w3cGetWindowHandles')['value'])
+
+    def close(self):
+        self.execute('closeWindow')
+        if self.window in self.windows[1:]: self.windows.remove(self.window)
+
+    def get_log(self, log_type):
+        self.execute('getLog', {'type': log_type})
+        logs, self.logs = self.logs, []
+        return logs
+
+    def get_screenshot_as_base64(self):
+        return self.execute('screenshot')['value']
+
+    def get_screenshot_as_png(self):
+        return base64.b64decode(self.get_screenshot_as_base64())
+
+    def delete_all_cookies(self):
+        self.execute('deleteAllCookies')
+
+    def maximize_window(self):
+        self.execute('w3cMaximizeWindow')
+
+    def quit(self):
+        self.execute('quit')
+
+# Environment details for a fake session, without asking a grid for the node
+def fakeEnvironment(driver):
+    name = "Chrome" if driver.browser.startswith("Chrome") else "Firefox"
+    return {'browser': {"name": name, "version": "0.0"}, 'host': {'name': "localhost", 'ip': "127.0.0.1", 'os': "Linux"}}
+
+# Chrome performance log entries for a page load of the given number of requests
+def performanceLog(requests, size=2048):
+    entries = []
+    for i in range(requests):
+        for method, params in [
+            ('Network.requestWillBeSent', {'request': {'url': "https://app.example.com/resource{0}".format(i)}, 'timestamp': i * 0.01}),
+            ('Network.responseReceived', {'response': {'status': 200}}),
+            ('Network.loadingFinished', {'timestamp': i * 0.01 + 0.005, 'encodedDataLength': size})
+        ]:
+            params['requestId'] = str(i)
+            entries.append({'level': 'INFO', 'message': json.dumps({'message': {'method': method, 'params': params}})})
+    return entries
@@ -0,0 +1,175 @@
+from .PageProbe import sanitize_string
+from .TestConfig import TestSettings
+from collections import namedtuple
+import json, re
+
+# Returns False when every dependency reports a healthy key, otherwise the failure details
+def evaluateHealthCheck(healthcheck, key=None):
+    failed = False
+    key = key if key != None and len(key) > 0 else "isHealthy"
+    for category in healthcheck:
+        if type(healthcheck[category]) == list:
+            for dependency in healthcheck[category]:
+                if type(dependency) == dict:
+                    result = dependency.get(key)
+                    if result == None:
+                        failed = {"error": 'The key "{0}" was not found in the Health Check output'.format(key)}
+                    elif str(result).lower() not in ["true", "1"]:
+                        failed = dependency
+    return failed
+
+def evaluateHealthCheckV2(healthcheck, key=None, value=None):
+    key = key if key != None and len(key) > 0 else "isHealthy"
+    value = value if value != None and len(value) > 0 else "true"
+    status = str(healthcheck.get(key))
+    failed = False
+    if status != value:
+        entries = healthcheck.get('entries')
+        if isinstance(entries, dict):
+            failed_dependencies = ["{0} ({1}: {2})".format(k, key, v.get(key)) for k, v in entries.items() if isinstance(v, dict) and v.get(key) != value]
+            failed = {"error": "Health check failed for dependencies: {0}".format(', '.join(failed_dependencies))}
+        else:
+            failed = {"error": "Health check failed with {0}: {1}".format(key, status)}
+    return failed
+
+# Path segments, a name looks up an object key, KEYS matches every value of an object and ITEMS every item of an array
+KEYS = object()
+ITEMS = object()
+MISSING = object()
+
+HealthCheckResult = namedtuple('HealthCheckResult', ['healthy', 'failures', 'count', 'error'])
+PATH_TOKEN = re.compile(r"\.\*|\[\*\]|\[(\d+)\]|\.([^.\[\]]+)|\['([^']*)'\]")
+
+# Compile a path like $.entries.*.status or $.*[*].isHealthy into a tuple of segments
+def compilePath(path):
+    path = path.strip()
+    if not path.startswith('$'): raise ValueError('JSON path "{0}" must start with $'.format(path))
+    segments = []
+    position = 1
+    while position < len(path):
+        match = PATH_TOKEN.match(path, position)
+        if match == None: raise ValueError('Invalid JSON path "{0}" at position {1}'.format(path, position))
+        token = match.group(0)
+        if token == ".*": segments.append(KEYS)
+        elif token == "[*]": segments.append(ITEMS)
+        elif match.group(1) != None: segments.append(int(match.group(1)))
+        else: segments.append(match.group(2) if match.group(2) != None else match.group(3))
+        position = match.end()
+    return tuple(segments)
+
+def formatPath(segments):
+    path = "$"
+    for segment in segments:
+        if isinstance(segment, int): path += "[{0}]".format(segment)
+        elif '.' in str(segment) or '[' in str(segment): path += "['{0}']".format(segment)
+        else: path += "." + str(segment)
+    return path
+
+# JSON text of scalars, true and false are matched in any case so that JSON true passes for "true" like the string does
+def normalize(value):
+    if value is True: return "true"
+    if value is False: return "false"
+    if isinstance(value, str): return value
+    return json.dumps(value)
+
+class HealthCheckRule():
+    # Healthy when every value at the status paths is one of the expected values
+    # Detail paths are only read once the status failed, to report which dependencies are unhealthy
+    # Required paths fail when they match nothing, the legacy layouts pass when there is nothing to check
+    # String values match exactly unless ignore_case is set, like the legacy Health command that lowercased them
+    def __init__(self, status_paths, expected, detail_paths=(), required=True, key=None, ignore_case=False):
+        self.status_paths = tuple(compilePath(p) if isinstance(p, str) else tuple(p) for p in status_paths)
+        self.detail_paths = tuple(compilePath(p) if isinstance(p, str) else tuple(p) for p in detail_paths)
+        self.ignore_case = ignore_case
+        self.expected = frozenset(normalize(value).lower() if ignore_case else normalize(value) for value in expected)
+        self.booleans = frozenset(value.lower() for value in self.expected if value.lower() in ["true", "false"])
+        self.required = required
+        self.key = key
+
+    def matches(self, value):
+        if isinstance(value, bool): return normalize(value) in self.booleans
+        value = normalize(value)
+        return (value.lower() if self.ignore_case else value) in self.expected
+
+    # Every (path, value) the segments lead to, MISSING when the last key isn't in its object
+    def walk(self, document, segments):
+        nodes = [((), document)]
+        for depth, segment in enumerate(segments):
+            last = depth == len(segments) - 1
+            found = []
+            for path, node in nodes:
+                if segment is KEYS:
+                    if isinstance(node, dict): found.extend((path + (key,), value) for key, value in node.items())
+                elif segment is ITEMS:
+                    if isinstance(node, list): found.extend((path + (index,), value) for index, value in enumerate(node))
+                elif isinstance(segment, int):
+                    if isinstance(node, list) and segment < len(node): found.append((path + (segment,), node[segment]))
+                elif isinstance(node, dict):
+                    if segment in node: found.append((path + (segment,), node[segment]))
+                    elif last: found.append((path + (segment,), MISSING))
+            nodes = found
+        return nodes
+
+    def failures(self, document, paths):
+        for segments in paths:
+            for path, value in self.walk(document, segments):
+                if value is MISSING or not self.matches(value):
+                    yield {"path": formatPath(path), "value": None if value is MISSING else value}
+
+    # With collect=False it stops at the first failure, when only pass or fail matters
+    def evaluate(self, document, collect=True, limit=100):
+        failures = []
+        count = 0
+        for failure in self.failures(document, self.status_paths):
+            count += 1
+            if not collect: return HealthCheckResult(False, [failure], count, self.error([failure], [], count))
+            if len(failures) < limit: failures.append(failure)
+        if count == 0 and self.required and not any(self.walk(document, segments) for segments in self.status_paths):
+            failure = {"path": formatPath(self.status_paths[0]), "value": None}
+            return HealthCheckResult(False, [failure], 1, self.error([failure], [], 1))
+        if count == 0: return HealthCheckResult(True, [], 0, None)
+        dependencies = []
+        failing = 0
+        for failure in self.failures(document, self.detail_paths):
+            failing += 1
+            if len(failures) + len(dependencies) < limit: dependencies.append(failure)
+        return HealthCheckResult(False, failures + dependencies, count + failing, self.error(failures, dependencies, failing or count))
+
+    # Failing dependencies when the layout has them, otherwise the failing status paths
+    def error(self, failures, dependencies, count):
+        if dependencies: failures = dependencies
+        elif self.key != None and self.detail_paths:
+            return "Health check failed with {0}: {1}".format(self.key, failures[0]['value'])
+        elif self.key != None and all(f['value'] == None for f in failures):
+            return 'The key "{0}" was not found in the Health Check output'.format(self.key)
+        listed = ["{0} ({1})".format(f['path'], 'missing' if f['value'] == None else f['value']) for f in failures[:5]]
+        more = " and {0} more".format(count - len(listed)) if count > len(listed) else ""
+        return "Health check failed for dependencies: {0}{1}".format(', '.join(listed), more)
+
+# The rule for a Health or HealthCheck step
+# Steps can set paths and expected as comma separated lists, otherwise the legacy layouts apply:
+# Health checks every "key" of objects in top level arrays, HealthCheck the top level "key" and reports failing "entries"
+def healthCheckRule(command, step):
+    key = step.get('key') if step.get('key') != None and len(step.get('key')) > 0 else "isHealthy"
+    expected = [value.strip() for value in str(step['expected']).split(',')] if step.get('expected') not in [None, ''] else None
+    if step.get('paths') not in [None, '']:
+        return HealthCheckRule([p for p in step['paths'].split(',') if p.strip()], expected or ["true"])
+    if command == "Health":
+        return HealthCheckRule([(KEYS, ITEMS, key)], expected or ["true", "1"], required=False, key=key, ignore_case=True)
+    value = step.get('value') if step.get('value') != None and len(step.get('value')) > 0 else "true"
+    return HealthCheckRule([(key,)], expected or [value], [("entries", KEYS, key)], key=key)
+
+# Parse the page text as is, only falling back to the sanitized text the legacy checks parsed
+def parseHealthCheck(text):
+    try:
+        return json.loads(text)
+    except ValueError:
+        pass
+    try:
+        return json.loads(sanitize_string(text if isinstance(text, str) else text.decode('utf-8', 'replace')))
+    except ValueError:
+        return False
+
+# Failures kept in a result, a large payload can have thousands of unhealthy dependencies
+def healthCheckLimit():
+    return TestSettings.getint('HealthCheck', 'max_failures', fallback=100)
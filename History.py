@@ -0,0 +1,123 @@
+from collections import deque
+from .Scheduler import DurationHistory, percentile
+from .TestConfig import TestSettings
+import math, sqlite3, threading, time
+
+# Step index used for the duration of the whole transaction
+APP = -1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS durations (
+    item_id TEXT NOT NULL,
+    browser TEXT NOT NULL,
+    step INTEGER NOT NULL,
+    time REAL NOT NULL,
+    duration REAL NOT NULL,
+    failed INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS durations_key ON durations (item_id, browser, step, time);
+"""
+
+# How a duration compares to earlier ones, None until there are enough of them
+def compareToBaseline(duration, samples):
+    if len(samples) < 2: return None
+    mean = sum(samples) / float(len(samples))
+    stdev = math.sqrt(sum((s - mean) ** 2 for s in samples) / (len(samples) - 1))
+    return {
+        "p50": percentile(samples, 50),
+        "p95": percentile(samples, 95),
+        # Timings are rounded to 10ms, a perfectly steady app would otherwise never have a usable z-score
+        "z": round((duration - mean) / max(stdev, 0.01), 2),
+        "percentile": round(100.0 * len([s for s in samples if s <= duration]) / len(samples), 1)
+    }
+
+class SQLiteHistory(DurationHistory):
+    # Durations per ITEM_ID, browser and step index in a local SQLite file
+    def __init__(self, path=None, window=None, min_samples=None, retention_days=None):
+        self.path = path if path else TestSettings.get('History', 'path', fallback='history.db')
+        self.window = window if window else TestSettings.getint('History', 'window', fallback=100)
+        self.min_samples = min_samples if min_samples else TestSettings.getint('History', 'min_samples', fallback=10)
+        self.retention_days = retention_days if retention_days != None else TestSettings.getfloat('History', 'retention_days', fallback=30)
+        # A passing step is Slow when it is z_threshold deviations above the mean, past the p95 and at least min_delta seconds above the median
+        self.z_threshold = TestSettings.getfloat('History', 'z_threshold', fallback=3)
+        self.min_delta = TestSettings.getfloat('History', 'min_delta', fallback=0.5)
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(self.path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.executescript(SCHEMA)
+        # Recent samples per key, loaded from the file the first time a key is used
+        self.cache = {}
+        self.failures = {}
+        self.inserts = 0
+        self.prune()
+
+    def samples(self, item_id, browser, step):
+        key = (item_id, browser, step)
+        if key not in self.cache:
+            rows = self.connection.execute("SELECT duration, failed FROM durations WHERE item_id = ? AND browser = ? AND step = ? ORDER BY time DESC LIMIT ?", (item_id, browser, step, self.window)).fetchall()
+            self.cache[key] = deque(reversed([row[0] for row in rows]), maxlen=self.window)
+            if step == APP: self.failures[(item_id, browser)] = deque(reversed([row[1] for row in rows]), maxlen=self.window)
+        return self.cache[key]
+
+    def baseline(self, item_id, browser, step):
+        samples = list(self.samples(item_id, browser, step))
+        return samples if len(samples) >= self.min_samples else None
+
+    # Add the baseline comparison and the Slow status to a result
+    def annotate(self, item, baseline):
+        if baseline == None or item.get('duration') == None: return
+        comparison = compareToBaseline(item['duration'], baseline)
+        item['baseline'] = comparison
+        slow = comparison['z'] >= self.z_threshold and item['duration'] > comparison['p95'] and item['duration'] - comparison['p50'] >= self.min_delta
+        if slow and item.get('status') == "Passed": item['status'] = "Slow"
+
+    def record(self, app, results):
+        item_id, browser = str(app.get("ITEM_ID")), str(app.get("BROWSER"))
+        now = time.time()
+        rows = []
+        tests = results.get('tests', [])
+        with self.lock:
+            for index, test in enumerate(tests):
+                if test.get('status') in [None, 'Skipped'] or test.get('duration') == None: continue
+                self.annotate(test, self.baseline(item_id, browser, index))
+                self.samples(item_id, browser, index).append(test['duration'])
+                rows.append((item_id, browser, index, now, test['duration'], int(test['status'] not in ["Passed", "Slow"])))
+            if any(test.get('status') not in [None, 'Skipped'] for test in tests):
+                self.annotate(results['results'], self.baseline(item_id, browser, APP))
+                failed = results['results'].get('status') not in ["Passed", "Slow"]
+                self.samples(item_id, browser, APP).append(results['results']['duration'])
+                self.failures[(item_id, browser)].append(int(failed))
+                rows.append((item_id, browser, APP, now, results['results']['duration'], int(failed)))
+            if rows:
+                with self.connection:
+                    self.connection.executemany("INSERT INTO durations VALUES (?, ?, ?, ?, ?, ?)", rows)
+                self.inserts += 1
+                if self.inserts % 500 == 0: self.prune(locked=True)
+
+    def step_percentile(self, item_id, browser, index, p):
+        with self.lock:
+            return percentile(self.baseline(str(item_id), str(browser), index), p)
+
+    def app_percentile(self, item_id, browser, p):
+        with self.lock:
+            return percentile(self.baseline(str(item_id), str(browser), APP), p)
+
+    def failure_rate(self, item_id, browser):
+        with self.lock:
+            self.samples(str(item_id), str(browser), APP)
+            failures = self.failures.get((str(item_id), str(browser)))
+            return sum(failures) / float(len(failures)) if failures else 0.0
+
+    # Drop samples older than retention_days
+    def prune(self, locked=False):
+        if not self.retention_days: return
+        if not locked: self.lock.acquire()
+        try:
+            with self.connection:
+                self.connection.execute("DELETE FROM durations WHERE time < ?", (time.time() - self.retention_days * 86400,))
+        finally:
+            if not locked: self.lock.release()
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
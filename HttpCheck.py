@@ -0,0 +1,210 @@
+from http.client import HTTPConnection, HTTPSConnection, HTTPException
+from collections import namedtuple
+from urllib.parse import urlsplit, urljoin
+from .TestConfig import TestSettings, onReload
+from .PageProbe import sanitize_string
+from .HealthCheck import parseHealthCheck, healthCheckLimit
+import base64, gzip, platform, socket, ssl, threading, time, zlib
+
+HttpResponse = namedtuple('HttpResponse', ['status', 'reason', 'url', 'headers', 'body', 'ttfb', 'elapsed'])
+
+# Apps that only open a URL and evaluate it as a health check don't need a browser
+def httpEligible(plan):
+    enabled = [step for step in plan if step.enabled]
+    return len(enabled) == 2 and enabled[0].command == "Open" and enabled[1].command in ["Health", "HealthCheck"]
+
+# Environment reported for transactions that ran over plain HTTP
+def httpEnvironment():
+    host = socket.gethostname()
+    try:
+        ip = socket.gethostbyname(host)
+    except OSError:
+        ip = "unknown"
+    return {
+        'browser': {"name": "HTTP", "version": platform.python_version()},
+        'host': {'name': host, 'ip': ip, 'os': "{0} {1}".format(platform.system(), platform.release())}
+    }
+
+class NegotiateAuth():
+    # Kerberos or NTLM through the optional pyspnego package, for hosts in the [BrowserSettings] sitelist like the browsers
+    def __init__(self, protocol, sitelist):
+        self.protocol = protocol
+        self.scheme = "NTLM" if protocol == "ntlm" else "Negotiate"
+        self.sites = [site.strip().lstrip('*').lower() for site in sitelist.split(',') if site.strip()]
+
+    def trusted(self, host):
+        host = host.lower()
+        return any(host == site.lstrip('.') or host.endswith(site if site.startswith('.') else '.' + site) for site in self.sites)
+
+    def context(self, host):
+        import spnego
+        return spnego.client(hostname=host, service="HTTP", protocol=self.protocol)
+
+    # Token sent back by the server in WWW-Authenticate, None when the scheme isn't offered
+    def challenge(self, response):
+        for value in response.msg.get_all('WWW-Authenticate') or []:
+            parts = value.split(' ', 1)
+            if parts[0].lower() == self.scheme.lower(): return base64.b64decode(parts[1].strip()) if len(parts) > 1 and parts[1].strip() else b''
+        return None
+
+class HttpClient():
+    # Keep-alive connections per thread and host, following redirects like the browser would
+    def __init__(self, timeout=None, verify=None, max_redirects=None, auth=None):
+        self.timeout = timeout if timeout else TestSettings.getfloat('HttpCheck', 'timeout', fallback=30)
+        self.verify = verify if verify != None else TestSettings.getboolean('HttpCheck', 'verify', fallback=False)
+        self.max_redirects = max_redirects if max_redirects != None else TestSettings.getint('HttpCheck', 'max_redirects', fallback=10)
+        protocol = auth if auth != None else TestSettings.get('HttpCheck', 'auth', fallback='negotiate')
+        self.auth = NegotiateAuth(protocol, TestSettings.get('BrowserSettings', 'sitelist', fallback='')) if protocol in ["negotiate", "kerberos", "ntlm"] else None
+        self.context = ssl.create_default_context() if self.verify else ssl._create_unverified_context()
+        self.local = threading.local()
+
+    def connection(self, scheme, host, port):
+        connections = getattr(self.local, 'connections', None)
+        if connections == None: connections = self.local.connections = {}
+        key = (scheme, host, port)
+        if key not in connections:
+            if scheme == "https": connections[key] = HTTPSConnection(host, port, timeout=self.timeout, context=self.context)
+            else: connections[key] = HTTPConnection(host, port, timeout=self.timeout)
+        return connections[key]
+
+    def discard(self, scheme, host, port):
+        connection = self.local.connections.pop((scheme, host, port), None)
+        if connection != None: connection.close()
+
+    def send(self, scheme, host, port, path, headers):
+        for attempt in range(2):
+            connection = self.connection(scheme, host, port)
+            try:
+                connection.request("GET", path, headers=headers)
+                response = connection.getresponse()
+                ttfb = time.time()
+                body = response.read()
+                return response, body, ttfb
+            except (HTTPException, OSError) as e:
+                self.discard(scheme, host, port)
+                # A kept-alive connection closed by the server is worth one retry, a timeout isn't
+                if attempt == 1 or isinstance(e, socket.timeout): raise
+
+    # Answer a Negotiate or NTLM challenge on the same connection
+    def authenticate(self, scheme, host, port, path, headers, response, body, ttfb):
+        if self.auth == None or not self.auth.trusted(host) or self.auth.challenge(response) == None: return response, body, ttfb
+        try:
+            context = self.auth.context(host)
+        except ImportError:
+            return response, body, ttfb
+        token = None
+        for leg in range(3):
+            headers = dict(headers, Authorization="{0} {1}".format(self.auth.scheme, base64.b64encode(context.step(token)).decode()))
+            response, body, ttfb = self.send(scheme, host, port, path, headers)
+            token = self.auth.challenge(response) if response.status == 401 else None
+            if not token: break
+        return response, body, ttfb
+
+    def get(self, url):
+        start = time.time()
+        headers = {
+            "User-Agent": "splunk_web_transactions_generator",
+            "Accept": "application/json, text/html;q=0.9, */*;q=0.8",
+            "Accept-Encoding": "gzip, deflate"
+        }
+        for redirect in range(self.max_redirects + 1):
+            parts = urlsplit(url)
+            scheme = parts.scheme or "http"
+            port = parts.port or (443 if scheme == "https" else 80)
+            path = (parts.path or "/") + ("?" + parts.query if parts.query else "")
+            response, body, ttfb = self.send(scheme, parts.hostname, port, path, headers)
+            if response.status == 401: response, body, ttfb = self.authenticate(scheme, parts.hostname, port, path, headers, response, body, ttfb)
+            location = response.getheader('Location')
+            if response.status in [301, 302, 303, 307, 308] and location:
+                url = urljoin(url, location)
+                continue
+            break
+        encoding = (response.getheader('Content-Encoding') or '').lower()
+        if encoding == "gzip": body = gzip.decompress(body)
+        elif encoding == "deflate": body = zlib.decompress(body)
+        return HttpResponse(response.status, response.reason, url, response.msg, body, ttfb - start, time.time() - start)
+
+class HttpCheck():
+    # Runs an Open plus health check plan with one HTTP request, recording the same results as the browser
+    def __init__(self, client=None):
+        self.client = client if client else HttpClient()
+        self.workers = TestSettings.getint('HttpCheck', 'workers', fallback=20)
+        # Run the full browser test when the HTTP check doesn't pass, so failures still get screenshots and logs
+        self.fallback = TestSettings.getboolean('HttpCheck', 'fallback', fallback=True)
+
+    def failed(self, test, info, error, status="Failed"):
+        test.TestFinish()
+        info['status'] = status
+        info['error'] = error
+        test.TestResults(info)
+        return False
+
+    # The response of the Open step, None when the step failed
+    def open(self, test, info):
+        test.TestStart()
+        try:
+            response = self.client.get(info["url"])
+        except socket.timeout:
+            return self.failed(test, info, 'Timeout: Page did not load within {0} seconds'.format(int(self.client.timeout))) or None
+        except (HTTPException, OSError, ValueError, EOFError, zlib.error) as e:
+            # zlib.error and EOFError come from a compressed body that doesn't decompress
+            return self.failed(test, info, sanitize_string(str(e)) or type(e).__name__) or None
+        test.TestFinish()
+        info['url_loaded'] = response.url
+        info['http_status'] = response.status
+        info['timing'] = {'ttfb': int(response.ttfb * 1000), 'load': int(response.elapsed * 1000)}
+        if response.status in [401, 403]:
+            info['status'] = "Warning"
+            info['error'] = "HTTP {0} {1}".format(response.status, response.reason)
+        elif response.status >= 400:
+            info['status'] = "Failed"
+            info['error'] = "HTTP {0} {1}".format(response.status, response.reason)
+        else:
+            info['status'] = "Passed"
+        test.TestResults(info)
+        return response if info['status'] in ["Passed", "Warning"] else None
+
+    def health(self, test, info, response, check):
+        test.TestStart()
+        healthcheck = parseHealthCheck(response.body)
+        if not isinstance(healthcheck, dict):
+            return self.failed(test, info, "The health check did not return a valid JSON object")
+        # A failure reruns in the browser, which collects the failing paths itself
+        result = check.evaluate(healthcheck, collect=not self.fallback, limit=healthCheckLimit())
+        if result.healthy:
+            test.TestFinish()
+            info['status'] = "Passed"
+            test.TestResults(info)
+            return True
+        info['failures'] = result.failures
+        return self.failed(test, info, result.error)
+
+    # Fill in test for the plan, True when every step passed
+    def run(self, plan, test):
+        response = None
+        for step in plan:
+            if not step.enabled:
+                test.TestSkipped()
+            elif step.command == "Open":
+                response = self.open(test, dict(step.info))
+                if response == None: return False
+            elif not self.health(test, dict(step.info), response, step.check):
+                return False
+        return test.results['results'].get('status') == "Passed"
+
+_checker = None
+_checker_lock = threading.Lock()
+
+# The checker configured in [HttpCheck], None when every app runs in a browser
+def httpChecker():
+    global _checker
+    with _checker_lock:
+        if _checker == None:
+            _checker = HttpCheck() if TestSettings.getboolean('HttpCheck', 'enabled', fallback=False) else False
+        return _checker or None
+
+@onReload
+def _resetHttpChecker():
+    global _checker
+    with _checker_lock:
+        _checker = None
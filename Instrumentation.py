@@ -0,0 +1,213 @@
+from .TestConfig import TestSettings, onReload
+import json, os, re, threading, time
+
+# Counters for one command name: [count, seconds, errors]
+def addCommand(totals, name, duration, error):
+    counter = totals.get(name)
+    if counter == None: counter = totals[name] = [0, 0.0, 0]
+    counter[0] += 1
+    counter[1] += duration
+    if error != None: counter[2] += 1
+
+def summarize(totals):
+    return {
+        "round_trips": sum(counter[0] for counter in totals.values()),
+        "time": round(sum(counter[1] for counter in totals.values()), 3),
+        "commands": dict((name, {"count": counter[0], "time": round(counter[1], 3), "errors": counter[2]}) for name, counter in sorted(totals.items()))
+    }
+
+# The W3C endpoint without element ids or attribute names, e.g. "GET /element/text"
+def commandName(method, path):
+    path = re.sub(r'/(attribute|property|css)/.*$', r'/\1', re.sub(r'/element/[^/]+', '/element', path))
+    return "{0} {1}".format(method, path)
+
+class CommandRecorder():
+    # Counts and times the WebDriver commands of one session, per step and per app
+    # Commands outside an app, like launching the session or resetting it between apps, are reported with the next app
+    def __init__(self, detail=None):
+        self.detail = detail if detail else TestSettings.get('Instrumentation', 'span_detail', fallback='step')
+        self.outside = {}
+        self.app = None
+        self.step = None
+        self.app_start = None
+        self.step_start = None
+        self.step_commands = []
+        self.spans = []
+
+    def record(self, name, start, end, error=None):
+        duration = end - start
+        if self.step != None:
+            addCommand(self.step, name, duration, error)
+            if self.detail == "command": self.step_commands.append((name, start, end, error))
+        if self.app != None: addCommand(self.app, name, duration, error)
+        else: addCommand(self.outside, name, duration, error)
+
+    def start_app(self):
+        self.app = {}
+        self.app_start = time.time()
+        self.spans = []
+
+    def start_step(self, step):
+        self.step = {}
+        self.step_start = time.time()
+        self.step_commands = []
+
+    # Summary of the step, kept for the span export
+    def finish_step(self, step, info=None):
+        if self.step == None: return None
+        summary = summarize(self.step)
+        self.spans.append((step, self.step_start, time.time(), info, summary, self.step_commands))
+        self.step = None
+        self.step_commands = []
+        return summary
+
+    # Adds the app totals to the results and exports its spans, the session's commands before the app are reported separately
+    def finish_app(self, app, results):
+        if self.app == None: return
+        self.step = None
+        summary = summarize(self.app)
+        if self.outside: summary['session'] = summarize(self.outside)
+        results['results']['webdriver'] = summary
+        exporter = spanExporter()
+        if exporter != None: exporter.export(exporter.transaction(app, results, self.app_start, time.time(), self.spans))
+        self.outside = {}
+        self.app = None
+        self.spans = []
+
+def wrapExecute(recorder, execute):
+    def timed(command, params=None):
+        start = time.time()
+        error = None
+        try:
+            return execute(command, params)
+        except Exception as e:
+            error = type(e).__name__
+            raise
+        finally:
+            recorder.record(command, start, time.time(), error)
+    return timed
+
+def wrapCommand(recorder, command):
+    async def timed(method, path, payload=None):
+        start = time.time()
+        error = None
+        try:
+            return await command(method, path, payload)
+        except Exception as e:
+            error = type(e).__name__
+            raise
+        finally:
+            recorder.record(commandName(method, path), start, time.time(), error)
+    return timed
+
+def enabled():
+    return TestSettings.getboolean('Instrumentation', 'enabled', fallback=False)
+
+# Route every command of a Selenium driver through a recorder, None when instrumentation is off
+# Selenium sends every command, element commands included, through driver.execute
+def instrument(driver):
+    if not enabled(): return None
+    recorder = getattr(driver, 'recorder', None)
+    if recorder == None:
+        recorder = CommandRecorder()
+        driver.execute = wrapExecute(recorder, driver.execute)
+        driver.recorder = recorder
+    return recorder
+
+# Same for an AsyncSession, whose commands all go through session.command
+def instrumentSession(session):
+    if not enabled(): return None
+    recorder = getattr(session, 'recorder', None)
+    if recorder == None:
+        recorder = CommandRecorder()
+        session.command = wrapCommand(recorder, session.command)
+        session.recorder = recorder
+    return recorder
+
+def attributes(values):
+    converted = []
+    for key, value in values.items():
+        if value == None: continue
+        if isinstance(value, bool): typed = {"boolValue": value}
+        elif isinstance(value, int): typed = {"intValue": value}
+        elif isinstance(value, float): typed = {"doubleValue": value}
+        else: typed = {"stringValue": str(value)}
+        converted.append({"key": key, "value": typed})
+    return converted
+
+class SpanExporter():
+    # Writes each transaction as one line of OTLP JSON, e.g. for the OpenTelemetry Collector's otlpjsonfile receiver
+    def __init__(self, path=None, service_name=None):
+        self.path = path if path else TestSettings.get('Instrumentation', 'spans_path', fallback='')
+        if not self.path: raise ValueError("Span exporter needs a path")
+        self.service_name = service_name if service_name else TestSettings.get('Instrumentation', 'service_name', fallback='splunk_web_transactions_generator')
+        self.detail = TestSettings.get('Instrumentation', 'span_detail', fallback='step')
+        self.lock = threading.Lock()
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+
+    def span(self, trace_id, parent_id, name, start, end, values, error=False):
+        span = {
+            "traceId": trace_id,
+            "spanId": os.urandom(8).hex(),
+            "name": name,
+            "kind": 1,
+            "startTimeUnixNano": str(int(start * 1e9)),
+            "endTimeUnixNano": str(int(end * 1e9)),
+            "attributes": attributes(values),
+            "status": {"code": 2 if error else 1}
+        }
+        if parent_id: span["parentSpanId"] = parent_id
+        return span
+
+    # App span with a child per step, and per command when span_detail is command
+    def transaction(self, app, results, start, end, steps):
+        trace_id = os.urandom(16).hex()
+        status = results['results'].get('status')
+        root = self.span(trace_id, None, "transaction {0}".format(app.get('ITEM_NAME', app.get('ITEM_ID'))), start, end, {
+            "app.item_id": app.get('ITEM_ID'),
+            "app.url": app.get('URL'),
+            "browser": app.get('BROWSER'),
+            "status": status,
+            "webdriver.round_trips": results['results'].get('webdriver', {}).get('round_trips')
+        }, status not in ["Passed", "Warning", "Slow"])
+        spans = [root]
+        for step, step_start, step_end, info, summary, commands in steps if self.detail != "app" else []:
+            step_status = info.get('status') if info else None
+            parent = self.span(trace_id, root["spanId"], step.command, step_start, step_end, {
+                "step.index": step.index,
+                "step.description": step.info.get('description'),
+                "status": step_status,
+                "webdriver.round_trips": summary['round_trips'],
+                "webdriver.time": summary['time']
+            }, step_status not in [None, "Passed", "Warning", "Slow"])
+            spans.append(parent)
+            for name, command_start, command_end, error in commands:
+                spans.append(self.span(trace_id, parent["spanId"], name, command_start, command_end, {"error.type": error}, error != None))
+        return {"resourceSpans": [{
+            "resource": {"attributes": attributes({"service.name": self.service_name})},
+            "scopeSpans": [{"scope": {"name": "splunk_web_transactions_generator"}, "spans": spans}]
+        }]}
+
+    def export(self, transaction):
+        line = json.dumps(transaction, separators=(',', ':'))
+        with self.lock:
+            with open(self.path, 'a') as f:
+                f.write(line + "\n")
+
+_exporter = None
+_exporter_lock = threading.Lock()
+
+# The exporter configured in [Instrumentation], None when spans aren't written
+def spanExporter():
+    global _exporter
+    with _exporter_lock:
+        if _exporter == None:
+            _exporter = SpanExporter() if TestSettings.get('Instrumentation', 'spans_path', fallback='') else False
+        return _exporter or None
+
+@onReload
+def _resetSpanExporter():
+    global _exporter
+    with _exporter_lock:
+        _exporter = None
@@ -0,0 +1,214 @@
+from http.client import HTTPConnection, HTTPSConnection, HTTPException
+from collections import namedtuple
+from urllib.parse import urlsplit, urlencode, quote
+from .TestConfig import TestSettings
+import hashlib, json, os, ssl, threading
+
+# Keys of the records that were added, changed or removed by a sync
+KVStoreChanges = namedtuple('KVStoreChanges', ['added', 'changed', 'removed', 'unchanged'])
+
+# Hash of a record's definition, Splunk's own fields like _user don't count
+def recordHash(record):
+    definition = dict((k, v) for k, v in record.items() if k not in ["_user"])
+    return hashlib.sha1(json.dumps(definition, sort_keys=True).encode('utf-8')).hexdigest()
+
+# The app dict TestGenerator expects, TESTS is often stored as a JSON string
+def recordToApp(record):
+    app = dict(record)
+    if isinstance(app.get('TESTS'), str):
+        try:
+            app['TESTS'] = json.loads(app['TESTS'])
+        except ValueError:
+            pass
+    if app.get('ITEM_ID') in [None, '']: app['ITEM_ID'] = record.get('_key')
+    return app
+
+class KVStoreLoader():
+    # Pages through a KVStore collection over the Splunk REST API and keeps the records in a local cache file
+    # Each page is requested with the ETag it had last time, and a changed_field like a modified time turns a sync into a delta query
+    def __init__(self, url=None, app=None, collection=None, token=None, owner=None, page_size=None, cache_path=None, verify=None, changed_field=None, timeout=None):
+        self.url = url if url else TestSettings.get('KVStore', 'url', fallback='https://localhost:8089')
+        self.app = app if app else TestSettings.get('KVStore', 'app', fallback='search')
+        self.collection = collection if collection else TestSettings.get('KVStore', 'collection', fallback='')
+        if not self.collection: raise ValueError("KVStore loader needs a collection")
+        self.owner = owner if owner else TestSettings.get('KVStore', 'owner', fallback='nobody')
+        # A session key from a scripted input is sent as "Splunk <key>", an authentication token as "Bearer <token>"
+        self.token = token if token else TestSettings.get('KVStore', 'token', fallback='')
+        self.token_type = TestSettings.get('KVStore', 'token_type', fallback='Bearer')
+        self.page_size = page_size if page_size else TestSettings.getint('KVStore', 'page_size', fallback=500)
+        self.cache_path = cache_path if cache_path != None else TestSettings.get('KVStore', 'cache_path', fallback='')
+        self.verify = verify if verify != None else TestSettings.getboolean('KVStore', 'verify', fallback=False)
+        self.changed_field = changed_field if changed_field != None else TestSettings.get('KVStore', 'changed_field', fallback='')
+        self.timeout = timeout if timeout else TestSettings.getfloat('KVStore', 'timeout', fallback=30)
+        parts = urlsplit(self.url)
+        self.scheme = parts.scheme or "https"
+        self.host = parts.hostname
+        self.port = parts.port or (443 if self.scheme == "https" else 80)
+        self.path = "{0}/servicesNS/{1}/{2}/storage/collections/data/{3}".format(parts.path.rstrip('/'), quote(self.owner), quote(self.app), quote(self.collection))
+        self.context = ssl.create_default_context() if self.verify else ssl._create_unverified_context()
+        self.connection = None
+        self.lock = threading.Lock()
+        self.records = {}
+        self.hashes = {}
+        self.etags = {}
+        self.high_water = None
+        self.counters = {'requests': 0, 'not_modified': 0, 'records_fetched': 0}
+        self.load_cache()
+
+    def connect(self):
+        if self.connection == None:
+            if self.scheme == "https": self.connection = HTTPSConnection(self.host, self.port, timeout=self.timeout, context=self.context)
+            else: self.connection = HTTPConnection(self.host, self.port, timeout=self.timeout)
+        return self.connection
+
+    # Returns (status, ETag, records), records is None for 304 Not Modified
+    def request(self, params, etag=None):
+        headers = {"Accept": "application/json"}
+        if self.token: headers["Authorization"] = "{0} {1}".format(self.token_type, self.token)
+        if etag: headers["If-None-Match"] = etag
+        path = "{0}?{1}".format(self.path, urlencode(params))
+        for attempt in range(2):
+            connection = self.connect()
+            try:
+                connection.request("GET", path, headers=headers)
+                response = connection.getresponse()
+                data = response.read()
+                break
+            except (HTTPException, OSError) as e:
+                connection.close()
+                self.connection = None
+                # Only a kept-alive connection closed by splunkd is worth retrying
+                if attempt == 1 or isinstance(e, TimeoutError): raise
+        self.counters['requests'] += 1
+        if response.status == 304:
+            self.counters['not_modified'] += 1
+            return 304, etag, None
+        if response.status >= 400: raise HTTPException("{0} returned {1}".format(self.path, response.status))
+        records = json.loads(data)
+        self.counters['records_fetched'] += len(records)
+        return response.status, response.getheader('ETag'), records
+
+    # Every record, one page at a time in _key order, pages that answer 304 come from the cache
+    def fetch_all(self):
+        records = {}
+        etags = {}
+        skip = 0
+        while True:
+            etag = self.etags.get(str(skip))
+            status, etag, page = self.request({"output_mode": "json", "sort": "_key", "limit": self.page_size, "skip": skip}, etag)
+            if page == None: page = self.cached_page(skip)
+            if etag: etags[str(skip)] = etag
+            for record in page:
+                records[record['_key']] = record
+            if len(page) < self.page_size: break
+            skip += self.page_size
+        self.etags = etags
+        return records
+
+    # The records a page held last time, in the same _key order
+    def cached_page(self, skip):
+        keys = sorted(self.records)[skip:skip + self.page_size]
+        return [self.records[key] for key in keys]
+
+    # Records changed since the last sync through the changed field, plus a _key listing to notice deletes
+    def fetch_delta(self):
+        params = {"output_mode": "json", "sort": "_key", "limit": self.page_size}
+        records = dict(self.records)
+        if self.high_water != None: params["query"] = json.dumps({self.changed_field: {"$gt": self.high_water}})
+        skip = 0
+        while True:
+            _, _, page = self.request(dict(params, skip=skip))
+            for record in page:
+                records[record['_key']] = record
+            if len(page) < self.page_size: break
+            skip += self.page_size
+        keys = set()
+        skip = 0
+        while True:
+            _, _, page = self.request({"output_mode": "json", "sort": "_key", "fields": "_key", "limit": self.page_size * 10, "skip": skip})
+            keys.update(record['_key'] for record in page)
+            if len(page) < self.page_size * 10: break
+            skip += self.page_size * 10
+        return dict((key, record) for key, record in records.items() if key in keys)
+
+    # Fetch the collection and return what changed since the last sync or the cache file
+    def sync(self):
+        with self.lock:
+            records = self.fetch_delta() if self.changed_field else self.fetch_all()
+            hashes = dict((key, recordHash(record)) for key, record in records.items())
+            added = [key for key in hashes if key not in self.hashes]
+            changed = [key for key in hashes if key in self.hashes and hashes[key] != self.hashes[key]]
+            removed = [key for key in self.hashes if key not in hashes]
+            self.records = records
+            self.hashes = hashes
+            if self.changed_field:
+                values = [record.get(self.changed_field) for record in records.values() if record.get(self.changed_field) != None]
+                if values: self.high_water = max(values)
+            self.save_cache()
+            return KVStoreChanges(sorted(added), sorted(changed), sorted(removed), len(hashes) - len(added) - len(changed))
+
+    def apps(self):
+        with self.lock:
+            return [recordToApp(self.records[key]) for key in sorted(self.records)]
+
+    def load_cache(self):
+        if not self.cache_path or not os.path.exists(self.cache_path): return
+        try:
+            with open(self.cache_path) as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            return
+        # A cache written for another collection or page size can't be reused
+        if cache.get('source') != self.source(): return
+        self.records = cache.get('records', {})
+        self.etags = cache.get('etags', {})
+        self.high_water = cache.get('high_water')
+        self.hashes = dict((key, recordHash(record)) for key, record in self.records.items())
+
+    def save_cache(self):
+        if not self.cache_path: return
+        cache = {'source': self.source(), 'records': self.records, 'etags': self.etags, 'high_water': self.high_water}
+        temp_path = "{0}.tmp".format(self.cache_path)
+        with open(temp_path, 'w') as f:
+            json.dump(cache, f)
+        os.replace(temp_path, self.cache_path)
+
+    def source(self):
+        return "{0}{1}?limit={2}&changed={3}".format(self.url, self.path, self.page_size, self.changed_field)
+
+    def close(self):
+        if self.connection != None: self.connection.close()
+        self.connection = None
+
+class GeneratorCache():
+    # TestGenerator functions per record, rebuilt only for records whose definition changed
+    def __init__(self, loader, screenshot_always=False):
+        self.loader = loader
+        self.screenshot_always = screenshot_always
+        self.generators = {}
+        self.apps = {}
+
+    def update(self):
+        from .TestBuilder import TestGenerator
+        changes = self.loader.sync()
+        apps = dict((app['_key'], app) for app in self.loader.apps() if '_key' in app)
+        for key in changes.added + changes.changed:
+            self.apps[key] = apps[key]
+            self.generators[key] = TestGenerator(apps[key], self.screenshot_always)
+        for key in changes.removed:
+            self.apps.pop(key, None)
+            self.generators.pop(key, None)
+        # Records loaded from the cache file before the first sync still need their generator
+        for key in apps:
+            if key not in self.generators:
+                self.apps[key] = apps[key]
+                self.generators[key] = TestGenerator(apps[key], self.screenshot_always)
+        return changes
+
+    # Add a test method per app to a TestSuite class and remove the ones for deleted records
+    def attach(self, suite):
+        for name in [name for name in vars(suite) if name.startswith('test_kv_')]:
+            if name[len('test_kv_'):] not in self.generators: delattr(suite, name)
+        for key, generator in self.generators.items():
+            setattr(suite, 'test_kv_{0}'.format(key), generator)
+        return suite
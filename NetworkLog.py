@@ -0,0 +1,68 @@
+from .TestConfig import TestSettings
+from collections import deque
+import json
+
+class NetworkLogCollector():
+    # Keeps the Chrome performance log Network events of the current step in a bounded buffer
+    def __init__(self, driver, max_events=None):
+        self.driver = driver
+        self.max_events = max_events if max_events else TestSettings.getint('NetworkLog', 'max_events', fallback=1000)
+        self.events = deque(maxlen=self.max_events)
+        self.dropped = 0
+
+    # Chrome returns and clears the whole buffer on each get_log call, so one call discards earlier entries
+    def start_step(self):
+        self.driver.get_log('performance')
+        self.clear()
+
+    def clear(self):
+        self.events = deque(maxlen=self.max_events)
+        self.dropped = 0
+
+    def collect(self):
+        return self.add(self.driver.get_log('performance'))
+
+    # Keep the Network events of performance log entries, the async engine reads the log itself and passes them here
+    def add(self, entries):
+        for entry in entries:
+            try:
+                message = json.loads(entry['message'])['message']
+            except (KeyError, TypeError, ValueError):
+                continue
+            if message.get('method', '').startswith('Network'):
+                if len(self.events) == self.max_events: self.dropped += 1
+                self.events.append(message)
+        return list(self.events)
+
+    # Request counts, bytes and timing of the current step
+    def summary(self):
+        requests = {}
+        for event in self.events:
+            params = event.get('params', {})
+            request = requests.setdefault(params.get('requestId'), {})
+            method = event.get('method')
+            if method == 'Network.requestWillBeSent':
+                request['url'] = params.get('request', {}).get('url')
+                request['start'] = params.get('timestamp')
+            elif method == 'Network.responseReceived':
+                request['status'] = params.get('response', {}).get('status')
+            elif method == 'Network.loadingFinished':
+                request['end'] = params.get('timestamp')
+                request['bytes'] = params.get('encodedDataLength', 0)
+            elif method == 'Network.loadingFailed':
+                request['end'] = params.get('timestamp')
+                request['failed'] = params.get('errorText', 'failed')
+        sent = [r for r in requests.values() if 'start' in r]
+        timed = [r for r in sent if 'end' in r]
+        summary = {
+            'requests': len(sent),
+            'failed': len([r for r in sent if 'failed' in r or (r.get('status') or 0) >= 400]),
+            'bytes': int(sum(r.get('bytes', 0) for r in sent)),
+            'events': len(self.events),
+            'dropped': self.dropped
+        }
+        if timed:
+            summary['duration'] = round(max(r['end'] for r in timed) - min(r['start'] for r in timed), 3)
+            slowest = max(timed, key=lambda r: r['end'] - r['start'])
+            summary['slowest'] = {'url': slowest.get('url'), 'duration': round(slowest['end'] - slowest['start'], 3)}
+        return summary
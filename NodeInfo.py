@@ -0,0 +1,111 @@
+from http.client import HTTPConnection, HTTPSConnection, HTTPException
+from functools import lru_cache
+from urllib.parse import urlsplit
+from .TestConfig import TestSettings, onReload
+from .Resolver import resolver
+import json, threading
+
+# Parsing a UA string runs a large regex table, every session on a node reports the same one
+# The returned dict is shared, don't modify it
+@lru_cache(maxsize=256)
+def parseUserAgent(ua_string):
+    from ua_parser import user_agent_parser
+    return user_agent_parser.Parse(ua_string)
+
+class NodeInfoService():
+    # Finds the grid node running a session, using the Grid 3 API or the Grid 4 GraphQL and /status endpoints
+    def __init__(self, protocol=None, host=None, port=None, timeout=None, api=None):
+        self.protocol = protocol if protocol else TestSettings.get('SeleniumHub', 'protocol', fallback='http')
+        self.host = host if host else TestSettings.get('SeleniumHub', 'host', fallback='localhost')
+        self.port = int(port if port else TestSettings.get('SeleniumHub', 'port', fallback='4444'))
+        self.timeout = timeout if timeout else TestSettings.getfloat('SeleniumHub', 'api_timeout', fallback=5)
+        # auto tries each API in turn and sticks to the first one that answers
+        self.api = api if api else TestSettings.get('SeleniumHub', 'api', fallback='auto')
+        self.local = threading.local()
+        self.nodes = {}
+        self.lock = threading.Lock()
+
+    # http.client connections aren't thread safe, so each thread keeps its own keep-alive connection
+    def connection(self):
+        if getattr(self.local, 'connection', None) == None:
+            connection_class = HTTPSConnection if self.protocol == "https" else HTTPConnection
+            self.local.connection = connection_class(self.host, self.port, timeout=self.timeout)
+        return self.local.connection
+
+    def request(self, method, path, payload=None):
+        body = json.dumps(payload) if payload != None else None
+        headers = {"Content-Type": "application/json"} if payload != None else {}
+        for attempt in range(2):
+            connection = self.connection()
+            try:
+                connection.request(method, path, body, headers)
+                response = connection.getresponse()
+                data = response.read()
+                break
+            except (HTTPException, OSError) as e:
+                connection.close()
+                self.local.connection = None
+                # Only a kept-alive connection closed by the hub is worth retrying
+                if attempt == 1 or isinstance(e, TimeoutError): raise
+        if response.status >= 400: raise HTTPException("{0} returned {1}".format(path, response.status))
+        return json.loads(data)
+
+    def legacy_node(self, session_id):
+        node = self.request("GET", "/grid/api/testsession?session={0}".format(session_id))
+        return node.get('proxyId')
+
+    def graphql_node(self, session_id):
+        query = '{ session (id: "%s") { nodeUri } }' % session_id
+        session = self.request("POST", "/graphql", {"query": query}).get('data', {}).get('session')
+        return session.get('nodeUri') if session else None
+
+    def status_node(self, session_id):
+        for node in self.request("GET", "/status").get('value', {}).get('nodes', []):
+            for slot in node.get('slots', []):
+                if (slot.get('session') or {}).get('sessionId') == session_id: return node.get('uri')
+        return None
+
+    def node_uri(self, session_id):
+        apis = {'legacy': self.legacy_node, 'graphql': self.graphql_node, 'status': self.status_node}
+        for api in ([self.api] if self.api in apis else list(apis)):
+            try:
+                uri = apis[api](session_id)
+            except (OSError, HTTPException, ValueError, AttributeError):
+                continue
+            if uri:
+                self.api = api
+                return uri
+        return None
+
+    # Returns (ip, host name) of the node running a session
+    def node(self, session_id):
+        try:
+            uri = self.node_uri(session_id)
+        except Exception:
+            uri = None
+        if not uri: return "unknown", "unknown"
+        with self.lock:
+            if uri in self.nodes: return self.nodes[uri]
+        address = urlsplit(uri).hostname
+        ip, host = resolver().result(resolver().lookup(address), (None, None))
+        node = (ip or address, host or ip or address)
+        if ip:
+            with self.lock:
+                self.nodes[uri] = node
+        return node
+
+_nodes = None
+_nodes_lock = threading.Lock()
+
+# Shared by every session in the process, created on first use
+def nodes():
+    global _nodes
+    with _nodes_lock:
+        if _nodes == None: _nodes = NodeInfoService()
+        return _nodes
+
+@onReload
+def _resetNodes():
+    global _nodes
+    with _nodes_lock:
+        _nodes = None
@@ -0,0 +1,179 @@
+from collections import namedtuple
+from .PageProbe import sanitize_string
+from .TestConfig import TestSettings, onReload
+import json, re, threading
+
+# A rule matches when every condition does, conditions are (field, test) where test is a compiled regex,
+# None for a field that is present, or a function of the field's value
+# error names the field returned as the error, message formats it, e.g. "Maintenance: {0}"
+PageRule = namedtuple('PageRule', ['name', 'conditions', 'status', 'error', 'message'])
+
+STATUSES = ["Passed", "Warning", "Failed", "Debug"]
+
+# The page text the Open step falls back to when the page has no title, JSON for a health check
+def pageText(snapshot):
+    body = snapshot.get('body')
+    text = sanitize_string(body) if body != None else "failed to get page text"
+    try:
+        text = json.loads(text)
+    except ValueError:
+        pass
+    if hasattr(text, '__len__') and len(text) == 0: text = "Blank Page Loaded"
+    return text
+
+# Values the rules look at, taken from a PageProbe snapshot
+FIELDS = {
+    # Set by the Open step when a login prompt was dismissed, a page without a title or source wasn't authorized either
+    'access_error': lambda snapshot: snapshot.get('access_error') or ("Not authorized" if not snapshot.get('title') and snapshot.get('blank_source') else None),
+    'title': lambda snapshot: snapshot.get('title') or False,
+    'url': lambda snapshot: snapshot.get('url') or '',
+    'heading': lambda snapshot: snapshot.get('heading'),
+    'toast': lambda snapshot: sanitize_string(snapshot['toast']) if snapshot.get('toast') else None,
+    'neterror': lambda snapshot: sanitize_string(snapshot['neterror']) if snapshot.get('neterror') else None,
+    'body': lambda snapshot: sanitize_string(snapshot['body']) if snapshot.get('body') else None,
+    # Only for pages without a title
+    'page': lambda snapshot: None if snapshot.get('title') else pageText(snapshot)
+}
+
+UNAUTHORIZED = re.compile(r'(?:\D|^)40[1,3](?:\D|$)|unauthorized|denied', re.I)
+OUTAGE_URL = re.compile(r'apology|outage')
+TITLE_ERROR = re.compile(r'(?:\D|^)[45]\d{2}(?:\D|$)|problem|failed|service\sunavailable|not\savailable|error|denied')
+
+# Checked in order, the first rule that matches decides, a page no rule matches passed
+RULES = [
+    PageRule('access_error', (('access_error', None),), 'Warning', 'access_error', None),
+    PageRule('toast_unauthorized', (('toast', UNAUTHORIZED),), 'Warning', 'toast', None),
+    PageRule('toast', (('toast', None),), 'Failed', 'toast', None),
+    PageRule('planned_outage', (('url', OUTAGE_URL), ('heading', re.compile(r'^Planned'))), 'Warning', 'heading', None),
+    PageRule('outage', (('url', OUTAGE_URL),), 'Failed', 'title', None),
+    PageRule('title_unauthorized', (('title', TITLE_ERROR), ('title', re.compile(r'40[13]\D|denied'))), 'Warning', 'title', None),
+    PageRule('title_error', (('title', TITLE_ERROR),), 'Failed', 'title', None),
+    PageRule('neterror', (('neterror', None),), 'Failed', 'neterror', None),
+    # Valid JSON is a health check, a large page likely loaded before the title was caught
+    PageRule('health_check', (('page', lambda value: isinstance(value, dict)),), 'Passed', None, None),
+    PageRule('large_page', (('page', lambda value: hasattr(value, '__len__') and len(value) >= 1000),), 'Passed', None, None),
+    PageRule('unknown_page', (('page', lambda value: not isinstance(value, str)),), 'Debug', 'page', 'An unknown error occured: {0}'),
+    PageRule('page_unauthorized', (('page', UNAUTHORIZED),), 'Warning', 'page', None),
+    PageRule('page_error', (('page', re.compile(r'(?:\D|^)[45]\d{2}(?:\D|$)|error|^blank', re.I)),), 'Failed', 'page', None)
+]
+
+# A rule from the rules file:
+# {"name": "maintenance", "when": {"title": "maintenance"}, "status": "Warning", "error": "title", "message": "Maintenance: {0}", "ignore_case": true, "before": "toast"}
+def compileRule(definition):
+    if not isinstance(definition, dict): raise ValueError("Page rule {0!r} is not an object".format(definition))
+    name = definition.get('name', 'custom')
+    status = definition.get('status', 'Failed')
+    if status not in STATUSES: raise ValueError("Page rule {0}: unknown status {1}".format(name, status))
+    conditions = []
+    for field, pattern in (definition.get('when') or {}).items():
+        if field not in FIELDS: raise ValueError("Page rule {0}: unknown field {1}".format(name, field))
+        try:
+            conditions.append((field, re.compile(pattern, re.I if definition.get('ignore_case') else 0) if pattern else None))
+        except re.error as e:
+            raise ValueError("Page rule {0}: {1}".format(name, e))
+    if not conditions: raise ValueError("Page rule {0} has no conditions".format(name))
+    error = definition.get('error')
+    if error != None and error not in FIELDS: raise ValueError("Page rule {0}: unknown field {1}".format(name, error))
+    return PageRule(name, tuple(conditions), status, error, definition.get('message'))
+
+# Rule definitions from a JSON file, none without a path
+def loadRules(path):
+    if not path: return []
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        raise ValueError("Unable to load page rules from {0}: {1}".format(path, e))
+
+class PageClassifier():
+    # Classifies a page snapshot the way the Open step does, returns the status and error, error is None when the page passed
+    # Rules from [PageClassifier] rules_path are checked before the built in ones unless they name a rule to go before
+    # The rules file is read and its patterns compiled when the classifier is created, so a bad rules file fails here
+    def __init__(self, rules=None, disabled=None):
+        disabled = disabled if disabled != None else [name.strip() for name in TestSettings.get('PageClassifier', 'disabled', fallback='').split(',') if name.strip()]
+        self.rules = [rule for rule in RULES if rule.name not in disabled]
+        if rules == None: rules = loadRules(TestSettings.get('PageClassifier', 'rules_path', fallback=''))
+        if not isinstance(rules, list): raise ValueError("Page rules must be a list of rules")
+        for definition in reversed(rules):
+            rule = compileRule(definition)
+            names = [existing.name for existing in self.rules]
+            index = names.index(definition['before']) if definition.get('before') in names else 0
+            self.rules.insert(index, rule)
+
+    # The first rule that matches and the fields extracted on the way, rule is None when the page passed
+    # Each field is taken from the snapshot once, when a rule first looks at it
+    # A field that is missing, empty or False never matches, a regex has to find something in a string value
+    def match(self, snapshot):
+        fields = {}
+        for rule in self.rules:
+            for field, test in rule.conditions:
+                if field in fields: value = fields[field]
+                else: value = fields[field] = FIELDS[field](snapshot)
+                if value is None or value is False: break
+                if test == None: continue
+                if isinstance(test, re.Pattern):
+                    if not isinstance(value, str) or test.search(value) == None: break
+                elif not test(value): break
+            else:
+                return rule, fields
+        return None, fields
+
+    def classify(self, snapshot):
+        rule, fields = self.match(snapshot)
+        if rule == None: return 'Passed', None
+        if rule.error == None: return rule.status, None
+        value = fields[rule.error] if rule.error in fields else FIELDS[rule.error](snapshot)
+        return rule.status, rule.message.format(value) if rule.message else value
+
+    # Name of the rule that decided, for checking captured snapshots offline
+    def explain(self, snapshot):
+        rule, fields = self.match(snapshot)
+        return rule.name if rule != None else None
+
+_classifier = None
+_classifier_lock = threading.Lock()
+
+# The runners create it when they start, so a bad [PageClassifier] section stops them before any test runs
+def pageClassifier():
+    global _classifier
+    with _classifier_lock:
+        if _classifier == None: _classifier = PageClassifier()
+        return _classifier
+
+@onReload
+def _resetPageClassifier():
+    global _classifier
+    with _classifier_lock:
+        _classifier = None
+
+# Classify a page snapshot the same way TestSuite.go_to_url does
+# Returns the step status and error, error is None when the page passed
+def classifySnapshot(snapshot):
+    return pageClassifier().classify(snapshot)
+
+# Snapshots and the status and error the Open step gives them
+CORPUS = [
+    ({"title": "Example App", "url": "https://app.example.com/", "body": "Welcome"}, ('Passed', None)),
+    ({"title": "", "blank_source": True, "body": ""}, ('Warning', "Not authorized")),
+    ({"title": "", "access_error": "You are not authorized to view this page", "body": ""}, ('Warning', "You are not authorized to view this page")),
+    ({"title": "Example App", "toast": "401 Unauthorized", "body": ""}, ('Warning', "401 Unauthorized")),
+    ({"title": "Example App", "toast": "Access denied for this user", "body": ""}, ('Warning', "Access denied for this user")),
+    ({"title": "Example App", "toast": "Something went wrong\n\nPlease try again", "body": ""}, ('Failed', "Something went wrong. Please try again")),
+    ({"title": "Planned outage", "url": "https://app.example.com/outage.html", "heading": "Planned maintenance tonight", "body": ""}, ('Warning', "Planned maintenance tonight")),
+    ({"title": "We apologize", "url": "https://app.example.com/apology", "heading": "Unexpected outage", "body": ""}, ('Failed', "We apologize")),
+    ({"title": "", "url": "https://app.example.com/apology", "body": ""}, ('Failed', False)),
+    ({"title": "403 Forbidden", "url": "https://app.example.com/", "body": ""}, ('Warning', "403 Forbidden")),
+    ({"title": "Access denied", "url": "https://app.example.com/", "body": ""}, ('Warning', "Access denied")),
+    ({"title": "500 Internal Server Error", "url": "https://app.example.com/", "body": ""}, ('Failed', "500 Internal Server Error")),
+    ({"title": "There was a problem", "url": "https://app.example.com/", "body": ""}, ('Failed', "There was a problem")),
+    ({"title": "Release 2019 notes", "url": "https://app.example.com/", "body": ""}, ('Passed', None)),
+    ({"title": "", "url": "https://app.example.com/", "neterror": "This site can't be reached\napp.example.com took too long to respond.", "body": ""}, ('Failed', "This site can't be reached. app.example.com took too long to respond.")),
+    ({"title": "", "url": "https://app.example.com/health", "body": '{"status": "Healthy", "entries": {}}'}, ('Passed', None)),
+    ({"title": "", "url": "https://app.example.com/", "body": "x" * 1200}, ('Passed', None)),
+    ({"title": "", "url": "https://app.example.com/", "body": "[1, 2, 3]"}, ('Debug', "An unknown error occured: [1, 2, 3]")),
+    ({"title": "", "url": "https://app.example.com/", "body": "HTTP Error 401. Unauthorized"}, ('Warning', "HTTP Error 401. Unauthorized")),
+    ({"title": "", "url": "https://app.example.com/", "body": "HTTP Error 502. Bad gateway"}, ('Failed', "HTTP Error 502. Bad gateway")),
+    ({"title": "", "url": "https://app.example.com/", "body": ""}, ('Failed', "Blank Page Loaded")),
+    ({"title": "", "url": "https://app.example.com/"}, ('Passed', None)),
+    ({"title": "", "url": "https://app.example.com/", "body": "Loading..."}, ('Passed', None))
+]
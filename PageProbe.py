@@ -0,0 +1,56 @@
+import re
+
+# Navigation and resource timing of the current document in milliseconds
+TIMING_FUNCTION = """function() {
+    var nav = performance.getEntriesByType ? performance.getEntriesByType('navigation')[0] : null;
+    if (!nav) {
+        var t = performance.timing;
+        nav = {startTime: 0, domainLookupStart: t.domainLookupStart - t.navigationStart, domainLookupEnd: t.domainLookupEnd - t.navigationStart,
+            connectStart: t.connectStart - t.navigationStart, connectEnd: t.connectEnd - t.navigationStart,
+            secureConnectionStart: t.secureConnectionStart ? t.secureConnectionStart - t.navigationStart : 0,
+            requestStart: t.requestStart - t.navigationStart, responseStart: t.responseStart - t.navigationStart,
+            domContentLoadedEventEnd: Math.max(t.domContentLoadedEventEnd - t.navigationStart, 0), loadEventEnd: Math.max(t.loadEventEnd - t.navigationStart, 0)};
+    }
+    var resources = performance.getEntriesByType ? performance.getEntriesByType('resource') : [];
+    var bytes = 0;
+    for (var i = 0; i < resources.length; i++) bytes += resources[i].transferSize || 0;
+    var ms = function(value) { return Math.max(Math.round(value), 0); };
+    return {
+        dns: ms(nav.domainLookupEnd - nav.domainLookupStart),
+        connect: ms(nav.connectEnd - nav.connectStart),
+        tls: nav.secureConnectionStart > 0 ? ms(nav.connectEnd - nav.secureConnectionStart) : 0,
+        ttfb: ms(nav.responseStart - nav.startTime),
+        dom_content_loaded: ms(nav.domContentLoadedEventEnd - nav.startTime),
+        load: ms(nav.loadEventEnd - nav.startTime),
+        resource_count: resources.length,
+        resource_bytes: bytes
+    };
+}"""
+
+TIMING_SCRIPT = "return ({0})();".format(TIMING_FUNCTION)
+
+# Collects everything the Open step checks after a page load in a single script call
+PROBE_SCRIPT = """/* page probe */
+var attempt = function(f) { try { return f(); } catch (e) { return null; } };
+var text = function(el) { return el ? (el.innerText || el.textContent || '') : null; };
+return {
+    title: document.title,
+    url: window.location.href,
+    toast: attempt(function() { return text(document.querySelector('.toast-message')); }),
+    neterror: attempt(function() {
+        var neterror = document.querySelector('.neterror');
+        if (!neterror) return null;
+        return text(neterror.querySelector('#main-message') || neterror.querySelector('#errorLongContent'));
+    }),
+    body: attempt(function() { return text(document.documentElement); }),
+    heading: attempt(function() { var h1 = document.querySelector('h1'); return h1 ? h1.innerHTML : null; }),
+    blank_source: attempt(function() { return document.documentElement.outerHTML == '<html><head></head><body></body></html>'; }),
+    timing: attempt(TIMING)
+};""".replace("TIMING", TIMING_FUNCTION)
+
+def sanitize_string(text):
+    # Replace line breaks and multiple spaces with a period
+    text = re.sub(r'\n+|\s{2,}', '. ', text.strip())
+    # Strip any accidental periods added to existing punctuation
+    text = re.sub(r'(\W)\.', r'\1', text)
+    return text
@@ -0,0 +1,85 @@
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+from .TestConfig import TestSettings, onReload
+import socket, threading, time
+
+# App URLs are usually full URLs, only the host part can be resolved
+def hostFromUrl(url):
+    parts = urlsplit(url if '//' in url else '//' + url)
+    return parts.hostname or url
+
+class DNSCache():
+    # Resolves names in the background and caches the answers, failures are cached for negative_ttl
+    def __init__(self, ttl=None, negative_ttl=None, workers=None, timeout=None):
+        self.ttl = ttl if ttl != None else TestSettings.getint('DNS', 'ttl', fallback=300)
+        self.negative_ttl = negative_ttl if negative_ttl != None else TestSettings.getint('DNS', 'negative_ttl', fallback=60)
+        self.timeout = timeout if timeout != None else TestSettings.getfloat('DNS', 'timeout', fallback=2)
+        self.executor = ThreadPoolExecutor(max_workers=workers if workers else TestSettings.getint('DNS', 'workers', fallback=8))
+        self.entries = {}
+        self.lock = threading.Lock()
+
+    def submit(self, key, function, name):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and (not entry[1].done() or entry[0] > time.time()): return entry[1]
+            future = self.executor.submit(function, name)
+            self.entries[key] = (float('inf'), future)
+        future.add_done_callback(lambda f: self.expire(key, f))
+        return future
+
+    def expire(self, key, future):
+        value = future.result() if not future.exception() else None
+        ttl = self.negative_ttl if value == None or value == (None, None) else self.ttl
+        with self.lock:
+            if key in self.entries and self.entries[key][1] is future:
+                self.entries[key] = (time.time() + ttl, future)
+
+    # A malformed host, e.g. an empty label, raises UnicodeError from the idna codec rather than OSError
+    def forward(self, host):
+        try:
+            ip = socket.gethostbyname(host)
+        except (OSError, UnicodeError, ValueError):
+            return None, None
+        return ip, self.reverse(ip)
+
+    def reverse(self, ip):
+        try:
+            return socket.gethostbyaddr(ip)[0]
+        except (OSError, UnicodeError, ValueError):
+            return None
+
+    # Future of (ip, server name) for the host of a URL
+    def lookup(self, url):
+        return self.submit(('host', hostFromUrl(url)), self.forward, hostFromUrl(url))
+
+    # Future of the name of an IP address
+    def hostname(self, ip):
+        return self.submit(('addr', ip), self.reverse, ip)
+
+    # Wait for a lookup without blocking longer than the configured timeout, a lookup that failed gives the default too
+    def result(self, future, default=None):
+        try:
+            return future.result(self.timeout)
+        except Exception:
+            return default
+
+    def clear(self):
+        with self.lock:
+            self.entries = {}
+
+_resolver = None
+_resolver_lock = threading.Lock()
+
+# Shared by every test in the process, created on first use
+def resolver():
+    global _resolver
+    with _resolver_lock:
+        if _resolver == None: _resolver = DNSCache()
+        return _resolver
+
+@onReload
+def _resetResolver():
+    global _resolver
+    with _resolver_lock:
+        if _resolver != None: _resolver.executor.shutdown(wait=False)
+        _resolver = None
@@ -0,0 +1,207 @@
+from http.client import HTTPConnection, HTTPSConnection, HTTPException
+from logging.handlers import RotatingFileHandler
+from urllib.parse import urlsplit
+from .TestConfig import TestSettings, onReload
+import atexit, gzip, json, logging, queue, ssl, sys, threading, time
+
+# Serialized once in the caller's thread, so the sink never holds on to the results dict
+def serialize(results):
+    return json.dumps(results, default=str)
+
+class ResultSink():
+    # Receives each transaction as soon as WriteResults is called
+    def emit(self, results):
+        self.write(serialize(results))
+
+    def write(self, line):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+# Used when no sinks are configured, results are only returned to the caller
+class NullSink(ResultSink):
+    def emit(self, results):
+        pass
+
+class StdoutSink(ResultSink):
+    # Newline delimited JSON for Splunk scripted inputs
+    def __init__(self, stream=None):
+        self.stream = stream if stream else sys.stdout
+        self.lock = threading.Lock()
+
+    def write(self, line):
+        with self.lock:
+            self.stream.write(line + "\n")
+            self.stream.flush()
+
+class RotatingFileSink(ResultSink):
+    def __init__(self, path=None, max_bytes=None, backups=None):
+        self.path = path if path else TestSettings.get('Results', 'file_path', fallback='results.json')
+        max_bytes = max_bytes if max_bytes != None else TestSettings.getint('Results', 'file_max_bytes', fallback=10485760)
+        backups = backups if backups != None else TestSettings.getint('Results', 'file_backups', fallback=5)
+        # The logging handler already does thread safe writes and rollover
+        self.handler = RotatingFileHandler(self.path, maxBytes=max_bytes, backupCount=backups, encoding='utf-8')
+        self.handler.setFormatter(logging.Formatter('%(message)s'))
+
+    def write(self, line):
+        self.handler.emit(logging.makeLogRecord({'msg': line}))
+
+    def close(self):
+        self.handler.close()
+
+class HECSink(ResultSink):
+    # Posts batches to the Splunk HTTP Event Collector from a background thread
+    def __init__(self, url=None, token=None, batch_size=None, flush_interval=None, queue_size=None, retries=None, timeout=None):
+        self.url = urlsplit(url if url else TestSettings.get('Results', 'hec_url', fallback=''))
+        self.token = token if token else TestSettings.get('Results', 'hec_token', fallback='')
+        if not self.url.hostname or not self.token: raise ValueError("HEC sink needs hec_url and hec_token")
+        self.path = self.url.path if self.url.path and self.url.path != '/' else '/services/collector/event'
+        self.batch_size = batch_size if batch_size else TestSettings.getint('Results', 'hec_batch_size', fallback=50)
+        self.flush_interval = flush_interval if flush_interval else TestSettings.getfloat('Results', 'hec_flush_interval', fallback=2)
+        self.retries = retries if retries != None else TestSettings.getint('Results', 'hec_retries', fallback=3)
+        self.timeout = timeout if timeout else TestSettings.getfloat('Results', 'hec_timeout', fallback=10)
+        self.compress = TestSettings.getboolean('Results', 'hec_gzip', fallback=True)
+        self.verify = TestSettings.getboolean('Results', 'hec_verify', fallback=True)
+        # Longest emit waits for room in a full queue before the record is dropped
+        self.block_timeout = TestSettings.getfloat('Results', 'hec_block_timeout', fallback=5)
+        self.metadata = {}
+        for field in ['index', 'source', 'sourcetype', 'host']:
+            value = TestSettings.get('Results', 'hec_' + field, fallback='')
+            if value: self.metadata[field] = value
+        self.queue = queue.Queue(maxsize=queue_size if queue_size else TestSettings.getint('Results', 'hec_queue_size', fallback=1000))
+        self.connection = None
+        self.sent = 0
+        self.failed = 0
+        self.dropped = 0
+        self.thread = threading.Thread(target=self.worker, name="HECSink", daemon=True)
+        self.thread.start()
+
+    def write(self, line):
+        event = dict(self.metadata, time=round(time.time(), 3))
+        # The results are already JSON, splice them in rather than parsing them again
+        payload = json.dumps(event)[:-1] + ', "event": ' + line + '}'
+        try:
+            self.queue.put(payload, timeout=self.block_timeout)
+        except queue.Full:
+            self.dropped += 1
+
+    def worker(self):
+        closing = False
+        while not closing:
+            batch = []
+            deadline = time.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    item = self.queue.get(timeout=max(deadline - time.time(), 0.01))
+                except queue.Empty:
+                    break
+                if item == None:
+                    closing = True
+                    break
+                batch.append(item)
+            if batch: self.post(batch)
+
+    def connect(self):
+        if self.connection == None:
+            if self.url.scheme == "https":
+                context = ssl.create_default_context() if self.verify else ssl._create_unverified_context()
+                self.connection = HTTPSConnection(self.url.hostname, self.url.port or 8088, timeout=self.timeout, context=context)
+            else:
+                self.connection = HTTPConnection(self.url.hostname, self.url.port or 8088, timeout=self.timeout)
+        return self.connection
+
+    def post(self, batch):
+        body = "\n".join(batch).encode('utf-8')
+        headers = {"Authorization": "Splunk {0}".format(self.token), "Content-Type": "application/json"}
+        if self.compress:
+            body = gzip.compress(body)
+            headers["Content-Encoding"] = "gzip"
+        delay = 1
+        for attempt in range(self.retries + 1):
+            try:
+                connection = self.connect()
+                connection.request("POST", self.path, body, headers)
+                response = connection.getresponse()
+                response.read()
+                if response.status < 300:
+                    self.sent += len(batch)
+                    return
+                # Bad token or bad data won't get better by retrying
+                if response.status < 500 and response.status not in [408, 429]: break
+            except (HTTPException, OSError):
+                if self.connection != None: self.connection.close()
+                self.connection = None
+            if attempt < self.retries:
+                time.sleep(delay)
+                delay = min(delay * 2, 30)
+        self.failed += len(batch)
+
+    # Send whatever is queued and stop the worker
+    def close(self):
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join(self.timeout * (self.retries + 1))
+        if self.connection != None: self.connection.close()
+
+class MultiSink(ResultSink):
+    def __init__(self, sinks):
+        self.sinks = sinks
+
+    def write(self, line):
+        for sink in self.sinks:
+            sink.write(line)
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+
+SINKS = {
+    'stdout': StdoutSink,
+    'file': RotatingFileSink,
+    'hec': HECSink
+}
+
+# The sink names listed in [Results] sinks, an unknown name is a configuration error
+def sinkNames(names=None):
+    names = names if names != None else TestSettings.get('Results', 'sinks', fallback='')
+    names = [name.strip().lower() for name in names.split(',') if name.strip()]
+    for name in names:
+        if name not in SINKS: raise ValueError("Unknown result sink {0!r} in [Results] sinks, expected {1}".format(name, ", ".join(SINKS)))
+    return names
+
+# Build the sinks listed in [Results] sinks, None when results are only kept in memory
+def createSink(names=None):
+    sinks = [SINKS[name]() for name in sinkNames(names)]
+    if not sinks: return None
+    return sinks[0] if len(sinks) == 1 else MultiSink(sinks)
+
+_sink = None
+_sink_lock = threading.Lock()
+
+# The sink shared by every test in the process, created on first use
+# The runners create it when they start, so a bad [Results] section stops them before any test runs
+def resultSink():
+    global _sink
+    with _sink_lock:
+        if _sink == None:
+            _sink = createSink() or NullSink()
+            atexit.register(_sink.close)
+        return _sink
+
+@onReload
+def _resetResultSink():
+    global _sink
+    with _sink_lock:
+        if _sink != None: _sink.close()
+        _sink = None
+
+# Emit a finished transaction, dropping the screenshot and logs from memory if they don't need to be kept
+def emitResults(results):
+    sink = resultSink()
+    if isinstance(sink, NullSink): return
+    sink.emit(results)
+    if not TestSettings.getboolean('Results', 'keep_attachments', fallback=True):
+        results.pop('screenshot', None)
+        results['results'].pop('screenshot', None)
+        results['results'].pop('logs', None)
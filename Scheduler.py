@@ -0,0 +1,186 @@
+from collections import deque
+from .TestConfig import TestSettings, onReload
+import math, threading, time
+
+def percentile(values, p):
+    if not values: return None
+    values = sorted(values)
+    return values[min(int(math.ceil(p / 100.0 * len(values))) - 1, len(values) - 1)] if p > 0 else values[0]
+
+class DurationHistory():
+    # What the scheduler needs to know about earlier runs, History.py keeps the same data on disk
+    def record(self, app, results):
+        raise NotImplementedError
+
+    # Duration of a step at the given percentile, None until there are enough samples
+    def step_percentile(self, item_id, browser, index, p):
+        raise NotImplementedError
+
+    # Duration of a whole transaction at the given percentile
+    def app_percentile(self, item_id, browser, p):
+        raise NotImplementedError
+
+    # Share of recent transactions that did not pass
+    def failure_rate(self, item_id, browser):
+        raise NotImplementedError
+
+class MemoryHistory(DurationHistory):
+    # Keeps the last window samples per app and step in memory
+    def __init__(self, window=None, min_samples=None):
+        self.window = window if window else TestSettings.getint('Scheduler', 'window', fallback=50)
+        self.min_samples = min_samples if min_samples else TestSettings.getint('Scheduler', 'min_samples', fallback=5)
+        self.steps = {}
+        self.apps = {}
+        self.outcomes = {}
+        self.lock = threading.Lock()
+
+    def samples(self, table, key):
+        if key not in table: table[key] = deque(maxlen=self.window)
+        return table[key]
+
+    def record(self, app, results):
+        item_id, browser = app.get("ITEM_ID"), app.get("BROWSER")
+        tests = results.get('tests', [])
+        with self.lock:
+            for index, test in enumerate(tests):
+                if test.get('status') not in [None, 'Skipped'] and test.get('duration') != None:
+                    self.samples(self.steps, (item_id, browser, index)).append(test['duration'])
+            # Like SQLiteHistory, an app that didn't run a step, e.g. one skipped at the deadline, isn't an outcome
+            if any(test.get('status') not in [None, 'Skipped'] for test in tests):
+                self.samples(self.apps, (item_id, browser)).append(results['results']['duration'])
+                self.samples(self.outcomes, (item_id, browser)).append(results['results'].get('status') not in ["Passed", "Slow"])
+
+    def enough(self, samples):
+        return list(samples) if samples and len(samples) >= self.min_samples else None
+
+    def step_percentile(self, item_id, browser, index, p):
+        with self.lock:
+            return percentile(self.enough(self.steps.get((item_id, browser, index))), p)
+
+    def app_percentile(self, item_id, browser, p):
+        with self.lock:
+            return percentile(self.enough(self.apps.get((item_id, browser))), p)
+
+    def failure_rate(self, item_id, browser):
+        with self.lock:
+            outcomes = self.outcomes.get((item_id, browser))
+            return sum(outcomes) / float(len(outcomes)) if outcomes else 0.0
+
+class Budget():
+    # Time left for one transaction, limit is infinite when no budget applies
+    def __init__(self, limit):
+        self.limit = limit
+        self.start = time.time()
+        self.shortened = 0
+        self.skipped = 0
+
+    def used(self):
+        return time.time() - self.start
+
+    def remaining(self):
+        return self.limit - self.used()
+
+    def exhausted(self):
+        return self.remaining() <= 0
+
+    # Cap a timeout to what is left, with a short floor so a started step can still check once
+    def timeout(self, timeout):
+        if math.isinf(self.limit): return timeout
+        return max(min(timeout, self.remaining()), 0.5)
+
+    # Seconds a Wait step may still sleep
+    def wait(self, seconds):
+        allowed = max(min(seconds, self.remaining()), 0)
+        if allowed < seconds: self.shortened += 1
+        return allowed
+
+    def report(self):
+        used = round(self.used(), 2)
+        return {
+            "limit": round(self.limit, 2),
+            "used": used,
+            "overrun": used > self.limit,
+            "shortened_waits": self.shortened,
+            "skipped_steps": self.skipped
+        }
+
+class Scheduler():
+    # Orders apps and sets their time budgets and step timeouts from what earlier runs took
+    def __init__(self, history=None):
+        if history == None and TestSettings.get('History', 'path', fallback=''):
+            # Imported here, History builds on the interface defined in this module
+            from .History import SQLiteHistory
+            history = SQLiteHistory()
+        self.history = history if history else MemoryHistory()
+        self.adaptive = TestSettings.getboolean('Scheduler', 'adaptive', fallback=False)
+        # Seconds per app when there is no history, 0 = no budget
+        self.app_budget = TestSettings.getfloat('Scheduler', 'app_budget', fallback=0)
+        self.budget_factor = TestSettings.getfloat('Scheduler', 'budget_factor', fallback=3)
+        self.min_budget = TestSettings.getfloat('Scheduler', 'min_budget', fallback=30)
+        self.step_factor = TestSettings.getfloat('Scheduler', 'step_factor', fallback=2)
+        self.max_step_timeout = TestSettings.getfloat('Scheduler', 'max_step_timeout', fallback=60)
+        self.default_duration = TestSettings.getfloat('Scheduler', 'default_duration', fallback=10)
+        # Seconds a whole run has to finish in, e.g. the scripted input interval, 0 = no limit
+        self.interval = TestSettings.getfloat('Scheduler', 'interval', fallback=0)
+        self.deadline = None
+
+    def start_run(self, interval=None):
+        interval = interval if interval != None else self.interval
+        self.deadline = time.time() + interval if interval else None
+
+    def cost(self, app):
+        duration = self.history.app_percentile(app.get("ITEM_ID"), app.get("BROWSER"), 95)
+        if duration == None: duration = self.default_duration
+        return duration * (1 + self.history.failure_rate(app.get("ITEM_ID"), app.get("BROWSER")))
+
+    # Indexes of apps with the slowest and flakiest first, so they don't end up holding back the end of the run
+    def order(self, apps):
+        costs = [self.cost(app) for app in apps]
+        return sorted(range(len(apps)), key=lambda index: -costs[index])
+
+    def budget(self, app):
+        limit = float('inf')
+        if app.get('BUDGET') not in [None, '']:
+            limit = float(app['BUDGET'])
+        else:
+            p95 = self.history.app_percentile(app.get("ITEM_ID"), app.get("BROWSER"), 95) if self.adaptive else None
+            if p95 != None: limit = max(p95 * self.budget_factor, self.min_budget)
+            if self.app_budget: limit = min(limit, self.app_budget)
+        if self.deadline != None: limit = min(limit, self.time_left())
+        return Budget(limit)
+
+    # Seconds until the run's deadline, never negative, None without a deadline
+    def time_left(self):
+        return max(self.deadline - time.time(), 0) if self.deadline != None else None
+
+    # Past the deadline an app isn't started at all, it would only take a session to skip every step
+    def overdue(self):
+        return self.time_left() == 0
+
+    # Timeout for a wait inside a step, longer than the configured one when the step's p95 needs it
+    # Never shorter, a wait that runs into the configured timeout is what reports the page as slow
+    def step_timeout(self, app, step, default):
+        if not self.adaptive: return default
+        p95 = self.history.step_percentile(app.get("ITEM_ID"), app.get("BROWSER"), step.index, 95)
+        if p95 == None: return default
+        return max(min(p95 * self.step_factor, self.max_step_timeout), default)
+
+    def record(self, app, results):
+        self.history.record(app, results)
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+# Shared by every test in the process, created on first use so the history file isn't opened on import
+def scheduler():
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler == None: _scheduler = Scheduler()
+        return _scheduler
+
+@onReload
+def _resetScheduler():
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler != None and hasattr(_scheduler.history, 'close'): _scheduler.history.close()
+        _scheduler = None
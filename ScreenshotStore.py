@@ -0,0 +1,130 @@
+from .TestConfig import TestSettings, onReload
+import base64, hashlib, io, os, struct, threading, time
+
+# Pillow is optional, without it screenshots are stored as the PNG the browser returned
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+EXTENSIONS = {'png': 'png', 'jpeg': 'jpg', 'webp': 'webp'}
+
+# Width and height from the IHDR chunk of a PNG
+def pngSize(data):
+    if data[:8] != b'\x89PNG\r\n\x1a\n' or data[12:16] != b'IHDR': return None, None
+    return struct.unpack('>II', data[16:24])
+
+class ScreenshotStore():
+    # Stores screenshots on disk by the hash of the captured PNG, so identical pages are only written once
+    def __init__(self, path=None, format=None, quality=None, max_width=None, retention_days=None, max_mb=None):
+        self.path = path if path else TestSettings.get('Screenshots', 'path', fallback='')
+        if not self.path: raise ValueError("Screenshot store needs a path")
+        self.format = (format if format else TestSettings.get('Screenshots', 'format', fallback='jpeg')).lower()
+        if self.format not in EXTENSIONS: raise ValueError("Unsupported screenshot format {0}".format(self.format))
+        # Without Pillow there is nothing to re-encode with
+        if Image == None: self.format = 'png'
+        self.quality = quality if quality else TestSettings.getint('Screenshots', 'quality', fallback=70)
+        self.max_width = max_width if max_width != None else TestSettings.getint('Screenshots', 'max_width', fallback=1280)
+        self.retention_days = retention_days if retention_days != None else TestSettings.getfloat('Screenshots', 'retention_days', fallback=30)
+        self.max_mb = max_mb if max_mb != None else TestSettings.getfloat('Screenshots', 'max_mb', fallback=1024)
+        # Prefix for a link to the stored file, e.g. a web server publishing the screenshot directory
+        self.url_prefix = TestSettings.get('Screenshots', 'url_prefix', fallback='')
+        self.lock = threading.Lock()
+        self.pruned = 0
+        self.stored = 0
+        self.duplicates = 0
+        os.makedirs(self.path, exist_ok=True)
+
+    def filename(self, digest):
+        return os.path.join(digest[:2], "{0}.{1}".format(digest, EXTENSIONS[self.format]))
+
+    # Size of the stored image, the scaling is deterministic so a duplicate never has to be decoded
+    def scaled_size(self, width, height):
+        if width and self.max_width and width > self.max_width and self.format != 'png':
+            return self.max_width, max(int(round(height * self.max_width / float(width))), 1)
+        return width, height
+
+    def encode(self, png):
+        image = Image.open(io.BytesIO(png))
+        width, height = self.scaled_size(*image.size)
+        if (width, height) != image.size: image = image.resize((width, height), Image.LANCZOS)
+        if self.format == 'jpeg' and image.mode != 'RGB': image = image.convert('RGB')
+        output = io.BytesIO()
+        image.save(output, self.format.upper(), quality=self.quality)
+        return output.getvalue()
+
+    # Store a PNG and return the reference that goes into the results
+    def store(self, png):
+        digest = hashlib.sha256(png).hexdigest()
+        filename = self.filename(digest)
+        full_path = os.path.join(self.path, filename)
+        width, height = self.scaled_size(*pngSize(png))
+        if os.path.exists(full_path):
+            # Refresh the modified time so retention counts from the last time the page was seen
+            os.utime(full_path)
+            self.duplicates += 1
+        else:
+            data = self.encode(png) if self.format != 'png' else png
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            temp_path = "{0}.{1}.tmp".format(full_path, threading.get_ident())
+            with open(temp_path, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, full_path)
+            self.stored += 1
+        self.prune()
+        reference = {
+            "id": digest,
+            "file": filename.replace(os.sep, '/'),
+            "format": self.format,
+            "width": width,
+            "height": height,
+            "bytes": os.path.getsize(full_path)
+        }
+        if self.url_prefix: reference['url'] = self.url_prefix.rstrip('/') + '/' + reference['file']
+        return reference
+
+    def store_base64(self, img_str):
+        return self.store(base64.b64decode(img_str))
+
+    # Remove screenshots past the retention period, then the oldest ones while the store is over max_mb
+    # Runs at most once an hour
+    def prune(self, force=False):
+        with self.lock:
+            if not force and time.time() - self.pruned < 3600: return
+            self.pruned = time.time()
+        files = []
+        for directory, _, names in os.walk(self.path):
+            for name in names:
+                full_path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(full_path)
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, full_path))
+        files.sort()
+        expires = time.time() - self.retention_days * 86400
+        total = sum(f[1] for f in files)
+        for mtime, size, full_path in files:
+            if (self.retention_days and mtime < expires) or (self.max_mb and total > self.max_mb * 1048576):
+                try:
+                    os.remove(full_path)
+                    total -= size
+                except OSError:
+                    pass
+
+_store = None
+_store_lock = threading.Lock()
+
+# The store configured in [Screenshots], None when screenshots stay inline in the results
+def screenshotStore():
+    global _store
+    with _store_lock:
+        if _store == None:
+            _store = ScreenshotStore() if TestSettings.get('Screenshots', 'path', fallback='') else False
+        return _store or None
+
+@onReload
+def _resetScreenshotStore():
+    global _store
+    with _store_lock:
+        _store = None
@@ -0,0 +1,198 @@
+from urllib.parse import urlsplit
+from .TestConfig import TestSettings
+from .Instrumentation import instrument
+import threading, time
+
+ISOLATION_MODES = ["reset", "fresh", "none", "sso"]
+
+# Clears web storage of the page that is still open, cookies are cleared by the driver
+CLEAR_STORAGE_SCRIPT = "try { window.localStorage.clear(); } catch (e) {} try { window.sessionStorage.clear(); } catch (e) {}"
+
+# How an app is separated from the one before it on the same browser:
+# reset cleans the live session, fresh uses a new session that is closed afterwards, none only leaves the page
+# sso cleans like reset but keeps the identity provider's cookies, it's what apps batched behind one sign in use
+def isolationMode(app):
+    mode = str(app.get('ISOLATION') or TestSettings.get('SessionPool', 'isolation', fallback='reset')).lower()
+    return mode if mode in ISOLATION_MODES else "reset"
+
+# scheme://host[:port] of a web page, None for about:blank and other URLs without storage of their own
+def urlOrigin(url):
+    parts = urlsplit(url or '')
+    if parts.scheme not in ["http", "https"] or not parts.netloc: return None
+    return "{0}://{1}".format(parts.scheme, parts.netloc.lower())
+
+# Return a live session to a clean state for the next app, while still on the last app's page so its storage can be cleared
+# WebDriver only deletes the cookies of the current domain, Chrome drivers with CDP access clear every cookie,
+# and the storage of the current page and the given origins, CDP has no call that clears every origin's storage
+def resetSession(driver, mode="reset", origins=()):
+    if mode in ["reset", "sso"]:
+        handles = driver.window_handles
+        if len(handles) > 1:
+            for handle in handles[1:]:
+                driver.switch_to.window(handle)
+                driver.close()
+            driver.switch_to.window(handles[0])
+        driver.switch_to.default_content()
+        driver.execute_script(CLEAR_STORAGE_SCRIPT)
+        driver.delete_all_cookies()
+        if mode == "reset" and hasattr(driver, 'execute_cdp_cmd'):
+            try:
+                driver.execute_cdp_cmd('Network.clearBrowserCookies', {})
+                for origin in sorted(set(origins) | set([urlOrigin(driver.current_url)]) - set([None])):
+                    driver.execute_cdp_cmd('Storage.clearDataForOrigin', {'origin': origin, 'storageTypes': 'all'})
+            except Exception:
+                pass
+    driver.get('about:blank')
+
+class Session():
+    def __init__(self, browser, driver, details):
+        self.browser = browser
+        self.driver = driver
+        self.details = details
+        self.created = time.time()
+        self.uses = 0
+        # Origins opened since the last full reset, their storage is cleared by it
+        self.origins = set()
+
+    def age(self):
+        return time.time() - self.created
+
+    def visit(self, url):
+        origin = urlOrigin(url)
+        if origin != None: self.origins.add(origin)
+
+    # resetSession for the origins this session opened, sso keeps them for the full reset that ends the batch
+    def reset(self, mode="reset"):
+        resetSession(self.driver, mode, self.origins)
+        if mode == "reset": self.origins = set()
+
+class SessionPool():
+    def __init__(self, launcher, describe, max_uses=None, max_age=None, health_check=None):
+        # launcher(browser) returns a new WebDriver, describe(driver) returns its environment details
+        self.launcher = launcher
+        self.describe = describe
+        # Recycle sessions after a number of transactions or seconds, 0 disables the limit
+        self.max_uses = max_uses if max_uses != None else TestSettings.getint('SessionPool', 'max_uses', fallback=0)
+        self.max_age = max_age if max_age != None else TestSettings.getint('SessionPool', 'max_age', fallback=0)
+        self.health_check = health_check if health_check != None else TestSettings.getboolean('SessionPool', 'health_check', fallback=True)
+        self.idle = {}
+        self.active = set()
+        self.pending = {}
+        self.condition = threading.Condition()
+        self.counters = {'acquired': 0, 'released': 0, 'launched': 0, 'launch_failed': 0, 'recycled': 0, 'replaced': 0, 'fresh': 0}
+
+    def stats(self):
+        with self.condition:
+            stats = dict(self.counters)
+            stats['idle'] = sum(len(sessions) for sessions in self.idle.values())
+            stats['active'] = len(self.active)
+        return stats
+
+    def launch(self, browser):
+        try:
+            driver = self.launcher(browser)
+            # Count the session's commands from the start, including describing it
+            instrument(driver)
+        except Exception:
+            with self.condition:
+                self.counters['launch_failed'] += 1
+            raise
+        try:
+            details = self.describe(driver)
+        except Exception:
+            self.quit(driver)
+            with self.condition:
+                self.counters['launch_failed'] += 1
+            raise
+        with self.condition:
+            self.counters['launched'] += 1
+        return Session(browser, driver, details)
+
+    # Start sessions in the background so the first test doesn't wait for browser startup
+    def prewarm(self, browser, count=1):
+        def warm():
+            try:
+                session = self.launch(browser)
+            except Exception:
+                session = None
+            with self.condition:
+                self.pending[browser] -= 1
+                if session: self.idle.setdefault(browser, []).append(session)
+                self.condition.notify_all()
+        for _ in range(count):
+            with self.condition:
+                self.pending[browser] = self.pending.get(browser, 0) + 1
+            threading.Thread(target=warm, daemon=True).start()
+
+    def expired(self, session):
+        if self.max_uses and session.uses >= self.max_uses: return True
+        if self.max_age and session.age() >= self.max_age: return True
+        return False
+
+    def alive(self, session):
+        if not self.health_check: return True
+        try:
+            session.driver.current_url
+            return True
+        except Exception:
+            return False
+
+    # A fresh session is always launched for the caller and should be released with discard=True
+    def acquire(self, browser, fresh=False):
+        if fresh:
+            session = self.launch(browser)
+            with self.condition:
+                session.uses += 1
+                self.active.add(session)
+                self.counters['acquired'] += 1
+                self.counters['fresh'] += 1
+            return session
+        while True:
+            with self.condition:
+                # Wait for a prewarmed session instead of launching a duplicate
+                while not self.idle.get(browser) and self.pending.get(browser, 0) > 0:
+                    self.condition.wait()
+                session = self.idle[browser].pop() if self.idle.get(browser) else None
+            if session == None:
+                session = self.launch(browser)
+            elif self.expired(session):
+                self.quit(session.driver)
+                with self.condition:
+                    self.counters['recycled'] += 1
+                continue
+            elif not self.alive(session):
+                self.quit(session.driver)
+                with self.condition:
+                    self.counters['replaced'] += 1
+                continue
+            with self.condition:
+                session.uses += 1
+                self.active.add(session)
+                self.counters['acquired'] += 1
+            return session
+
+    def release(self, session, discard=False):
+        with self.condition:
+            self.active.discard(session)
+            self.counters['released'] += 1
+            if not discard:
+                self.idle.setdefault(session.browser, []).append(session)
+                self.condition.notify_all()
+        if discard:
+            self.quit(session.driver)
+
+    def quit(self, driver):
+        try:
+            driver.quit()
+        except Exception:
+            pass
+
+    def close(self):
+        with self.condition:
+            while sum(self.pending.values()) > 0:
+                self.condition.wait()
+            sessions = [session for idle in self.idle.values() for session in idle] + list(self.active)
+            self.idle = {}
+            self.active = set()
+        for session in sessions:
+            self.quit(session.driver)
@@ -0,0 +1,101 @@
+from selenium.webdriver.common.by import By
+from .Resolver import hostFromUrl
+from .SessionPool import isolationMode
+from .TestConfig import TestSettings
+import threading, time
+
+# Identity provider hosts, an app whose Open step lands on one of them signs in there
+def ssoHosts():
+    return [host.strip().lower() for host in TestSettings.get('SSO', 'hosts', fallback='login.microsoftonline.com').split(',') if host.strip()]
+
+def ssoHost(url):
+    host = hostFromUrl(url or '').lower()
+    return host if host in ssoHosts() else None
+
+# Microsoft sign in: enter the configured email, click Next and wait to be sent back to the app
+def microsoftSignIn(driver, return_url, timeout=None):
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.webdriver.support.ui import WebDriverWait
+    wait = WebDriverWait(driver, timeout if timeout else TestSettings.getfloat('SSO', 'timeout', fallback=10))
+    # wait for email field and enter email
+    wait.until(EC.element_to_be_clickable((By.XPATH, '//*/input[@type="email"]'))).send_keys(TestSettings.get('UserInfo', 'email'))
+    # Click Next
+    wait.until(EC.element_to_be_clickable((By.XPATH, '//*/input[@type="submit"]'))).click()
+    # Wait for new page to load
+    wait.until(EC.url_contains(return_url))
+
+class AuthDomains():
+    # The identity provider each app signed in with, from the app's AUTH_DOMAIN field or learned when its Open step was sent there
+    # A learned domain only groups the app from its next run on, batchApps groups the apps before any of them runs
+    def __init__(self):
+        self.learned = {}
+        self.lock = threading.Lock()
+
+    def remember(self, app, host):
+        with self.lock:
+            self.learned[(app.get('ITEM_ID'), app.get('BROWSER'))] = host
+
+    def domain(self, app):
+        if app.get('AUTH_DOMAIN'): return str(app['AUTH_DOMAIN']).lower()
+        with self.lock:
+            return self.learned.get((app.get('ITEM_ID'), app.get('BROWSER')))
+
+_auth_domains = None
+_auth_domains_lock = threading.Lock()
+
+# Shared by every test in the process, so later runs batch what earlier ones learned
+# Nothing in it comes from the settings, so it is kept when they are reloaded
+def authDomains():
+    global _auth_domains
+    with _auth_domains_lock:
+        if _auth_domains == None: _auth_domains = AuthDomains()
+        return _auth_domains
+
+def batchingEnabled():
+    return TestSettings.getboolean('SSO', 'batch', fallback=False)
+
+# Apps that can share a signed in session: same identity provider and browser, and not asking for a session of their own
+def batchKey(app):
+    if isolationMode(app) == "fresh": return None
+    domain = authDomains().domain(app)
+    return (domain, app.get('BROWSER')) if domain else None
+
+# Indexes in the given order, apps behind the same sign in grouped at the place of the first of them
+def batchApps(apps, order):
+    groups = {}
+    items = []
+    for index in order:
+        key = batchKey(apps[index]) if batchingEnabled() else None
+        if key == None:
+            items.append([index])
+            continue
+        if key not in groups:
+            groups[key] = []
+            items.append(groups[key])
+        groups[key].append(index)
+    return items
+
+class SignInBatch():
+    # A warm session signed in once and then used for every app in the group, the sign in is reported apart from the apps
+    def __init__(self, session, domain, size):
+        self.session = session
+        self.report = {'domain': domain, 'batch_size': size, 'batch_id': "{0}-{1}".format(domain, int(time.time() * 1000))}
+
+    # Open the first app, sign in if the identity provider asks, the time it takes is the group's auth_duration
+    def sign_in(self, url):
+        driver = self.session.driver
+        start = time.time()
+        try:
+            driver.get(url)
+            self.session.visit(url)
+            # The identity provider's storage is cleared with the apps' when the batch ends
+            current_url = driver.current_url
+            self.session.visit(current_url)
+            host = ssoHost(current_url)
+            if host == "login.microsoftonline.com": microsoftSignIn(driver, url)
+            self.report['status'] = "Passed"
+        except Exception as e:
+            self.report['status'] = "Failed"
+            self.report['error'] = "Sign in failed: {0}".format(type(e).__name__)
+        self.report['auth_duration'] = round(time.time() - start, 3)
+        return self.report['status'] == "Passed"
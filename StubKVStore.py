@@ -0,0 +1,63 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+import hashlib, json, threading
+
+# A local stand-in for the Splunk KVStore data endpoint, for exercising KVStoreLoader without splunkd
+# Answers GET .../storage/collections/data/<collection> with sort=_key, limit, skip, fields and {"field": {"$gt": value}} queries,
+# with an ETag per response and 304 for a matching If-None-Match
+class StubKVStore():
+    def __init__(self, records=None, token=None, host="127.0.0.1", port=0):
+        self.records = dict((record['_key'], record) for record in (records or []))
+        self.token = token
+        self.counters = {'requests': 0, 'not_modified': 0}
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                status, body, etag = stub.route(self.path, self.headers)
+                self.send_response(status)
+                if etag: self.send_header("ETag", etag)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.port = self.server.server_address[1]
+        self.url = "http://{0}:{1}".format(host, self.port)
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def route(self, path, headers):
+        self.counters['requests'] += 1
+        parts = urlsplit(path)
+        if "/storage/collections/data/" not in parts.path: return 404, b'{"messages": []}', None
+        if self.token and headers.get('Authorization', '').split(' ')[-1] != self.token: return 401, b'{"messages": []}', None
+        params = dict((k, v[0]) for k, v in parse_qs(parts.query).items())
+        records = [self.records[key] for key in sorted(self.records)]
+        if params.get('query'):
+            for field, condition in json.loads(params['query']).items():
+                records = [r for r in records if r.get(field) != None and r[field] > condition['$gt']]
+        skip = int(params.get('skip', 0))
+        limit = int(params.get('limit', 0)) or len(records)
+        records = records[skip:skip + limit]
+        if params.get('fields'):
+            fields = params['fields'].split(',')
+            records = [dict((k, v) for k, v in r.items() if k in fields) for r in records]
+        body = json.dumps(records).encode('utf-8')
+        etag = '"{0}"'.format(hashlib.sha1(body).hexdigest())
+        if headers.get('If-None-Match') == etag:
+            self.counters['not_modified'] += 1
+            return 304, b'', etag
+        return 200, body, etag
@@ -0,0 +1,139 @@
+import asyncio, base64, itertools, json, re
+
+# A tiny in-process W3C WebDriver/hub stand-in for exercising the async engine without a browser
+# Pages are described as dicts keyed by URL:
+# {
+#     "https://app.example.com": {
+#         "title": "Example App",
+#         "text": "Welcome",
+#         "elements": {("css selector", '[id="login"]'): {"text": "Log in", "attributes": {"href": "/login"}, "href": "https://app.example.com/login"}},
+#         "redirect": "https://login.example.com",   # URL the browser ends up on after loading this page
+#         "logs": [...]                              # Chrome performance log entries returned after the load
+#     }
+# }
+# Clicking an element with an href opens that URL
+STUB_USER_AGENT = "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/92.0.4515.107 Safari/537.36"
+# Only the PNG signature and header, enough for code that stores the screenshot string
+STUB_SCREENSHOT = base64.b64encode(bytes.fromhex("89504e470d0a1a0a0000000d4948445200000001000000010806000000")).decode()
+
+class StubWebDriver():
+    def __init__(self, pages=None, latency=0, host="127.0.0.1", port=0):
+        self.pages = pages or {}
+        self.latency = latency
+        self.host = host
+        self.port = port
+        self.sessions = {}
+        self.elements = {}
+        self.ids = itertools.count(1)
+        self.counters = {'requests': 0, 'connections': 0}
+        self.writers = set()
+
+    @property
+    def url(self):
+        return "http://{0}:{1}/wd/hub".format(self.host, self.port)
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        self.server.close()
+        for writer in list(self.writers):
+            writer.close()
+        await self.server.wait_closed()
+
+    async def handle(self, reader, writer):
+        self.counters['connections'] += 1
+        self.writers.add(writer)
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line: break
+                method, path, _ = request_line.decode('latin-1').split(' ', 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""): break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get('content-length', 0)))
+                payload = json.loads(body.decode('utf-8')) if body else {}
+                self.counters['requests'] += 1
+                if self.latency: await asyncio.sleep(self.latency)
+                status, value = self.route(method, path, payload)
+                # The Grid 3 API answers with a plain object, WebDriver commands wrap it in "value"
+                data = json.dumps(value if path.startswith("/grid/api/") else {"value": value}).encode('utf-8')
+                writer.write("HTTP/1.1 {0} OK\r\nContent-Type: application/json\r\nContent-Length: {1}\r\n\r\n".format(status, len(data)).encode('latin-1') + data)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            pass
+        finally:
+            self.writers.discard(writer)
+            writer.close()
+
+    def error(self, error, message="", status=404):
+        return status, {"error": error, "message": message}
+
+    def element(self, session, spec):
+        element_id = "element-{0}".format(next(self.ids))
+        self.elements[element_id] = spec
+        return {"element-6066-11e4-a52e-4f735466cecf": element_id}
+
+    def load(self, session, url):
+        page = self.pages.get(url, {})
+        session['url'] = page.get('redirect', url)
+        session['logs'] = session.get('logs', []) + page.get('logs', [])
+
+    def route(self, method, path, payload):
+        if path.startswith("/grid/api/testsession"):
+            return 200, {"proxyId": "http://127.0.0.1:5555", "success": True}
+        match = re.match(r'^/wd/hub/session(?:/([^/]+))?(/.*)?$', path)
+        if not match: return self.error("unknown command", path)
+        session_id, command = match.group(1), match.group(2) or ""
+        if session_id == None and method == "POST":
+            session_id = "stub-{0}".format(next(self.ids))
+            self.sessions[session_id] = {"url": "about:blank"}
+            return 200, {"sessionId": session_id, "capabilities": payload.get('capabilities', {}).get('alwaysMatch', {})}
+        session = self.sessions.get(session_id)
+        if session == None: return self.error("invalid session id", status=404)
+        page = self.pages.get(session['url'], {"title": "", "text": ""})
+        if command == "" and method == "DELETE":
+            del self.sessions[session_id]
+            return 200, None
+        if command == "/url":
+            if method == "GET": return 200, session['url']
+            self.load(session, payload['url'])
+            if self.pages.get(payload['url'], {}).get('timeout'): return self.error("timeout", "Page load timeout", 500)
+            return 200, None
+        if command == "/se/log":
+            logs, session['logs'] = session.get('logs', []), []
+            return 200, logs
+        if command == "/title": return 200, page.get('title', '')
+        if command == "/source": return 200, "<html><head></head><body>{0}</body></html>".format(page.get('text', ''))
+        if command == "/execute/sync":
+            script = payload.get('script', '')
+            if "navigator.userAgent" in script: return 200, STUB_USER_AGENT
+            if "page probe" in script:
+                return 200, {"title": page.get('title', ''), "url": session['url'], "toast": page.get('toast'), "neterror": page.get('neterror'), "body": page.get('text', ''), "heading": page.get('heading'), "blank_source": False}
+            return 200, page.get('script')
+        if command in ["/timeouts", "/frame", "/alert/dismiss", "/cookie", "/window"]: return 200, None
+        if command == "/window/handles": return 200, ["window-1"]
+        if command == "/screenshot": return 200, STUB_SCREENSHOT
+        if command in ["/element"] or command.endswith("/element"):
+            if payload.get('value') == "//*": return 200, self.element(session, {"text": page.get('text', '')})
+            spec = page.get('elements', {}).get((payload.get('using'), payload.get('value')))
+            if spec == None: return self.error("no such element", payload.get('value'))
+            return 200, self.element(session, spec)
+        match = re.match(r'^/element/([^/]+)/(text|click|value|attribute|property)(?:/(.+))?$', command)
+        if match:
+            spec = self.elements.get(match.group(1))
+            if spec == None: return self.error("stale element reference")
+            if match.group(2) == "text": return 200, spec.get('text', '')
+            if match.group(2) == "value":
+                spec.setdefault('attributes', {})['value'] = spec.get('attributes', {}).get('value', '') + payload.get('text', '')
+                return 200, None
+            if match.group(2) in ["attribute", "property"]: return 200, spec.get('attributes', {}).get(match.group(3))
+            if spec.get('href'): self.load(session, spec['href'])
+            return 200, None
+        return self.error("unknown command", command)
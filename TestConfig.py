@@ -1,23 +1,278 @@
+from types import MappingProxyType
 import os
 import configparser
+import threading
 
+# Default for every setting, the settings file and then environment variables override them
+DEFAULTS = {
+    'SeleniumHub': {
+        'protocol': 'http',
+        'host': 'localhost',
+        'port': '4444',
+        'api': 'auto',
+        'api_timeout': '5'
+    },
+    'BrowserSettings': {
+        'sitelist': ''
+    },
+    'UserInfo': {
+        'email': ''
+    },
+    'TestRunner': {
+        'workers': '1'
+    },
+    'SessionPool': {
+        'prewarm': '',
+        'prewarm_count': '1',
+        'max_uses': '0',
+        'max_age': '0',
+        'health_check': 'true',
+        'isolation': 'reset'
+    },
+    'AsyncEngine': {
+        'concurrency': '50',
+        'connections': '0',
+        'hub_margin': '10'
+    },
+    'Waits': {
+        'strategy': 'script',
+        'poll_min': '0.05',
+        'poll_max': '0.5',
+        'title_timeout': '2',
+        'specific_title_timeout': '5',
+        'alert_timeout': '5',
+        'element_timeout': '10',
+        'page_load_timeout': '30'
+    },
+    'NetworkLog': {
+        'max_events': '1000'
+    },
+    'DNS': {
+        'ttl': '300',
+        'negative_ttl': '60',
+        'timeout': '2',
+        'workers': '8'
+    },
+    'Results': {
+        'sinks': '',
+        'keep_attachments': 'true',
+        'file_path': 'results.json',
+        'file_max_bytes': '10485760',
+        'file_backups': '5',
+        'hec_url': '',
+        'hec_token': '',
+        'hec_index': '',
+        'hec_sourcetype': '',
+        'hec_source': '',
+        'hec_host': '',
+        'hec_batch_size': '50',
+        'hec_flush_interval': '2',
+        'hec_queue_size': '1000',
+        'hec_retries': '3',
+        'hec_timeout': '10',
+        'hec_block_timeout': '5',
+        'hec_gzip': 'true',
+        'hec_verify': 'true'
+    },
+    'Screenshots': {
+        'path': '',
+        'format': 'jpeg',
+        'quality': '70',
+        'max_width': '1280',
+        'retention_days': '30',
+        'max_mb': '1024',
+        'url_prefix': ''
+    },
+    'Scheduler': {
+        'adaptive': 'false',
+        'interval': '0',
+        'app_budget': '0',
+        'budget_factor': '3',
+        'min_budget': '30',
+        'step_factor': '2',
+        'max_step_timeout': '60',
+        'default_duration': '10',
+        'window': '50',
+        'min_samples': '5'
+    },
+    'History': {
+        'path': '',
+        'window': '100',
+        'min_samples': '10',
+        'retention_days': '30',
+        'z_threshold': '3',
+        'min_delta': '0.5'
+    },
+    'HttpCheck': {
+        'enabled': 'false',
+        'fallback': 'true',
+        'workers': '20',
+        'timeout': '30',
+        'verify': 'false',
+        'max_redirects': '10',
+        'auth': 'negotiate'
+    },
+    'HealthCheck': {
+        'max_failures': '100'
+    },
+    'Instrumentation': {
+        'enabled': 'false',
+        'spans_path': '',
+        'span_detail': 'step',
+        'service_name': 'splunk_web_transactions_generator'
+    },
+    'Trace': {
+        'level': 'info',
+        'max_entries': '200',
+        'max_chars': '500',
+        'include_failures': 'false'
+    },
+    'KVStore': {
+        'url': 'https://localhost:8089',
+        'app': 'search',
+        'collection': '',
+        'owner': 'nobody',
+        'token': '',
+        'token_type': 'Bearer',
+        'page_size': '500',
+        'cache_path': '',
+        'verify': 'false',
+        'changed_field': '',
+        'timeout': '30'
+    },
+    'PageClassifier': {
+        'rules_path': '',
+        'disabled': ''
+    },
+    'SSO': {
+        'hosts': 'login.microsoftonline.com',
+        'batch': 'false',
+        'timeout': '10'
+    },
+    'Daemon': {
+        'interval': '300',
+        'interval_field': 'INTERVAL',
+        'min_interval': '30',
+        'jitter': '0.1',
+        'reload_interval': '60',
+        'shutdown_timeout': '120',
+        'batch_window': '30'
+    }
+}
+
+# The settings file is an explicit path, then the file named by WEB_TRANSACTIONS_SETTINGS, then a settings.conf next to the package
+# The package directory is only ever read, copy settings.example.conf to start a settings file
 configfile_path = os.path.join(os.path.dirname(__file__), "settings.conf")
-TestSettings = configparser.ConfigParser()
-
-# Create configuration file if it doesn't exist
-if not os.path.isfile(configfile_path):
-    cfgfile = open(configfile_path, 'w')
-
-    # Add Sections and default settings to the file
-    TestSettings.add_section('SeleniumHub')
-    TestSettings.set('SeleniumHub', 'protocol', 'http')
-    TestSettings.set('SeleniumHub', 'host', 'localhost')
-    TestSettings.set('SeleniumHub', 'port', '4444')
-    TestSettings.add_section('BrowserSettings')
-    TestSettings.set('BrowserSettings', 'sitelist', '')
-    TestSettings.add_section('UserInfo')
-    TestSettings.set('UserInfo', 'email', '')
-    TestSettings.write(cfgfile)
-    cfgfile.close()
-else:
-    TestSettings.read(configfile_path)
\ No newline at end of file
+SETTINGS_ENV = "WEB_TRANSACTIONS_SETTINGS"
+# Single settings as WEB_TRANSACTIONS_<SECTION>__<OPTION>, e.g. WEB_TRANSACTIONS_SELENIUMHUB__HOST=grid.example.com
+OVERRIDE_PREFIX = "WEB_TRANSACTIONS_"
+
+# A setting is typed by its default: true or false is a boolean, a number is an int or a float, anything else a string
+def settingType(default):
+    if default.lower() in ['true', 'false']: return bool
+    try:
+        float(default)
+    except ValueError:
+        return str
+    return float
+
+# Check every setting in DEFAULTS against the type of its default, so a bad value fails when loading and names the setting
+def checkSettings(parser):
+    for section in DEFAULTS:
+        for option, default in DEFAULTS[section].items():
+            kind = settingType(default)
+            try:
+                if kind == bool: parser.getboolean(section, option)
+                elif kind == float: parser.getfloat(section, option)
+            except ValueError:
+                raise ValueError("Setting [{0}] {1} must be {2}, got {3!r}".format(section, option, "true or false" if kind == bool else "a number", parser.get(section, option)))
+
+class Settings():
+    # Read-only settings with the configparser getters, loaded once and replaced as a whole by loadSettings
+    def __init__(self, parser, path=None):
+        checkSettings(parser)
+        self._parser = parser
+        self.path = path
+
+    def get(self, section, option, fallback=None):
+        return self._parser.get(section, option, fallback=fallback)
+
+    def getint(self, section, option, fallback=None):
+        return self._parser.getint(section, option, fallback=fallback)
+
+    def getfloat(self, section, option, fallback=None):
+        return self._parser.getfloat(section, option, fallback=fallback)
+
+    def getboolean(self, section, option, fallback=None):
+        return self._parser.getboolean(section, option, fallback=fallback)
+
+    def has_section(self, section):
+        return self._parser.has_section(section)
+
+    def has_option(self, section, option):
+        return self._parser.has_option(section, option)
+
+    def sections(self):
+        return self._parser.sections()
+
+    def section(self, section):
+        return MappingProxyType(dict(self._parser.items(section)) if self._parser.has_section(section) else {})
+
+def settingsPath(path=None):
+    if path: return path
+    if os.environ.get(SETTINGS_ENV): return os.environ[SETTINGS_ENV]
+    return configfile_path if os.path.isfile(configfile_path) else None
+
+def environmentOverrides(parser, environ):
+    sections = dict((section.lower(), section) for section in parser.sections())
+    for name, value in environ.items():
+        if not name.startswith(OVERRIDE_PREFIX) or "__" not in name: continue
+        section, option = name[len(OVERRIDE_PREFIX):].split("__", 1)
+        section = sections.get(section.lower(), section)
+        if not parser.has_section(section): parser.add_section(section)
+        parser.set(section, option.lower(), value)
+
+# Defaults, the settings file and the environment, an explicit path that doesn't exist is an error
+def readSettings(path=None, environ=None):
+    parser = configparser.ConfigParser()
+    parser.read_dict(DEFAULTS)
+    path = settingsPath(path)
+    if path:
+        with open(path) as f:
+            parser.read_file(f, path)
+    environmentOverrides(parser, os.environ if environ == None else environ)
+    return Settings(parser, path)
+
+_settings = None
+_settings_lock = threading.Lock()
+
+_reload_hooks = []
+
+# Modules that build shared objects from the settings register a function here that drops them,
+# so the objects are built again from the new settings on their next use
+def onReload(function):
+    _reload_hooks.append(function)
+    return function
+
+# Replace the settings, e.g. with another file, shared objects built from the old ones are rebuilt on next use
+def loadSettings(path=None, environ=None):
+    global _settings
+    settings = readSettings(path, environ)
+    with _settings_lock:
+        _settings = settings
+    for function in list(_reload_hooks):
+        function()
+    return settings
+
+def settings():
+    global _settings
+    with _settings_lock:
+        if _settings == None: _settings = readSettings()
+        return _settings
+
+class LazySettings():
+    # Stands in for the settings at import time, nothing is read until the first lookup
+    def __getattr__(self, name):
+        return getattr(settings(), name)
+
+TestSettings = LazySettings()
@@ -0,0 +1,104 @@
+from collections import namedtuple
+from functools import lru_cache
+from types import MappingProxyType
+from .Waits import LOCATORS, STRATEGIES
+from .HealthCheck import healthCheckRule
+import json, re
+
+class PlanError(ValueError):
+    pass
+
+# A validated step, info holds the step's fields plus its description and is passed to the handler as keyword arguments
+Step = namedtuple('Step', ['index', 'command', 'handler', 'enabled', 'info', 'pattern', 'locator', 'wait_timeout', 'wait_strategy', 'check'])
+
+# Command: (handler method, required fields, description)
+COMMANDS = {
+    'Open': ('go_to_url', ['url'], lambda s: "Go to url {0}".format(s["url"])),
+    'Verify title': ('check_title', ['assert', 'title_expected'], lambda s: "{0} {1} \"{2}\"".format(s["command"], s["assert"], s["title_expected"])),
+    'Find': ('find_element', ['element_name', 'element_value'], lambda s: "{0} element with {1} \"{2}\"".format(s["command"], s["element_name"], s["element_value"])),
+    'FindText': ('find_text_in_element', ['assert', 'expected_text'], lambda s: 'Find text "{0}"'.format(s["expected_text"])),
+    'Click': ('click_element', ['element_name', 'element_value'], lambda s: "{0} element with {1} \"{2}\"".format(s["command"], s["element_name"], s["element_value"])),
+    'Type': ('enter_text', ['text'], lambda s: "Enter text \"{0}\"".format(s.get('text'))),
+    'Health': ('health_check', [], lambda s: "Evaluate Health Check results"),
+    'HealthCheck': ('health_check_v2', [], lambda s: "Evaluate Health Check results"),
+    'Switch to': ('switch_to', ['element_name', 'element_value'], lambda s: "{0} {1} with name \"{2}\"".format(s["command"], s["element_name"], s["element_value"])),
+    'Wait': ('wait_for_it', ['seconds'], lambda s: "Wait {0} seconds".format(s["seconds"])),
+    'Get attribute': ('get_current_element_attribute', ['attribute'], lambda s: "Get \"{0}\" attribute of current element".format(s.get("attribute")))
+}
+
+# Required fields that may be empty, e.g. typing nothing into a field
+EMPTY_ALLOWED = ['text', 'expected_text']
+
+# Steps matched against a regular expression unless assert is "equals"
+PATTERN_FIELDS = {'Verify title': 'title_expected', 'FindText': 'expected_text'}
+
+def compileStep(index, step):
+    def invalid(message):
+        return PlanError("Step {0} ({1}): {2}".format(index + 1, step.get('command') if isinstance(step, dict) else step, message))
+
+    if not isinstance(step, dict): raise invalid("not an object")
+    try:
+        enabled = int(step.get('enabled', 0)) == 1
+    except (TypeError, ValueError):
+        raise invalid("enabled must be 0 or 1")
+    command = step.get('command')
+    # Disabled steps are only reported as skipped, there is nothing to validate
+    if not enabled: return Step(index, command, None, False, MappingProxyType(dict(step)), None, None, None, None, None)
+    if command not in COMMANDS: raise invalid("unknown command")
+    handler, required, describe = COMMANDS[command]
+    missing = [field for field in required if step.get(field) == None or (step.get(field) == '' and field not in EMPTY_ALLOWED)]
+    if missing: raise invalid("missing {0}".format(', '.join(missing)))
+
+    pattern = None
+    if command in PATTERN_FIELDS and step.get('assert') != "equals":
+        try:
+            pattern = re.compile(str(step[PATTERN_FIELDS[command]]).lower())
+        except re.error as e:
+            raise invalid("invalid regular expression: {0}".format(e))
+
+    locator = None
+    if command in ['Find', 'Click']:
+        if step['element_name'] not in LOCATORS: raise invalid("unknown locator {0}".format(step['element_name']))
+        locator = (step['element_name'], step['element_value'])
+    elif command == 'Switch to' and step['element_name'] == "Frame":
+        locator = ("name", step['element_value'])
+
+    if command == 'Wait':
+        try:
+            int(step['seconds'])
+        except (TypeError, ValueError):
+            raise invalid("seconds must be a whole number")
+
+    wait_timeout = None
+    if step.get('wait_timeout') not in [None, '']:
+        try:
+            wait_timeout = float(step['wait_timeout'])
+        except (TypeError, ValueError):
+            raise invalid("wait_timeout must be a number")
+    wait_strategy = step.get('wait_strategy') or None
+    if wait_strategy != None and wait_strategy not in STRATEGIES: raise invalid("wait_strategy must be one of {0}".format(", ".join(STRATEGIES)))
+
+    check = None
+    if command in ['Health', 'HealthCheck']:
+        try:
+            check = healthCheckRule(command, step)
+        except ValueError as e:
+            raise invalid(str(e))
+
+    info = dict(step)
+    info['description'] = describe(step)
+    return Step(index, command, handler, True, MappingProxyType(info), pattern, locator, wait_timeout, wait_strategy, check)
+
+@lru_cache(maxsize=1024)
+def compileRecord(record):
+    tests = json.loads(record)
+    if not isinstance(tests, list): raise PlanError("TESTS must be a list of steps")
+    return tuple(compileStep(index, step) for index, step in enumerate(tests))
+
+# Compile the TESTS of a KVStore record once, identical step lists share the same plan
+def compilePlan(app):
+    try:
+        record = json.dumps(app.get('TESTS'), sort_keys=True)
+    except (TypeError, ValueError):
+        raise PlanError("TESTS is not valid JSON")
+    return compileRecord(record)
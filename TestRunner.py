@@ -0,0 +1,124 @@
+from concurrent.futures import ThreadPoolExecutor
+from .TestBuilder import TestSuite, TestGenerator, TestResults, launchBrowser, getEnvironmentDetails, httpPreflight
+from .TestPlan import compilePlan
+from .HttpCheck import httpChecker
+from .TestConfig import TestSettings
+from .SessionPool import SessionPool
+from .Scheduler import scheduler
+from .SingleSignOn import SignInBatch, authDomains, batchApps
+from .ResultSinks import resultSink
+from .PageClassifier import pageClassifier
+import threading
+
+class TestRunner():
+    def __init__(self, workers=None, screenshot_always=False, pool=None):
+        # Number of concurrent WebDriver sessions, defaults to the [TestRunner] section of settings.conf
+        self.workers = workers if workers else TestSettings.getint('TestRunner', 'workers', fallback=1)
+        self.screenshot_always = screenshot_always
+        # Sessions are shared between workers through the pool, one session per worker at a time
+        self.pool = pool if pool else SessionPool(launchBrowser, getEnvironmentDetails)
+        self.local = threading.local()
+        resultSink()
+        pageClassifier()
+
+    # Each worker thread gets its own TestSuite instance
+    def get_suite(self):
+        suite = getattr(self.local, 'suite', None)
+        if suite == None:
+            suite = TestSuite()
+            suite.current_element = False
+            suite.pool = self.pool
+            self.local.suite = suite
+        return suite
+
+    def run_app(self, app):
+        suite = self.get_suite()
+        suite.test = None
+        try:
+            # run() has already tried the HTTP pre-flight
+            TestGenerator(app, self.screenshot_always, preflight=False)(suite)
+            results = suite.test.results
+        except Exception as e:
+            results = self.failed_results(app, e)
+        try:
+            suite.tearDown()
+        except Exception:
+            pass
+        return results
+
+    # Apps behind the same sign in, run back to back in one session that signs in once before the first of them
+    def run_batch(self, apps):
+        if len(apps) == 1: return [self.run_app(apps[0])]
+        try:
+            session = self.pool.acquire(apps[0].get('BROWSER'))
+        except Exception:
+            # Without a warm session each app gets its own from the pool
+            return [self.run_app(app) for app in apps]
+        suite = self.get_suite()
+        suite.batch = SignInBatch(session, authDomains().domain(apps[0]), len(apps))
+        try:
+            suite.batch.sign_in(apps[0].get('URL'))
+            return [self.run_app(app) for app in apps]
+        finally:
+            session = suite.batch.session
+            suite.batch = None
+            # Apps in the group only got the "sso" reset, the identity provider's cookies must not reach the next app from the pool
+            if session != None:
+                try:
+                    session.reset("reset")
+                    self.pool.release(session)
+                except Exception:
+                    self.pool.release(session, discard=True)
+
+    def failed_results(self, app, error):
+        test = TestResults({}, app)
+        test.results['results']['status'] = "Failed"
+        test.results['results']['error'] = "Unable to run test: {0}".format(error)
+        test.WriteResults()
+        return test.results
+
+    # Results of an app that passed over plain HTTP, None when it still needs a browser
+    def preflight(self, app):
+        try:
+            test = httpPreflight(app, compilePlan(app))
+        except Exception:
+            # Invalid plans and anything unexpected are left to the browser test to report
+            return None
+        return test.results if test != None else None
+
+    def prewarm(self, apps):
+        browsers = {}
+        for app in apps:
+            browsers[app.get('BROWSER')] = browsers.get(app.get('BROWSER'), 0) + 1
+        for browser, count in browsers.items():
+            self.pool.prewarm(browser, min(count, self.workers))
+
+    # Run all apps and return their results in the same order as the apps list
+    def run(self, apps):
+        try:
+            scheduler().start_run()
+            results = [None] * len(apps)
+            # Health check apps are tried over plain HTTP first, many at a time, without taking a browser
+            checker = httpChecker()
+            if checker != None:
+                with ThreadPoolExecutor(max_workers=checker.workers) as executor:
+                    results = list(executor.map(self.preflight, apps))
+            # Slow and flaky apps start first, results still come back in the caller's order
+            order = [index for index in scheduler().order(apps) if results[index] == None]
+            self.prewarm([apps[index] for index in order])
+            # With [SSO] batch set, apps behind the same sign in and browser run as one item
+            items = batchApps(apps, order)
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                for indexes, batch in zip(items, executor.map(self.run_batch, [[apps[index] for index in indexes] for indexes in items])):
+                    for index, result in zip(indexes, batch):
+                        results[index] = result
+            return results
+        finally:
+            self.close()
+
+    def close(self):
+        self.pool.close()
+        self.local = threading.local()
+
+def runTests(apps, workers=None, screenshot_always=False):
+    return TestRunner(workers, screenshot_always).run(apps)
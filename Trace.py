@@ -0,0 +1,55 @@
+from collections import deque
+from .TestConfig import TestSettings
+import time
+
+LEVELS = {'debug': 10, 'info': 20, 'error': 40}
+
+class TraceBuffer():
+    # Step messages of one app, kept as the format string and its arguments and only formatted when read
+    # The newest max_entries messages are kept, each argument is cut to max_chars once formatted
+    def __init__(self, debug=False, level=None, max_entries=None, max_chars=None, include_failures=None):
+        self.include_failures = include_failures if include_failures != None else TestSettings.getboolean('Trace', 'include_failures', fallback=False)
+        # Nothing reads the trace unless the app is debugged or failures carry it, then appending is a single check
+        self.enabled = debug or self.include_failures
+        level = 'debug' if debug else (level if level else TestSettings.get('Trace', 'level', fallback='info'))
+        self.level = LEVELS.get(level.lower(), LEVELS['info'])
+        self.max_chars = max_chars if max_chars != None else TestSettings.getint('Trace', 'max_chars', fallback=500)
+        self.entries = deque(maxlen=max_entries if max_entries else TestSettings.getint('Trace', 'max_entries', fallback=200))
+        self.dropped = 0
+        self.start = time.time()
+
+    def add(self, level, message, args):
+        if not self.enabled or level < self.level: return
+        if len(self.entries) == self.entries.maxlen: self.dropped += 1
+        self.entries.append((time.time(), level, message, args))
+
+    def debug(self, message, *args):
+        self.add(10, message, args)
+
+    def append(self, message, *args):
+        self.add(20, message, args)
+
+    def error(self, message, *args):
+        self.add(40, message, args)
+
+    def truncate(self, value):
+        text = str(value)
+        if self.max_chars and len(text) > self.max_chars: return "{0}... ({1} characters)".format(text[:self.max_chars], len(text))
+        return text
+
+    def format(self, message, args):
+        if not args: return self.truncate(message)
+        return str(message).format(*[self.truncate(arg) for arg in args])
+
+    def lines(self):
+        lines = ["[+{0:.3f}s] {1}".format(t - self.start, self.format(message, args)) for t, level, message, args in self.entries]
+        if self.dropped: lines.insert(0, "({0} earlier messages dropped)".format(self.dropped))
+        return lines
+
+    def __len__(self):
+        return len(self.entries)
+
+    # Add the trace to a failed transaction when [Trace] include_failures is set
+    def attach(self, results):
+        if self.include_failures and results['results'].get('status') in ["Failed", "Debug"]:
+            results['results']['trace'] = self.lines()
@@ -0,0 +1,120 @@
+from selenium.common.exceptions import TimeoutException
+from selenium.common.exceptions import NoSuchElementException
+from selenium.common.exceptions import WebDriverException
+from selenium.common.exceptions import UnexpectedAlertPresentException
+from selenium.webdriver.common.by import By
+from .TestConfig import TestSettings
+import time
+
+LOCATORS = {
+    "id": By.ID,
+    "xpath": By.XPATH,
+    "link_text": By.LINK_TEXT,
+    "partial_link_text": By.PARTIAL_LINK_TEXT,
+    "name": By.NAME,
+    "tag_name": By.TAG_NAME,
+    "class_name": By.CLASS_NAME,
+    "css_selector": By.CSS_SELECTOR
+}
+
+# Runs a condition inside the browser and resolves as soon as it returns a value,
+# re-checking on DOM mutations instead of polling from the hub
+WATCH_SCRIPT = """
+var args = arguments[0], timeout = arguments[1], done = arguments[arguments.length - 1];
+var finished = false, observer = null, timer = null;
+function check(args) { CONDITION }
+function finish(value) {
+    if (finished) return;
+    finished = true;
+    if (observer) observer.disconnect();
+    if (timer) clearTimeout(timer);
+    done(value);
+}
+function test() {
+    try {
+        var value = check(args);
+        if (value !== null && value !== undefined && value !== false) finish(value);
+    } catch (e) {}
+}
+test();
+if (!finished) {
+    observer = new MutationObserver(test);
+    observer.observe(document, {childList: true, subtree: true, characterData: true, attributes: true});
+    timer = setTimeout(function() { finish(null); }, timeout);
+}
+"""
+
+TITLE_CONDITION = "return document.title.length > 0 ? document.title : null;"
+
+TITLE_CONTAINS_CONDITION = "var title = document.title; return title.toLowerCase().indexOf(args[0]) >= 0 ? title : null;"
+
+ELEMENT_CONDITION = """
+var name = args[0], value = args[1], i, links;
+if (name == "id") return document.getElementById(value);
+if (name == "name") return document.getElementsByName(value)[0] || null;
+if (name == "class_name") return document.getElementsByClassName(value)[0] || null;
+if (name == "tag_name") return document.getElementsByTagName(value)[0] || null;
+if (name == "css_selector") return document.querySelector(value);
+if (name == "xpath") return document.evaluate(value, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+links = document.getElementsByTagName("a");
+for (i = 0; i < links.length; i++) {
+    var text = (links[i].innerText || "").trim();
+    if (name == "link_text" && text == value) return links[i];
+    if (name == "partial_link_text" && text.indexOf(value) >= 0) return links[i];
+}
+return null;
+"""
+
+# [Waits] strategy and a step's wait_strategy
+STRATEGIES = ["script", "backoff", "fixed"]
+
+def found(value):
+    return value is not None and value is not False
+
+# Poll from the client, starting fast and backing off towards poll_max
+def pollUntil(driver, check, timeout, strategy=None, ignored=()):
+    strategy = strategy or TestSettings.get('Waits', 'strategy', fallback='script')
+    poll_min = TestSettings.getfloat('Waits', 'poll_min', fallback=0.05)
+    poll_max = TestSettings.getfloat('Waits', 'poll_max', fallback=0.5)
+    interval = poll_max if strategy == "fixed" else poll_min
+    end = time.time() + timeout
+    while True:
+        try:
+            value = check(driver)
+            if found(value): return value
+        except ignored:
+            pass
+        remaining = end - time.time()
+        if remaining <= 0: raise TimeoutException("Condition not met after {0} seconds".format(timeout))
+        time.sleep(min(interval, remaining))
+        interval = min(interval * 1.5, poll_max)
+
+# Wait for a condition in the browser with one round trip, falling back to polling
+# if the script can't run, e.g. because the page navigated while it was waiting
+def waitUntil(driver, condition, args, check, timeout, strategy=None, ignored=()):
+    strategy = strategy or TestSettings.get('Waits', 'strategy', fallback='script')
+    if strategy == "script":
+        start = time.time()
+        try:
+            # The script resolves itself at the deadline, the driver timeout is only a safety net
+            if getattr(driver, 'wait_script_timeout', 0) < timeout + 1:
+                driver.set_script_timeout(timeout + 1)
+                driver.wait_script_timeout = timeout + 1
+            value = driver.execute_async_script(WATCH_SCRIPT.replace("CONDITION", condition), args, int(timeout * 1000))
+            if found(value): return value
+            raise TimeoutException("Condition not met after {0} seconds".format(timeout))
+        except (TimeoutException, UnexpectedAlertPresentException):
+            raise
+        except WebDriverException:
+            timeout = max(timeout - (time.time() - start), 0)
+        strategy = "backoff"
+    return pollUntil(driver, check, timeout, strategy, ignored)
+
+def waitForTitle(driver, timeout, strategy=None):
+    return waitUntil(driver, TITLE_CONDITION, [], lambda d: d.title or None, timeout, strategy)
+
+def waitForTitleContaining(driver, title, timeout, strategy=None):
+    return waitUntil(driver, TITLE_CONTAINS_CONDITION, [title.lower()], lambda d: d.title if title.lower() in d.title.lower() else None, timeout, strategy)
+
+def waitForElement(driver, name, value, timeout, strategy=None):
+    return waitUntil(driver, ELEMENT_CONDITION, [name, value], lambda d: d.find_element(LOCATORS.get(name), value), timeout, strategy, (NoSuchElementException,))
@@ -1,3 +1,26 @@
-from .TestBuilder import TestSuite, TestGenerator
+import importlib
 
-__version__ = '2.0.0'
\ No newline at end of file
+__version__ = '2.0.0'
+
+# Exported names and their modules, imported on first use so that reading plans or results doesn't load Selenium
+# TestRunner is the class, it replaces the module of the same name on first use. The package's own modules import it
+# with "from . import TestRunner" so they don't bind the module first. SessionPool and Daemon name their modules
+_EXPORTS = {
+    'TestSuite': 'TestBuilder',
+    'TestGenerator': 'TestBuilder',
+    'TestRunner': 'TestRunner',
+    'runTests': 'TestRunner',
+    'AsyncTestEngine': 'AsyncEngine',
+    'runTestsAsync': 'AsyncEngine',
+    'runDaemon': 'Daemon'
+}
+__all__ = list(_EXPORTS)
+
+def __getattr__(name):
+    if name not in _EXPORTS: raise AttributeError("module {0!r} has no attribute {1!r}".format(__name__, name))
+    value = getattr(importlib.import_module("." + _EXPORTS[name], __name__), name)
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(set(globals()) | set(_EXPORTS))
@@ -0,0 +1,12 @@
+import importlib, os, sys
+
+# The package is the repository directory, imported by its name from the directory above
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PACKAGE = os.path.basename(ROOT)
+sys.path.insert(0, os.path.dirname(ROOT))
+
+# Tests run against the example settings, not a local settings.conf
+os.environ['WEB_TRANSACTIONS_SETTINGS'] = os.path.join(ROOT, 'settings.example.conf')
+
+def packageModule(name):
+    return importlib.import_module("{0}.{1}".format(PACKAGE, name))
@@ -0,0 +1,156 @@
+import asyncio, pytest
+from conftest import packageModule
+
+AsyncEngine = packageModule('AsyncEngine')
+AsyncWebDriver = packageModule('AsyncWebDriver')
+StubWebDriver = packageModule('StubWebDriver')
+FakeDriver = packageModule('FakeDriver')
+SingleSignOn = packageModule('SingleSignOn')
+TestConfig = packageModule('TestConfig')
+
+PAGES = {
+    "https://ok.example.com/": {"title": "OK App", "text": "Welcome home", "elements": {("css selector", '[id="greeting"]'): {"text": "Welcome home"}}},
+    "https://error.example.com/": {"title": "500 Internal Server Error", "text": ""},
+    "https://health.example.com/": {"title": "", "text": '{"isHealthy": true, "entries": {}}'},
+    "https://slow.example.com/": {"title": "", "text": "", "timeout": True}
+}
+
+def app(item_id, url, *steps):
+    return {"ITEM_ID": item_id, "URL": url, "BROWSER": "Chrome", "TESTS": [dict({"command": "Open", "url": url, "enabled": 1})] + [dict(step, enabled=1) for step in steps]}
+
+APPS = [
+    app("ok", "https://ok.example.com/", {"command": "Find", "element_name": "id", "element_value": "greeting"}, {"command": "FindText", "assert": "contains", "expected_text": "welcome"}),
+    app("missing", "https://ok.example.com/", {"command": "Find", "element_name": "id", "element_value": "nothing", "wait_timeout": 0.2}),
+    app("error", "https://error.example.com/"),
+    app("health", "https://health.example.com/", {"command": "HealthCheck"}),
+    app("slow", "https://slow.example.com/"),
+    {"ITEM_ID": "invalid", "URL": "https://ok.example.com/", "BROWSER": "Chrome", "TESTS": [{"command": "Dance", "enabled": 1}]}
+]
+
+def test_engine_runs_apps_against_the_stub():
+    async def main():
+        stub = await StubWebDriver.StubWebDriver(PAGES).start()
+        try:
+            results = await AsyncEngine.AsyncTestEngine(concurrency=3, hub=stub.url).run(APPS)
+        finally:
+            await stub.stop()
+        return results, stub
+    results, stub = asyncio.run(main())
+    assert [result['application']['item_id'] for result in results] == [app['ITEM_ID'] for app in APPS]
+    statuses = dict((result['application']['item_id'], result['results']['status']) for result in results)
+    assert statuses == {"ok": "Passed", "missing": "Failed", "error": "Failed", "health": "Passed", "slow": "Failed", "invalid": "Failed"}
+    assert [test['status'] for test in results[0]['tests']] == ["Passed", "Passed", "Passed"]
+    assert results[4]['results']['error'].startswith("Timeout")
+    assert results[5]['results']['error'].startswith("Invalid test plan")
+    # Sessions are reused between apps and all quit at the end
+    assert stub.sessions == {}
+
+def test_hub_timeout_is_not_retried():
+    async def main():
+        stub = await StubWebDriver.StubWebDriver(PAGES).start()
+        client = AsyncWebDriver.HubClient(stub.url, timeout=0.1)
+        try:
+            session = await AsyncWebDriver.AsyncSession.create(client, "Chrome", {})
+            stub.latency = 0.5
+            with pytest.raises(AsyncWebDriver.HubTimeout):
+                await session.get("https://ok.example.com/")
+            await asyncio.sleep(0.5)
+            return stub.counters['requests']
+        finally:
+            await client.close()
+            await stub.stop()
+    assert asyncio.run(main()) == 2
+
+def test_closed_connection_is_retried():
+    async def main():
+        stub = await StubWebDriver.StubWebDriver(PAGES).start()
+        client = AsyncWebDriver.HubClient(stub.url)
+        try:
+            session = await AsyncWebDriver.AsyncSession.create(client, "Chrome", {})
+            # The hub drops the kept-alive connection, the next command goes out again on a new one
+            for writer in list(stub.writers):
+                writer.close()
+            await asyncio.sleep(0.05)
+            assert await session.title() == ""
+            return client.counters['connections'], stub.counters['requests']
+        finally:
+            await client.close()
+            await stub.stop()
+    assert asyncio.run(main()) == (2, 2)
+
+def test_one_connection_per_transaction_by_default():
+    assert AsyncEngine.AsyncTestEngine(concurrency=7, hub="http://hub.example.com/wd/hub").connections == 7
+    assert AsyncEngine.AsyncTestEngine(concurrency=7, connections=3, hub="http://hub.example.com/wd/hub").connections == 3
+
+def test_hub_timeout_is_not_an_element_timeout():
+    find = {"ITEM_ID": "hung", "URL": "https://ok.example.com/", "BROWSER": "Chrome", "TESTS": [
+        {"command": "Find", "element_name": "id", "element_value": "greeting", "wait_timeout": 5, "enabled": 1}]}
+    async def main():
+        stub = await StubWebDriver.StubWebDriver(PAGES).start()
+        engine = AsyncEngine.AsyncTestEngine(concurrency=1, hub=stub.url)
+        engine.client = AsyncWebDriver.HubClient(stub.url, timeout=0.2)
+        try:
+            session = await engine.acquire("Chrome")
+            test = AsyncEngine.AsyncApplicationTest(session, AsyncEngine.TestResults(session.details, find))
+            stub.latency = 0.5
+            results = await test.run(find, AsyncEngine.compilePlan(find))
+            return results, test.isolated
+        finally:
+            await engine.client.close()
+            await stub.stop()
+    results, isolated = asyncio.run(main())
+    assert results['results']['status'] == "Debug"
+    assert results['results']['error'] == "No answer from the hub within 0.2 seconds"
+    assert isolated == False
+
+SSO_PAGES = {
+    "https://sso.example.com/": {"redirect": "https://login.microsoftonline.com/oauth2"},
+    "https://login.microsoftonline.com/oauth2": {"title": "Sign in", "text": "", "elements": {
+        ("xpath", '//*/input[@type="email"]'): {},
+        ("xpath", '//*/input[@type="submit"]'): {"href": "https://sso.example.com/home"}}},
+    "https://sso.example.com/home": {"title": "SSO App", "text": "Signed in", "logs": FakeDriver.performanceLog(3)}
+}
+
+def runStub(pages, main):
+    async def run():
+        stub = await StubWebDriver.StubWebDriver(pages).start()
+        try:
+            return await main(stub)
+        finally:
+            await stub.stop()
+    return asyncio.run(run())
+
+def test_signs_in_and_collects_the_network_log():
+    sso = app("sso", "https://sso.example.com/")
+    async def main(stub):
+        return await AsyncEngine.AsyncTestEngine(concurrency=1, hub=stub.url).run([sso])
+    result = runStub(SSO_PAGES, main)[0]
+    assert result['results']['status'] == "Passed"
+    assert result['tests'][0]['url_loaded'] == "https://sso.example.com/home"
+    assert 'auth_duration' in result['tests'][0]
+    assert result['tests'][0]['network']['requests'] == 3
+    assert SingleSignOn.authDomains().domain(sso) == "login.microsoftonline.com"
+
+def test_dead_idle_session_is_replaced():
+    async def main(stub):
+        engine = AsyncEngine.AsyncTestEngine(concurrency=1, hub=stub.url)
+        engine.client = AsyncWebDriver.HubClient(stub.url)
+        try:
+            first = await engine.acquire("Chrome")
+            await engine.release(first)
+            # The node went away while the session was idle
+            stub.sessions.clear()
+            second = await engine.acquire("Chrome")
+            return first, second, engine.sessions
+        finally:
+            await engine.client.close()
+    first, second, sessions = runStub(PAGES, main)
+    assert second is not first and sessions == [second]
+
+def test_async_engine_rejects_sign_in_batches():
+    try:
+        TestConfig.loadSettings(None, {'WEB_TRANSACTIONS_SSO__BATCH': 'true'})
+        with pytest.raises(ValueError, match="batch"):
+            AsyncEngine.AsyncTestEngine(hub="http://hub.example.com/wd/hub")
+    finally:
+        TestConfig.loadSettings()
@@ -0,0 +1,45 @@
+from conftest import packageModule
+
+Daemon = packageModule('Daemon')
+
+class Runner():
+    workers = 1
+
+    def __init__(self):
+        self.batches = []
+        self.apps = []
+
+    def preflight(self, app):
+        return None
+
+    def run_app(self, app):
+        self.apps.append(app['ITEM_ID'])
+        return {'results': {'status': "Passed"}}
+
+    def run_batch(self, apps):
+        self.batches.append([app['ITEM_ID'] for app in apps])
+        return [{'results': {'status': "Failed" if app['ITEM_ID'] == "b" else "Passed"}} for app in apps]
+
+def app(item_id, domain=None):
+    return {"ITEM_ID": item_id, "URL": "https://{0}.example.com/".format(item_id), "BROWSER": "Chrome", "AUTH_DOMAIN": domain, "TESTS": []}
+
+APPS = [app("a", "login.microsoftonline.com"), app("b", "login.microsoftonline.com"), app("c")]
+
+def test_due_apps_behind_one_sign_in_run_as_a_batch(monkeypatch):
+    monkeypatch.setattr(Daemon, 'batchingEnabled', lambda: True)
+    runner = Runner()
+    daemon = Daemon.Daemon(lambda: APPS, runner=runner, jitter=0)
+    daemon.reload()
+    groups = [daemon.next_apps(), daemon.next_apps()]
+    assert sorted(len(group) for group in groups) == [1, 2]
+    for group in groups:
+        failed = daemon.run_apps([app for due, key, app in group])
+        assert failed == [key == "b:Chrome" for due, key, app in group]
+    assert sorted(runner.batches[0]) == ["a", "b"]
+    assert runner.apps == ["c"]
+
+def test_apps_run_alone_without_batching(monkeypatch):
+    monkeypatch.setattr(Daemon, 'batchingEnabled', lambda: False)
+    daemon = Daemon.Daemon(lambda: APPS, runner=Runner(), jitter=0)
+    daemon.reload()
+    assert len(daemon.next_apps()) == 1
@@ -0,0 +1,35 @@
+import json, pytest
+from conftest import packageModule
+
+HealthCheck = packageModule('HealthCheck')
+FakeDriver = packageModule('FakeDriver')
+SessionPool = packageModule('SessionPool')
+TestRunner = packageModule('TestRunner')
+
+def rule(command, **step):
+    return HealthCheck.healthCheckRule(command, step)
+
+def test_health_check_values_match_exactly():
+    assert rule("HealthCheck").evaluate({"isHealthy": True}).healthy
+    assert rule("HealthCheck").evaluate({"isHealthy": "true"}).healthy
+    assert rule("HealthCheck", value="Healthy").evaluate({"isHealthy": "Healthy"}).healthy
+    assert not rule("HealthCheck", value="Healthy").evaluate({"isHealthy": "healthy"}).healthy
+
+def test_legacy_health_ignores_case():
+    assert rule("Health").evaluate({"entries": [{"isHealthy": "True"}, {"isHealthy": 1}]}).healthy
+    result = rule("Health").evaluate({"entries": [{"isHealthy": True}, {"isHealthy": False, "name": "db"}]})
+    assert not result.healthy and result.failures == [{"path": "$.entries[1].isHealthy", "value": False}]
+
+def test_paths_report_failing_dependencies():
+    result = rule("HealthCheck", paths="$.entries.*.status", expected="Healthy").evaluate({"entries": {"db": {"status": "Healthy"}, "cache": {"status": "Degraded"}}})
+    assert not result.healthy
+    assert result.error == "Health check failed for dependencies: $.entries.cache.status (Degraded)"
+
+@pytest.mark.parametrize("command", ["Health", "HealthCheck"])
+def test_health_step_runs_on_a_selenium_4_driver(command):
+    url = "http://127.0.0.1/health"
+    pages = {url: {"title": "", "text": json.dumps({"isHealthy": True, "entries": [{"isHealthy": True}]})}}
+    pool = SessionPool.SessionPool(lambda browser: FakeDriver.FakeDriver(pages, 0, browser), FakeDriver.fakeEnvironment)
+    app = {"ITEM_ID": "health", "URL": url, "BROWSER": "Chrome", "TESTS": [{"command": "Open", "url": url, "enabled": 1}, {"command": command, "enabled": 1}]}
+    results = TestRunner.TestRunner(workers=1, pool=pool).run([app])[0]
+    assert [test['status'] for test in results['tests']] == ["Passed", "Passed"]
@@ -0,0 +1,86 @@
+import pytest
+from conftest import packageModule
+
+History = packageModule('History')
+Scheduler = packageModule('Scheduler')
+
+APP = {"ITEM_ID": "1", "BROWSER": "Chrome"}
+
+def results(duration, status="Passed"):
+    return {"tests": [{"status": status, "duration": duration}], "results": {"status": status, "duration": duration}}
+
+@pytest.fixture(params=["sqlite", "memory"])
+def history(request, tmp_path):
+    if request.param == "memory":
+        yield Scheduler.MemoryHistory(window=20, min_samples=5)
+        return
+    history = History.SQLiteHistory(str(tmp_path / "history.db"), window=20, min_samples=5)
+    yield history
+    history.close()
+
+def test_percentiles_wait_for_min_samples(history):
+    for duration in [1, 2, 3, 4]:
+        history.record(APP, results(duration))
+    assert history.step_percentile("1", "Chrome", 0, 95) == None
+    history.record(APP, results(5))
+    assert history.step_percentile("1", "Chrome", 0, 95) == 5
+    assert history.app_percentile("1", "Chrome", 50) == 3
+
+def test_percentiles_cover_the_last_window(history):
+    for duration in range(1, 31):
+        history.record(APP, results(duration))
+    # 11 to 30 are kept, nearest rank p95 of 20 samples is the 19th
+    assert history.step_percentile("1", "Chrome", 0, 95) == 29
+    assert history.app_percentile("1", "Chrome", 0) == 11
+
+def test_failure_rate_and_skipped_steps(history):
+    history.record(APP, results(1))
+    history.record(APP, results(1, "Failed"))
+    history.record(APP, {"tests": [{"status": "Skipped"}], "results": {"status": "Skipped", "duration": 0}})
+    assert history.failure_rate("1", "Chrome") == 0.5
+    assert history.failure_rate("2", "Chrome") == 0.0
+
+def test_percentile():
+    assert Scheduler.percentile([], 95) == None
+    assert Scheduler.percentile([3, 1, 2], 0) == 1
+    assert Scheduler.percentile(list(range(1, 21)), 95) == 19
+    assert Scheduler.percentile([5], 50) == 5
+
+def slowHistory(tmp_path):
+    history = History.SQLiteHistory(str(tmp_path / "history.db"), window=20, min_samples=5)
+    for _ in range(10):
+        history.record(APP, results(1.0))
+    return history
+
+def test_regression_is_slow_the_first_time(tmp_path):
+    history = slowHistory(tmp_path)
+    slow = results(2.0)
+    history.record(APP, slow)
+    assert slow['tests'][0]['status'] == "Slow" and slow['results']['status'] == "Slow"
+    assert slow['tests'][0]['baseline']['p50'] == 1.0 and slow['tests'][0]['baseline']['percentile'] == 100.0
+    history.close()
+
+def test_small_or_failed_slowdowns_keep_their_status(tmp_path):
+    history = slowHistory(tmp_path)
+    # Far outside a steady baseline, but less than min_delta above the median
+    close = results(1.2)
+    failed = results(5.0, "Failed")
+    history.record(APP, close)
+    history.record(APP, failed)
+    assert close['tests'][0]['status'] == "Passed" and close['tests'][0]['baseline']['z'] > 3
+    assert failed['tests'][0]['status'] == "Failed"
+    history.close()
+
+def test_history_survives_a_restart(tmp_path):
+    slowHistory(tmp_path).close()
+    history = History.SQLiteHistory(str(tmp_path / "history.db"), window=20, min_samples=5)
+    assert history.step_percentile("1", "Chrome", 0, 95) == 1.0
+    history.close()
+
+def test_memory_history_only_feeds_the_scheduler():
+    history = Scheduler.MemoryHistory(window=20, min_samples=5)
+    for _ in range(10):
+        history.record(APP, results(1.0))
+    slow = results(2.0)
+    history.record(APP, slow)
+    assert slow['tests'][0]['status'] == "Passed" and 'baseline' not in slow['tests'][0]
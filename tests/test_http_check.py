@@ -0,0 +1,44 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from conftest import packageModule
+import threading, pytest
+
+HttpCheck = packageModule('HttpCheck')
+TestBuilder = packageModule('TestBuilder')
+
+class Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = b"not deflate data" if self.path == "/broken" else b'{"isHealthy": true}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        if self.path == "/broken": self.send_header("Content-Encoding", "deflate")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield "http://127.0.0.1:{0}".format(server.server_address[1])
+    server.shutdown()
+    server.server_close()
+
+def results(url):
+    return TestBuilder.TestResults({}, {"ITEM_ID": "1", "URL": url, "BROWSER": "Chrome"})
+
+def test_undecodable_body_fails_the_step(server):
+    test = results(server + "/broken")
+    info = {"url": server + "/broken"}
+    assert HttpCheck.HttpCheck(HttpCheck.HttpClient(timeout=5, auth='')).open(test, info) == None
+    assert info['status'] == "Failed"
+    assert test.results['results']['status'] == "Failed"
+
+def test_health_check_passes(server):
+    test = results(server + "/health")
+    info = {"url": server + "/health"}
+    response = HttpCheck.HttpCheck(HttpCheck.HttpClient(timeout=5, auth='')).open(test, info)
+    assert info['status'] == "Passed"
+    assert response.body == b'{"isHealthy": true}'
@@ -0,0 +1,80 @@
+import json, os, pytest
+from conftest import ROOT, packageModule
+
+Instrumentation = packageModule('Instrumentation')
+TestConfig = packageModule('TestConfig')
+FakeDriver = packageModule('FakeDriver')
+SessionPool = packageModule('SessionPool')
+TestRunner = packageModule('TestRunner')
+Benchmarks = packageModule('Benchmarks')
+EXAMPLE = os.path.join(ROOT, 'settings.example.conf')
+
+def test_command_names_drop_ids():
+    assert Instrumentation.commandName("GET", "/element/abc-123/text") == "GET /element/text"
+    assert Instrumentation.commandName("GET", "/element/abc-123/attribute/href") == "GET /element/attribute"
+    assert Instrumentation.commandName("POST", "/url") == "POST /url"
+
+def test_recorder_counts_per_step_app_and_session():
+    recorder = Instrumentation.CommandRecorder(detail="command")
+    recorder.record("newSession", 0, 1.5)
+    recorder.start_app()
+    recorder.record("get", 2, 2.25)
+    recorder.start_step("Find")
+    recorder.record("findElement", 3, 3.5)
+    recorder.record("findElement", 4, 4.25, "NoSuchElementException")
+    step = recorder.finish_step("Find", {"status": "Failed"})
+    assert step == {"round_trips": 2, "time": 0.75, "commands": {"findElement": {"count": 2, "time": 0.75, "errors": 1}}}
+    assert recorder.spans[0][5] == [("findElement", 3, 3.5, None), ("findElement", 4, 4.25, "NoSuchElementException")]
+    results = {"results": {}}
+    recorder.finish_app({"ITEM_ID": "1"}, results)
+    webdriver = results["results"]["webdriver"]
+    assert webdriver["round_trips"] == 3 and webdriver["time"] == 1.0
+    assert webdriver["session"] == {"round_trips": 1, "time": 1.5, "commands": {"newSession": {"count": 1, "time": 1.5, "errors": 0}}}
+    assert recorder.app == None and recorder.outside == {}
+
+def test_wrapped_execute_records_errors():
+    driver = FakeDriver.FakeDriver()
+    recorder = Instrumentation.CommandRecorder(detail="step")
+    driver.execute = Instrumentation.wrapExecute(recorder, driver.execute)
+    recorder.start_app()
+    driver.get("about:blank")
+    with pytest.raises(Exception):
+        driver.find_element("id", "missing")
+    assert Instrumentation.summarize(recorder.app)["commands"]["findElement"]["errors"] == 0
+    driver.alert = "Sign in"
+    with pytest.raises(Exception):
+        driver.title
+    assert Instrumentation.summarize(recorder.app)["commands"]["getTitle"]["errors"] == 1
+
+def test_instrument_is_off_by_default():
+    driver = FakeDriver.FakeDriver()
+    assert Instrumentation.instrument(driver) == None and not hasattr(driver, 'recorder')
+
+@pytest.mark.parametrize("detail,steps,commands", [
+    ("app", [], []),
+    ("step", ["Open", "Find"], []),
+    ("command", ["Open", "Find"], ["setTimeouts", "executeAsyncScript"])
+])
+def test_runs_report_round_trips_and_export_spans(tmp_path, detail, steps, commands):
+    path = str(tmp_path / "spans" / "spans.jsonl")
+    pages = Benchmarks.benchmarkPages("steps")
+    pool = SessionPool.SessionPool(lambda browser: FakeDriver.FakeDriver(pages, 0, browser), FakeDriver.fakeEnvironment)
+    app = {"ITEM_ID": "1", "URL": Benchmarks.BENCHMARK_URL, "BROWSER": "Chrome", "TESTS": Benchmarks.benchmarkPlan(2)}
+    try:
+        TestConfig.loadSettings(EXAMPLE, {'WEB_TRANSACTIONS_INSTRUMENTATION__ENABLED': 'true',
+            'WEB_TRANSACTIONS_INSTRUMENTATION__SPANS_PATH': path, 'WEB_TRANSACTIONS_INSTRUMENTATION__SPAN_DETAIL': detail})
+        results = TestRunner.TestRunner(workers=1, pool=pool).run([app])[0]
+    finally:
+        TestConfig.loadSettings()
+    # The app also counts the commands of setUp and tearDown, outside any step
+    assert results['results']['webdriver']['round_trips'] > sum(test['webdriver']['round_trips'] for test in results['tests']) > 0
+    assert results['results']['webdriver']['session']['round_trips'] > 0
+    lines = open(path).read().splitlines()
+    assert len(lines) == 1
+    spans = json.loads(lines[0])['resourceSpans'][0]['scopeSpans'][0]['spans']
+    root = spans[0]
+    assert root['name'] == "transaction 1" and 'parentSpanId' not in root
+    assert all(span['traceId'] == root['traceId'] for span in spans)
+    children = [span for span in spans if span.get('parentSpanId') == root['spanId']]
+    assert [span['name'] for span in children] == steps
+    assert [span['name'] for span in spans if children and span.get('parentSpanId') == children[-1]['spanId']] == commands
@@ -0,0 +1,67 @@
+import json, pytest
+from conftest import packageModule
+
+KVStoreLoader = packageModule('KVStoreLoader')
+StubKVStore = packageModule('StubKVStore')
+
+def record(index, updated=1):
+    url = "https://app{0}.example.com/".format(index)
+    return {"_key": "k{0:03d}".format(index), "ITEM_ID": str(index), "URL": url, "BROWSER": "Chrome", "UPDATED": updated,
+            "TESTS": json.dumps([{"command": "Open", "url": url, "enabled": 1}])}
+
+@pytest.fixture
+def stub():
+    stub = StubKVStore.StubKVStore([record(index) for index in range(25)], token="secret").start()
+    yield stub
+    stub.stop()
+
+def loader(stub, tmp_path, changed_field=''):
+    return KVStoreLoader.KVStoreLoader(url=stub.url, app="web", collection="apps", token="secret", page_size=10, cache_path=str(tmp_path / "cache.json"), changed_field=changed_field)
+
+def change(stub):
+    stub.records['k003'] = dict(stub.records['k003'], URL="https://changed.example.com/", UPDATED=2)
+    del stub.records['k020']
+    stub.records['k999'] = dict(record(999), UPDATED=3)
+
+def test_full_sync_revalidates_pages(stub, tmp_path):
+    kvstore = loader(stub, tmp_path)
+    changes = kvstore.sync()
+    assert len(changes.added) == 25 and changes.changed == [] and changes.removed == []
+    assert kvstore.counters['requests'] == 3
+    # Nothing changed, every page answers 304 and comes from the cache
+    changes = kvstore.sync()
+    assert changes.added == [] and changes.unchanged == 25
+    assert kvstore.counters['not_modified'] == 3
+    assert kvstore.apps()[0]['TESTS'][0]['command'] == "Open"
+
+def test_full_sync_sees_changes_and_deletes(stub, tmp_path):
+    kvstore = loader(stub, tmp_path)
+    kvstore.sync()
+    change(stub)
+    changes = kvstore.sync()
+    assert changes.added == ['k999'] and changes.changed == ['k003'] and changes.removed == ['k020']
+    assert changes.unchanged == 23
+
+def test_delta_sync_only_fetches_changed_records(stub, tmp_path):
+    kvstore = loader(stub, tmp_path, changed_field="UPDATED")
+    kvstore.sync()
+    fetched = kvstore.counters['records_fetched']
+    change(stub)
+    changes = kvstore.sync()
+    assert changes.added == ['k999'] and changes.changed == ['k003'] and changes.removed == ['k020']
+    # Two changed records plus the _key listing used to notice deletes
+    assert kvstore.counters['records_fetched'] - fetched == 2 + len(stub.records)
+    assert kvstore.high_water == 3
+
+def test_cache_is_reused(stub, tmp_path):
+    loader(stub, tmp_path).sync()
+    kvstore = loader(stub, tmp_path)
+    assert len(kvstore.records) == 25
+    changes = kvstore.sync()
+    assert changes.added == [] and changes.unchanged == 25
+    assert kvstore.counters['not_modified'] == 3
+
+def test_wrong_token_is_an_error(stub, tmp_path):
+    kvstore = KVStoreLoader.KVStoreLoader(url=stub.url, app="web", collection="apps", token="wrong", cache_path='')
+    with pytest.raises(Exception, match="401"):
+        kvstore.sync()
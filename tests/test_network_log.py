@@ -0,0 +1,53 @@
+import json
+from conftest import packageModule
+
+NetworkLog = packageModule('NetworkLog')
+FakeDriver = packageModule('FakeDriver')
+
+def entry(method, **params):
+    return {'level': 'INFO', 'message': json.dumps({'message': {'method': method, 'params': params}})}
+
+def test_start_step_discards_earlier_entries():
+    driver = FakeDriver.FakeDriver()
+    driver.logs = FakeDriver.performanceLog(3)
+    collector = NetworkLog.NetworkLogCollector(driver, max_events=100)
+    collector.add(FakeDriver.performanceLog(1))
+    collector.start_step()
+    assert collector.collect() == [] and collector.summary()['requests'] == 0
+
+def test_summary_counts_requests_bytes_and_timing():
+    driver = FakeDriver.FakeDriver()
+    driver.logs = FakeDriver.performanceLog(4, size=1000)
+    collector = NetworkLog.NetworkLogCollector(driver, max_events=100)
+    assert len(collector.collect()) == 12
+    summary = collector.summary()
+    assert summary['requests'] == 4 and summary['failed'] == 0 and summary['bytes'] == 4000
+    assert summary['duration'] == 0.035 and summary['slowest']['duration'] == 0.005
+    assert summary['events'] == 12 and summary['dropped'] == 0
+
+def test_failed_requests_and_other_events():
+    collector = NetworkLog.NetworkLogCollector(FakeDriver.FakeDriver(), max_events=100)
+    collector.add([
+        entry('Network.requestWillBeSent', requestId="1", request={'url': "https://app.example.com/missing"}, timestamp=1.0),
+        entry('Network.responseReceived', requestId="1", response={'status': 404}),
+        entry('Network.loadingFinished', requestId="1", timestamp=1.5, encodedDataLength=100),
+        entry('Network.requestWillBeSent', requestId="2", request={'url': "https://cdn.example.com/app.js"}, timestamp=1.1),
+        entry('Network.loadingFailed', requestId="2", timestamp=3.1, errorText="net::ERR_CONNECTION_RESET"),
+        entry('Page.loadEventFired', timestamp=3.2),
+        {'level': 'INFO', 'message': "not json"},
+        {'level': 'INFO'}
+    ])
+    summary = collector.summary()
+    assert summary['events'] == 5 and summary['requests'] == 2 and summary['failed'] == 2
+    assert summary['duration'] == 2.1 and summary['slowest'] == {'url': "https://cdn.example.com/app.js", 'duration': 2.0}
+
+def test_buffer_is_bounded():
+    collector = NetworkLog.NetworkLogCollector(FakeDriver.FakeDriver(), max_events=5)
+    collector.add(FakeDriver.performanceLog(3))
+    assert len(collector.events) == 5 and collector.summary()['dropped'] == 4
+    collector.clear()
+    assert len(collector.events) == 0 and collector.dropped == 0
+
+def test_max_events_defaults_to_the_setting():
+    collector = NetworkLog.NetworkLogCollector(FakeDriver.FakeDriver())
+    assert collector.max_events == NetworkLog.TestSettings.getint('NetworkLog', 'max_events', fallback=1000)
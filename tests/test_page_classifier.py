@@ -0,0 +1,34 @@
+import json, pytest
+from conftest import packageModule
+
+PageClassifier = packageModule('PageClassifier')
+
+@pytest.fixture(scope="module")
+def classifier():
+    return PageClassifier.PageClassifier(rules=[], disabled=[])
+
+@pytest.mark.parametrize("snapshot, expected", PageClassifier.CORPUS)
+def test_corpus(classifier, snapshot, expected):
+    assert classifier.classify(snapshot) == expected
+
+def test_explain(classifier):
+    assert classifier.explain({"title": "403 Forbidden"}) == "title_unauthorized"
+    assert classifier.explain({"title": "Example App", "body": "Welcome"}) == None
+
+def test_custom_rules():
+    rules = [
+        {"name": "maintenance", "when": {"title": "maintenance"}, "ignore_case": True, "status": "Warning", "error": "title", "message": "Maintenance: {0}"},
+        {"name": "sorry", "when": {"body": "sorry"}, "status": "Debug", "error": "body", "before": "page_error"}
+    ]
+    classifier = PageClassifier.PageClassifier(rules=rules, disabled=["neterror"])
+    assert classifier.classify({"title": "Scheduled Maintenance", "body": ""}) == ('Warning', "Maintenance: Scheduled Maintenance")
+    assert classifier.classify({"title": "", "body": "sorry, error"}) == ('Debug', "sorry, error")
+    assert classifier.classify({"title": "", "neterror": "This site can't be reached"}) == ('Passed', None)
+
+def test_bad_rules_fail_when_created(tmp_path):
+    path = tmp_path / "rules.json"
+    path.write_text(json.dumps([{"name": "bad", "when": {"colour": "red"}}]))
+    with pytest.raises(ValueError, match="unknown field colour"):
+        PageClassifier.PageClassifier(rules=PageClassifier.loadRules(str(path)))
+    with pytest.raises(ValueError, match="Unable to load page rules"):
+        PageClassifier.loadRules(str(tmp_path / "missing.json"))
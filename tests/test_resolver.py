@@ -0,0 +1,17 @@
+from concurrent.futures import Future
+from conftest import packageModule
+
+Resolver = packageModule('Resolver')
+
+def test_malformed_host_resolves_to_nothing():
+    cache = Resolver.DNSCache(workers=1, timeout=5)
+    assert cache.result(cache.lookup("http://a..b/"), (None, None)) == (None, None)
+
+def test_failed_lookup_gives_default():
+    future = Future()
+    future.set_exception(UnicodeError("label empty or too long"))
+    assert Resolver.DNSCache(workers=1).result(future, (None, None)) == (None, None)
+
+def test_host_from_url():
+    assert Resolver.hostFromUrl("https://app.example.com:8443/path") == "app.example.com"
+    assert Resolver.hostFromUrl("app.example.com") == "app.example.com"
@@ -0,0 +1,12 @@
+import pytest
+from conftest import packageModule
+
+ResultSinks = packageModule('ResultSinks')
+
+def test_sink_names():
+    assert ResultSinks.sinkNames(" Stdout, file,,") == ["stdout", "file"]
+    assert ResultSinks.createSink("") == None
+
+def test_unknown_sink_is_rejected():
+    with pytest.raises(ValueError, match="splunk"):
+        ResultSinks.sinkNames("stdout,splunk")
@@ -0,0 +1,95 @@
+import os
+from conftest import ROOT, packageModule
+
+TestConfig = packageModule('TestConfig')
+FakeDriver = packageModule('FakeDriver')
+SessionPool = packageModule('SessionPool')
+TestRunner = packageModule('TestRunner')
+EXAMPLE = os.path.join(ROOT, 'settings.example.conf')
+LOGIN = "https://login.microsoftonline.com/authorize"
+DOMAIN = "login.microsoftonline.com"
+
+class SSODriver(FakeDriver.FakeDriver):
+    # Sends the apps to the Microsoft sign in until it's done, keeps the CDP commands sent
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.signed_in = False
+        self.sign_ins = 0
+        self.cdp = []
+
+    def load(self, url):
+        if url.startswith("http://127.0.0.1") and not self.signed_in:
+            self.return_url = url
+            url = LOGIN
+        if url == LOGIN + "/done":
+            self.signed_in = True
+            self.sign_ins += 1
+            url = self.return_url
+        FakeDriver.FakeDriver.load(self, url)
+
+    def execute_cdp_cmd(self, command, params):
+        self.cdp.append((command, params.get('origin')))
+        if command == 'Network.clearBrowserCookies': self.signed_in = False
+        return {}
+
+def signInPage(working=True):
+    elements = {("xpath", '//*/input[@type="email"]'): {"text": ""}, ("xpath", '//*/input[@type="submit"]'): {"text": "Next", "href": LOGIN + "/done"}}
+    return {"title": "Sign in", "text": "", "elements": elements if working else {}}
+
+def runApps(apps, pages, launch=None):
+    drivers = []
+    def launchDriver(browser):
+        drivers.append(SSODriver(pages, 0, browser))
+        return drivers[-1]
+    pool = SessionPool.SessionPool(launch or launchDriver, FakeDriver.fakeEnvironment)
+    try:
+        TestConfig.loadSettings(EXAMPLE, {'WEB_TRANSACTIONS_SSO__BATCH': 'true', 'WEB_TRANSACTIONS_SSO__TIMEOUT': '1'})
+        results = TestRunner.TestRunner(workers=1, pool=pool).run(apps)
+    finally:
+        TestConfig.loadSettings()
+    return results, pool, drivers
+
+def appsBehindSignIn(count, pages, domain=DOMAIN):
+    apps = []
+    for i in range(count):
+        url = "http://127.0.0.1/app{0}".format(i)
+        pages[url] = {"title": "App {0}".format(i), "text": "Welcome"}
+        apps.append({"ITEM_ID": str(i), "URL": url, "BROWSER": "Chrome", "TESTS": [{"command": "Open", "url": url, "enabled": 1}], "AUTH_DOMAIN": domain})
+    return apps
+
+def test_batch_signs_in_once_and_resets_after():
+    pages = {LOGIN: signInPage()}
+    results, pool, drivers = runApps(appsBehindSignIn(3, pages), pages)
+    assert [result['results']['status'] for result in results] == ["Passed"] * 3
+    auth = [result['results']['auth'] for result in results]
+    assert auth[0] == auth[1] == auth[2] and auth[0]['status'] == "Passed" and auth[0]['batch_size'] == 3
+    assert [result['results']['isolation']['mode'] for result in results] == ["sso"] * 3
+    assert len(drivers) == 1 and drivers[0].sign_ins == 1
+    # The full reset that ends the batch clears the identity provider's origin with the apps'
+    assert drivers[0].cdp == [('Network.clearBrowserCookies', None),
+        ('Storage.clearDataForOrigin', "http://127.0.0.1"), ('Storage.clearDataForOrigin', "https://" + DOMAIN)]
+    stats = pool.stats()
+    assert stats['acquired'] == stats['released'] == 1 and stats['launched'] == 1
+
+def test_failed_sign_in_is_reported_with_each_app():
+    pages = {LOGIN: signInPage(working=False)}
+    results, pool, drivers = runApps(appsBehindSignIn(2, pages), pages)
+    for result in results:
+        assert result['results']['auth']['status'] == "Failed"
+        assert result['results']['auth']['error'].startswith("Sign in failed")
+    assert drivers[0].sign_ins == 0 and pool.stats()['active'] == 0
+
+def test_apps_run_alone_without_a_batch_session():
+    pages = {LOGIN: signInPage()}
+    drivers = []
+    def launch(browser):
+        # Neither the prewarmed nor the batch's session can be launched, the apps then get their own
+        if len(drivers) < 2:
+            drivers.append(None)
+            raise RuntimeError("hub unavailable")
+        drivers.append(SSODriver(pages, 0, browser))
+        return drivers[-1]
+    results, pool, _ = runApps(appsBehindSignIn(2, pages), pages, launch)
+    assert [result['results']['status'] for result in results] == ["Passed"] * 2
+    assert all('auth' not in result['results'] for result in results)
+    assert [result['results']['isolation']['mode'] for result in results] == ["reset"] * 2
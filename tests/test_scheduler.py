@@ -0,0 +1,61 @@
+import time
+from conftest import packageModule
+
+Scheduler = packageModule('Scheduler')
+TestPlan = packageModule('TestPlan')
+
+class StepHistory(Scheduler.MemoryHistory):
+    def __init__(self, p95):
+        super().__init__()
+        self.p95 = p95
+
+    def step_percentile(self, item_id, browser, index, percentile):
+        return self.p95
+
+def scheduler(p95, adaptive=True):
+    scheduler = Scheduler.Scheduler(StepHistory(p95))
+    scheduler.adaptive = adaptive
+    return scheduler
+
+APP = {"ITEM_ID": "1", "BROWSER": "Chrome"}
+STEP = TestPlan.compileStep(0, {"command": "Open", "url": "https://app.example.com/", "enabled": 1})
+
+def test_step_timeouts_are_opt_in():
+    assert Scheduler.Scheduler(StepHistory(0.5)).step_timeout(APP, STEP, 30) == 30
+
+def test_fast_history_keeps_configured_timeout():
+    assert scheduler(0.5).step_timeout(APP, STEP, 30) == 30
+
+def test_slow_history_extends_timeout():
+    assert scheduler(20).step_timeout(APP, STEP, 30) == 40
+    assert scheduler(100).step_timeout(APP, STEP, 30) == 60
+
+def test_no_history_keeps_configured_timeout():
+    assert scheduler(None).step_timeout(APP, STEP, 30) == 30
+
+def test_budget_is_never_negative_after_the_deadline():
+    late = scheduler(None)
+    late.start_run(interval=1)
+    late.deadline -= 5
+    assert late.budget(APP).limit == 0
+    assert late.overdue()
+    assert not scheduler(None).overdue()
+
+def test_apps_past_the_deadline_are_skipped():
+    TestRunner, SessionPool, FakeDriver = packageModule('TestRunner'), packageModule('SessionPool'), packageModule('FakeDriver')
+    launched = []
+    def launch(browser):
+        launched.append(browser)
+        return FakeDriver.FakeDriver({}, 0, browser)
+    apps = [dict(APP, ITEM_ID=str(i), URL="https://app.example.com/", TESTS=[{"command": "Open", "url": "https://app.example.com/", "enabled": 1}]) for i in range(2)]
+    runner = TestRunner.TestRunner(workers=1, pool=SessionPool.SessionPool(launch, FakeDriver.fakeEnvironment))
+    # The run's deadline has passed before the first app gets a worker
+    Scheduler.scheduler().interval = 0.001
+    runner.prewarm = lambda apps: time.sleep(0.01)
+    try:
+        results = runner.run(apps)
+    finally:
+        Scheduler.scheduler().interval = 0
+        Scheduler.scheduler().deadline = None
+    assert [result['results']['status'] for result in results] == ["Skipped", "Skipped"]
+    assert results[0]['tests'] == [] and launched == []
@@ -0,0 +1,70 @@
+import base64, io, os, pytest, time
+from conftest import ROOT, packageModule
+
+ScreenshotStore = packageModule('ScreenshotStore')
+TestConfig = packageModule('TestConfig')
+EXAMPLE = os.path.join(ROOT, 'settings.example.conf')
+
+def png(width, height, color=(200, 30, 30)):
+    Image = pytest.importorskip('PIL.Image')
+    output = io.BytesIO()
+    Image.new('RGB', (width, height), color).save(output, 'PNG')
+    return output.getvalue()
+
+def test_identical_screenshots_are_stored_once(tmp_path):
+    store = ScreenshotStore.ScreenshotStore(str(tmp_path), format='png', max_width=0)
+    data = png(40, 30)
+    first = store.store(data)
+    second = store.store_base64(base64.b64encode(data).decode())
+    assert first == second and store.stored == 1 and store.duplicates == 1
+    assert first['file'] == "{0}/{1}.png".format(first['id'][:2], first['id'])
+    assert (first['width'], first['height'], first['bytes']) == (40, 30, len(data))
+    assert (tmp_path / first['file']).read_bytes() == data
+
+def test_wide_screenshots_are_scaled_and_reencoded(tmp_path):
+    Image = pytest.importorskip('PIL.Image')
+    store = ScreenshotStore.ScreenshotStore(str(tmp_path), format='jpeg', quality=50, max_width=100)
+    reference = store.store(png(400, 300))
+    assert reference['format'] == 'jpeg' and reference['file'].endswith('.jpg')
+    assert (reference['width'], reference['height']) == (100, 75)
+    assert Image.open(str(tmp_path / reference['file'])).size == (100, 75)
+    # A duplicate gets the same size without being decoded again
+    assert store.store(png(400, 300)) == reference
+
+def test_url_prefix_links_the_stored_file(tmp_path):
+    try:
+        TestConfig.loadSettings(EXAMPLE, {'WEB_TRANSACTIONS_SCREENSHOTS__PATH': str(tmp_path),
+            'WEB_TRANSACTIONS_SCREENSHOTS__URL_PREFIX': 'https://screens.example.com/shots/'})
+        store = ScreenshotStore.screenshotStore()
+        assert store.path == str(tmp_path) and ScreenshotStore.screenshotStore() is store
+        reference = store.store(png(10, 10))
+        assert reference['url'] == 'https://screens.example.com/shots/' + reference['file']
+        TestConfig.loadSettings(EXAMPLE, {})
+        assert ScreenshotStore.screenshotStore() == None
+    finally:
+        TestConfig.loadSettings()
+
+def test_prune_removes_expired_then_oldest(tmp_path):
+    store = ScreenshotStore.ScreenshotStore(str(tmp_path), format='png', retention_days=1, max_mb=0)
+    expired = store.store(png(10, 10, (1, 1, 1)))
+    old = store.store(png(10, 10, (2, 2, 2)))
+    new = store.store(png(10, 10, (3, 3, 3)))
+    now = time.time()
+    os.utime(str(tmp_path / expired['file']), (now - 2 * 86400, now - 2 * 86400))
+    os.utime(str(tmp_path / old['file']), (now - 60, now - 60))
+    os.utime(str(tmp_path / new['file']), (now, now))
+    # Pruning ran with the first screenshot and waits an hour unless forced
+    store.prune()
+    assert (tmp_path / expired['file']).exists()
+    # Room for the newest screenshot only
+    store.max_mb = (new['bytes'] + 10) / 1048576.0
+    store.prune(force=True)
+    assert not (tmp_path / expired['file']).exists()
+    assert not (tmp_path / old['file']).exists()
+    assert (tmp_path / new['file']).exists()
+
+def test_bad_configuration_raises(tmp_path):
+    with pytest.raises(ValueError, match="needs a path"):
+        ScreenshotStore.ScreenshotStore('')
+    with pytest.raises(ValueError, match="Unsupported screenshot format gif"):
+        ScreenshotStore.ScreenshotStore(str(tmp_path), format='gif')
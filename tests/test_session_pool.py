@@ -0,0 +1,96 @@
+from conftest import packageModule
+
+SessionPool = packageModule('SessionPool')
+FakeDriver = packageModule('FakeDriver')
+
+PAGES = {
+    "https://app.example.com/": {"title": "App", "text": "Welcome", "elements": {("id", "next"): {"text": "Next", "href": "https://other.example.com:8443/page"}}},
+    "https://other.example.com:8443/page": {"title": "Other", "text": ""}
+}
+
+class CdpDriver(FakeDriver.FakeDriver):
+    # A Chrome driver with CDP access, keeps the commands sent
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cdp = []
+
+    def execute_cdp_cmd(self, command, params):
+        self.cdp.append((command, params.get('origin')))
+        return {}
+
+def test_full_reset_clears_each_visited_origin():
+    session = SessionPool.Session("Chrome", CdpDriver(PAGES), {})
+    session.visit("https://app.example.com/")
+    session.driver.get("https://app.example.com/")
+    session.driver.find_element("id", "next").click()
+    session.reset("reset")
+    assert session.driver.cdp == [
+        ('Network.clearBrowserCookies', None),
+        ('Storage.clearDataForOrigin', "https://app.example.com"),
+        ('Storage.clearDataForOrigin', "https://other.example.com:8443")
+    ]
+    assert session.origins == set() and session.driver.url == "about:blank"
+
+def test_sso_reset_keeps_the_origins_for_the_full_reset():
+    session = SessionPool.Session("Chrome", CdpDriver(PAGES), {})
+    session.visit("https://app.example.com/")
+    session.visit("about:blank")
+    session.reset("sso")
+    assert session.driver.cdp == [] and session.origins == set(["https://app.example.com"])
+
+def fakePool(**options):
+    drivers = []
+    def launch(browser):
+        drivers.append(FakeDriver.FakeDriver(PAGES, 0, browser))
+        return drivers[-1]
+    return SessionPool.SessionPool(launch, FakeDriver.fakeEnvironment, **options), drivers
+
+def reuse(pool, times):
+    sessions = []
+    for _ in range(times):
+        sessions.append(pool.acquire("Chrome"))
+        pool.release(sessions[-1])
+    return sessions
+
+def test_sessions_are_recycled_after_max_uses():
+    pool, drivers = fakePool(max_uses=2, max_age=0)
+    sessions = reuse(pool, 3)
+    assert sessions[0] is sessions[1] and sessions[2] is not sessions[0]
+    assert pool.stats()['recycled'] == 1 and pool.stats()['launched'] == 2
+    assert drivers[0].commands['quit'] == 1
+
+def test_sessions_are_recycled_after_max_age():
+    pool, drivers = fakePool(max_uses=0, max_age=60)
+    first = reuse(pool, 1)[0]
+    first.created -= 61
+    assert reuse(pool, 1)[0] is not first
+    assert pool.stats()['recycled'] == 1
+
+def test_dead_sessions_are_replaced():
+    pool, drivers = fakePool(max_uses=0, max_age=0, health_check=True)
+    first = reuse(pool, 1)[0]
+    def gone(command, params=None):
+        raise FakeDriver.WebDriverException("invalid session id")
+    first.driver.execute = gone
+    second = reuse(pool, 1)[0]
+    assert second is not first and pool.stats()['replaced'] == 1
+
+def test_liveness_check_can_be_turned_off():
+    pool, drivers = fakePool(max_uses=0, max_age=0, health_check=False)
+    first, second = reuse(pool, 2)
+    assert first is second and drivers[0].commands['getCurrentUrl'] == 0
+
+def test_reset_closes_popups_and_leaves_the_page():
+    pages = dict(PAGES, **{"https://popup.example.com/": {"title": "Popups", "text": "", "windows": 2}})
+    driver = FakeDriver.FakeDriver(pages)
+    driver.get("https://popup.example.com/")
+    SessionPool.resetSession(driver, "reset")
+    assert driver.window_handles == ["window-1"] and driver.commands['closeWindow'] == 2
+    assert driver.commands['deleteAllCookies'] == 1 and driver.url == "about:blank"
+
+def test_none_mode_only_leaves_the_page():
+    driver = FakeDriver.FakeDriver(PAGES)
+    driver.get("https://app.example.com/")
+    SessionPool.resetSession(driver, "none")
+    assert driver.commands['deleteAllCookies'] == 0 and driver.commands['executeScript'] == 0
+    assert driver.url == "about:blank"
@@ -0,0 +1,32 @@
+import os, pytest, subprocess, sys
+from conftest import ROOT, PACKAGE, packageModule
+
+TestConfig = packageModule('TestConfig')
+EXAMPLE = os.path.join(ROOT, 'settings.example.conf')
+
+def test_bad_value_fails_when_loading():
+    with pytest.raises(ValueError, match=r"\[Waits\] poll_min"):
+        TestConfig.readSettings(EXAMPLE, {'WEB_TRANSACTIONS_WAITS__POLL_MIN': 'fast'})
+
+def test_package_exports_the_runner_class():
+    # A fresh interpreter, the tests have already imported the TestRunner module,
+    # and the daemon creates its runner before the class is asked for
+    script = "from {0}.Daemon import Daemon\nDaemon(load=list, workers=1)\nfrom {0} import TestRunner, runTests\nprint(isinstance(TestRunner, type), TestRunner.__name__, runTests.__module__)".format(PACKAGE)
+    env = dict(os.environ, PYTHONPATH=os.path.dirname(ROOT))
+    output = subprocess.check_output([sys.executable, '-c', script], env=env, universal_newlines=True).split()
+    assert output == ['True', 'TestRunner', PACKAGE + '.TestRunner']
+
+def test_shared_objects_follow_loaded_settings():
+    packageModule('TestBuilder')
+    Resolver, NodeInfo, Scheduler = packageModule('Resolver'), packageModule('NodeInfo'), packageModule('Scheduler')
+    try:
+        TestConfig.loadSettings(EXAMPLE, {'WEB_TRANSACTIONS_SELENIUMHUB__HOST': 'grid.example.com', 'WEB_TRANSACTIONS_DNS__TTL': '5',
+            'WEB_TRANSACTIONS_SCHEDULER__APP_BUDGET': '42'})
+        assert NodeInfo.nodes().host == 'grid.example.com'
+        assert Resolver.resolver().ttl == 5
+        assert Scheduler.scheduler().app_budget == 42
+        TestConfig.loadSettings(EXAMPLE, {})
+        assert NodeInfo.nodes().host == 'localhost'
+        assert Resolver.resolver().ttl == 300
+    finally:
+        TestConfig.loadSettings()
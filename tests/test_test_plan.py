@@ -0,0 +1,22 @@
+import pytest
+from conftest import packageModule
+
+TestPlan = packageModule('TestPlan')
+
+def test_empty_text_is_valid():
+    step = TestPlan.compileStep(0, {"command": "Type", "text": "", "enabled": 1})
+    assert step.info['text'] == ""
+    step = TestPlan.compileStep(0, {"command": "FindText", "assert": "equals", "expected_text": "", "enabled": 1})
+    assert step.pattern == None
+
+def test_missing_fields_are_rejected():
+    with pytest.raises(TestPlan.PlanError, match="missing text"):
+        TestPlan.compileStep(0, {"command": "Type", "enabled": 1})
+    with pytest.raises(TestPlan.PlanError, match="missing url"):
+        TestPlan.compileStep(0, {"command": "Open", "url": "", "enabled": 1})
+
+def test_wait_strategy_is_validated():
+    step = TestPlan.compileStep(0, {"command": "Open", "url": "https://app.example.com/", "wait_strategy": "fixed", "enabled": 1})
+    assert step.wait_strategy == "fixed"
+    with pytest.raises(TestPlan.PlanError, match="wait_strategy"):
+        TestPlan.compileStep(0, {"command": "Open", "url": "https://app.example.com/", "wait_strategy": "sometimes", "enabled": 1})
@@ -0,0 +1,72 @@
+import os
+from conftest import ROOT, packageModule
+
+Trace = packageModule('Trace')
+TestConfig = packageModule('TestConfig')
+FakeDriver = packageModule('FakeDriver')
+SessionPool = packageModule('SessionPool')
+TestRunner = packageModule('TestRunner')
+Benchmarks = packageModule('Benchmarks')
+EXAMPLE = os.path.join(ROOT, 'settings.example.conf')
+
+class Loud():
+    # Counts how often the trace formats it
+    formatted = 0
+
+    def __str__(self):
+        Loud.formatted += 1
+        return "loud"
+
+def test_disabled_trace_keeps_nothing():
+    trace = Trace.TraceBuffer(include_failures=False)
+    Loud.formatted = 0
+    trace.append("Found {0}", Loud())
+    trace.error("Failed {0}", Loud())
+    assert len(trace) == 0 and Loud.formatted == 0
+
+def test_messages_are_formatted_when_read():
+    trace = Trace.TraceBuffer(debug=True, max_chars=10)
+    Loud.formatted = 0
+    trace.debug("Checking {0}", Loud())
+    trace.append("Text {0} of {1}", "x" * 25, "page")
+    assert Loud.formatted == 0
+    lines = trace.lines()
+    assert Loud.formatted == 1 and len(lines) == 2
+    assert lines[0].endswith("] Checking loud")
+    assert lines[1].endswith("] Text xxxxxxxxxx... (25 characters) of page")
+
+def test_level_filters_and_oldest_messages_drop():
+    trace = Trace.TraceBuffer(level="error", max_entries=2, include_failures=True)
+    trace.append("Opened")
+    for i in range(3):
+        trace.error("Failed {0}", i)
+    lines = trace.lines()
+    assert lines[0] == "(1 earlier messages dropped)" and len(lines) == 3
+    assert lines[1].endswith("Failed 1") and lines[2].endswith("Failed 2")
+
+def test_attach_only_to_failures():
+    trace = Trace.TraceBuffer(include_failures=True)
+    trace.append("Opened {0}", "https://app.example.com/")
+    passed = {"results": {"status": "Passed"}}
+    failed = {"results": {"status": "Failed"}}
+    trace.attach(passed)
+    trace.attach(failed)
+    assert "trace" not in passed["results"] and failed["results"]["trace"][0].endswith("Opened https://app.example.com/")
+    debugged = {"results": {"status": "Failed"}}
+    Trace.TraceBuffer(debug=True, include_failures=False).attach(debugged)
+    assert "trace" not in debugged["results"]
+
+def test_failed_run_carries_its_trace():
+    pages = Benchmarks.benchmarkPages("steps")
+    pool = SessionPool.SessionPool(lambda browser: FakeDriver.FakeDriver(pages, 0, browser), FakeDriver.fakeEnvironment)
+    plan = Benchmarks.benchmarkPlan(3)
+    plan[2]['expected_text'] = "missing text"
+    apps = [{"ITEM_ID": "failing", "URL": Benchmarks.BENCHMARK_URL, "BROWSER": "Chrome", "TESTS": plan},
+        {"ITEM_ID": "passing", "URL": Benchmarks.BENCHMARK_URL, "BROWSER": "Chrome", "TESTS": Benchmarks.benchmarkPlan(3)}]
+    try:
+        TestConfig.loadSettings(EXAMPLE, {'WEB_TRANSACTIONS_TRACE__INCLUDE_FAILURES': 'true'})
+        failing, passing = TestRunner.TestRunner(workers=1, pool=pool).run(apps)
+    finally:
+        TestConfig.loadSettings()
+    assert failing['results']['status'] == "Failed" and failing['results']['trace']
+    assert passing['results']['status'] == "Passed" and 'trace' not in passing['results']
@@ -0,0 +1,61 @@
+import pytest
+from selenium.common.exceptions import TimeoutException
+from selenium.common.exceptions import WebDriverException
+from conftest import packageModule
+
+Waits = packageModule('Waits')
+FakeDriver = packageModule('FakeDriver')
+
+PAGES = {
+    "https://app.example.com/": {"title": "Example App", "title_delay": 0.2, "text": "Welcome",
+        "elements": {("id", "login"): {"text": "Log in", "delay": 0.2}}}
+}
+
+def loaded():
+    driver = FakeDriver.FakeDriver(PAGES)
+    driver.get("https://app.example.com/")
+    driver.commands.clear()
+    return driver
+
+class NoAsyncScripts(FakeDriver.FakeDriver):
+    # A driver whose async scripts fail, e.g. because the page navigated while waiting
+    def execute_async_script(self, script, *args):
+        self.execute('executeAsyncScript')
+        raise WebDriverException("javascript error: document unloaded while waiting for result")
+
+def test_script_waits_in_one_round_trip():
+    driver = loaded()
+    assert Waits.waitForTitle(driver, 2, "script") == "Example App"
+    assert driver.commands['executeAsyncScript'] == 1 and driver.commands['getTitle'] == 0
+    assert driver.wait_script_timeout == 3
+
+def test_script_timeout_raises():
+    driver = loaded()
+    with pytest.raises(TimeoutException):
+        Waits.waitForTitleContaining(driver, "Other App", 0.3, "script")
+    assert driver.commands['executeAsyncScript'] == 1
+
+def test_failed_script_falls_back_to_polling():
+    driver = NoAsyncScripts(PAGES)
+    driver.get("https://app.example.com/")
+    assert Waits.waitForTitleContaining(driver, "example", 2, "script") == "Example App"
+    assert driver.commands['executeAsyncScript'] == 1 and driver.commands['getTitle'] >= 2
+
+def test_backoff_ignores_missing_elements():
+    driver = loaded()
+    assert Waits.waitForElement(driver, "id", "login", 2, "backoff").text == "Log in"
+    assert driver.commands['findElement'] >= 2 and driver.commands['executeAsyncScript'] == 0
+
+def test_backoff_polls_more_often_than_fixed():
+    trips = {}
+    for strategy in ["backoff", "fixed"]:
+        driver = loaded()
+        with pytest.raises(TimeoutException):
+            Waits.waitForElement(driver, "id", "missing", 1, strategy)
+        trips[strategy] = driver.commands['findElement']
+    assert trips["fixed"] <= 3 < trips["backoff"]
+
+def test_poll_until_uses_the_configured_strategy():
+    driver = loaded()
+    assert Waits.pollUntil(driver, lambda d: d.title or None, 2) == "Example App"
+    assert Waits.found(0) and Waits.found("") and not Waits.found(None) and not Waits.found(False)